@@ -1,4 +1,5 @@
 local api, fn, ts = vim.api, vim.fn, vim.treesitter
+local uv = vim.uv or vim.loop
 local rpc = require("pyrola.rpc")
 
 local DEPS = {
@@ -28,11 +29,33 @@ local M = {
         kernel_map = {},
         split_horizontal = false,
         split_ratio = 0.65,
+        stream_inspect = false,
+        prefetch_globals = false,
         image = {
             cell_width = 10,
             cell_height = 20,
             max_width_ratio = 0.5,
             max_height_ratio = 0.5
+        },
+        repl_output = {
+            frame_ms = 33,
+            limit_kb = 1024
+        },
+        server = {
+            client_pool_size = 4,
+            client_idle_timeout = 600,
+            warm_kernels = 0,
+            warm_kernel_idle_timeout = 1800,
+            auto_restart = false,
+            trace_file = nil,
+            framing = "json",
+            daemon = false,
+            daemon_idle_timeout = 300,
+            socket_path = nil,
+            share_kernels = true,
+            monitor_interval = 5,
+            memory_limit_mb = nil,
+            output_buffer_mb = 16
         }
     },
     term = {
@@ -42,7 +65,8 @@ local M = {
         chanid = 0
     },
     send_queue = {},
-    repl_ready = false
+    repl_ready = false,
+    spill_file = nil
 }
 
 local function is_vim_nil(value)
@@ -167,7 +191,9 @@ local function register_kernel_cleanup()
             callback = function()
                 if M.filetype and M.connection_file_path then
                     if rpc.is_running() then
-                        rpc.request("shutdown_kernel", { connection_file = M.connection_file_path }, 3000)
+                        -- Returns at once; the server and a detached reaper
+                        -- finish the shutdown after Neovim has gone.
+                        rpc.request("shutdown_all", {}, 1000)
                         rpc.stop()
                     else
                         pcall(fn.ShutdownKernel, M.filetype, M.connection_file_path)
@@ -181,6 +207,95 @@ local function register_kernel_cleanup()
     M.kernel_cleanup_set = true
 end
 
+local function register_kernel_events()
+    if M.kernel_events_set then
+        return
+    end
+    rpc.on_notification("kernel_died", function(params)
+        if type(params) ~= "table" or params.connection_file ~= M.connection_file_path then
+            return
+        end
+        vim.schedule(function()
+            if params.restarting then
+                vim.notify(
+                    string.format("Pyrola: Kernel '%s' died (%s), restarting.", params.kernel_name, params.reason),
+                    vim.log.levels.WARN
+                )
+                return
+            end
+            M.connection_file_path = nil
+            vim.notify(
+                string.format("Pyrola: Kernel '%s' died (%s). Run :Pyrola init to start a new one.",
+                    params.kernel_name, params.reason),
+                vim.log.levels.ERROR
+            )
+        end)
+    end)
+    rpc.on_notification("kernel_restarted", function(params)
+        if type(params) ~= "table" or params.connection_file ~= M.connection_file_path then
+            return
+        end
+        vim.schedule(function()
+            vim.notify(
+                string.format("Pyrola: Kernel '%s' restarted in %.0f ms.", params.kernel_name, params.restart_ms or 0),
+                vim.log.levels.INFO
+            )
+        end)
+    end)
+    rpc.on_notification("kernel_unresponsive", function(params)
+        if type(params) ~= "table" or params.connection_file ~= M.connection_file_path then
+            return
+        end
+        vim.schedule(function()
+            vim.notify(
+                string.format("Pyrola: Kernel '%s' has not answered its heartbeat for %.0f s; it is still running.",
+                    params.kernel_name, params.silent_s or 0),
+                vim.log.levels.WARN
+            )
+        end)
+    end)
+    rpc.on_notification("kernel_memory", function(params)
+        if type(params) ~= "table" or params.connection_file ~= M.connection_file_path then
+            return
+        end
+        vim.schedule(function()
+            vim.notify(
+                string.format("Pyrola: Kernel '%s' is using %.0f MB, above the %.0f MB limit.",
+                    params.kernel_name, (params.rss or 0) / 1048576, (params.limit or 0) / 1048576),
+                vim.log.levels.WARN
+            )
+        end)
+    end)
+    M.kernel_events_set = true
+end
+
+local function build_server_env()
+    local server = M.config.server or {}
+    local pool_size = tonumber(server.client_pool_size) or 4
+    local idle_timeout = tonumber(server.client_idle_timeout) or 600
+    local warm_kernels = tonumber(server.warm_kernels) or 0
+    local warm_idle_timeout = tonumber(server.warm_kernel_idle_timeout) or 1800
+    local daemon_idle_timeout = tonumber(server.daemon_idle_timeout) or 300
+    local auto_restart = server.auto_restart and "1" or "0"
+    local monitor_interval = tonumber(server.monitor_interval) or 5
+    local memory_limit = tonumber(server.memory_limit_mb)
+    local output_buffer = tonumber(server.output_buffer_mb) or 16
+
+    return {
+        PYROLA_CLIENT_POOL_SIZE = tostring(pool_size),
+        PYROLA_CLIENT_IDLE_TIMEOUT = tostring(idle_timeout),
+        PYROLA_WARM_KERNELS = tostring(warm_kernels),
+        PYROLA_WARM_KERNEL_IDLE_TIMEOUT = tostring(warm_idle_timeout),
+        PYROLA_DAEMON_IDLE_TIMEOUT = tostring(daemon_idle_timeout),
+        PYROLA_KERNEL_AUTO_RESTART = auto_restart,
+        PYROLA_MONITOR_INTERVAL = tostring(monitor_interval),
+        PYROLA_MEMORY_LIMIT_MB = memory_limit and tostring(memory_limit) or nil,
+        PYROLA_OUTPUT_BUFFER_MB = tostring(output_buffer),
+        PYROLA_STATE_DIR = fn.stdpath("state") .. "/pyrola",
+        PYROLA_TRACE_FILE = server.trace_file and fn.expand(server.trace_file) or nil
+    }
+end
+
 local function ensure_server_started()
     if rpc.is_running() then
         return true
@@ -191,20 +306,30 @@ local function ensure_server_started()
         vim.notify("Pyrola: Could not find plugin path.", vim.log.levels.ERROR)
         return false
     end
-    if not rpc.start(python_executable, plugin_path) then
+    local server = M.config.server or {}
+    local socket
+    if server.daemon and fn.has("win32") == 0 then
+        socket = server.socket_path and fn.expand(server.socket_path) or rpc.default_socket_path(python_executable)
+    end
+    if not rpc.start(python_executable, plugin_path, build_server_env(), {
+        framing = server.framing,
+        socket = socket,
+    }) then
         vim.notify("Pyrola: Failed to start server process.", vim.log.levels.ERROR)
         return false
     end
     return true
 end
 
-local function ensure_managed_kernel(filetype)
+local function ensure_managed_kernel(filetype, callback)
     local managed_name = auto_kernel_name(filetype)
     if not managed_name then
-        return nil, string.format("Pyrola: No auto-managed kernel is defined for filetype '%s'.", filetype)
+        callback(nil, string.format("Pyrola: No auto-managed kernel is defined for filetype '%s'.", filetype))
+        return
     end
     if not ensure_server_started() then
-        return nil, "Pyrola: Failed to start server process."
+        callback(nil, "Pyrola: Failed to start server process.")
+        return
     end
 
     local params = { filetype = filetype }
@@ -213,22 +338,26 @@ local function ensure_managed_kernel(filetype)
         params.runtime_command = runtime_command
     end
 
-    local result, err = rpc.request("ensure_managed_kernel", params, 30000)
-    if err then
-        return nil, err
-    end
-    if not result or not result.kernel_name then
-        return nil, string.format("Pyrola: Failed to resolve managed kernel for '%s'.", filetype)
-    end
-    return result.kernel_name, nil
+    rpc.request_async("ensure_managed_kernel", params, function(result, err)
+        if err then
+            callback(nil, err)
+            return
+        end
+        if not result or not result.kernel_name then
+            callback(nil, string.format("Pyrola: Failed to resolve managed kernel for '%s'.", filetype))
+            return
+        end
+        callback(result.kernel_name, nil)
+    end, { timeout_ms = 30000 })
 end
 
-local function resolve_kernel_name(filetype)
+local function resolve_kernel_name(filetype, callback)
     local configured = configured_kernel_name(filetype)
     if configured then
-        return configured, nil
+        callback(configured, nil)
+        return
     end
-    return ensure_managed_kernel(filetype)
+    ensure_managed_kernel(filetype, callback)
 end
 
 local function offer_kernel_install(python_executable, kernelname)
@@ -291,23 +420,35 @@ local function offer_kernel_install(python_executable, kernelname)
     })
 end
 
-local function init_kernel(kernelname)
+local function init_kernel(kernelname, callback)
     -- Try the new RPC server first
     if ensure_server_started() then
-        local result, err = rpc.request("init_kernel", { kernel_name = kernelname }, INIT_KERNEL_TIMEOUT_MS)
-        if err then
-            if string.find(err, "No such kernel") then
-                offer_kernel_install(nil, kernelname)
-            else
-                vim.notify(string.format("Pyrola: Kernel initialization failed: %s", err), vim.log.levels.ERROR)
+        local server = M.config.server or {}
+        local params = {
+            kernel_name = kernelname,
+            -- Editors attached to the same daemon reuse one kernel per name
+            -- and interpreter.
+            shared = server.daemon and server.share_kernels or nil,
+            python_executable = resolve_python_executable(),
+        }
+        rpc.request_async("init_kernel", params, function(result, err)
+            if err then
+                if string.find(err, "No such kernel") then
+                    offer_kernel_install(nil, kernelname)
+                else
+                    vim.notify(string.format("Pyrola: Kernel initialization failed: %s", err), vim.log.levels.ERROR)
+                end
+                callback(nil)
+                return
             end
-            return nil
-        end
-        if result and result.connection_file then
-            return result.connection_file
-        end
-        vim.notify("Pyrola: Kernel initialization failed with empty connection file.", vim.log.levels.ERROR)
-        return nil
+            if result and result.connection_file then
+                callback(result.connection_file)
+                return
+            end
+            vim.notify("Pyrola: Kernel initialization failed with empty connection file.", vim.log.levels.ERROR)
+            callback(nil)
+        end, { timeout_ms = INIT_KERNEL_TIMEOUT_MS })
+        return
     end
 
     -- Fallback to legacy remote plugin for users with existing manifest
@@ -318,13 +459,15 @@ local function init_kernel(kernelname)
         else
             vim.notify(string.format("Pyrola: Kernel initialization failed: %s", result), vim.log.levels.ERROR)
         end
-        return nil
+        callback(nil)
+        return
     end
     if not result or result == "" then
         vim.notify("Pyrola: Kernel initialization failed with empty connection file.", vim.log.levels.ERROR)
-        return nil
+        callback(nil)
+        return
     end
-    return result
+    callback(result)
 end
 
 local function build_repl_env()
@@ -333,17 +476,22 @@ local function build_repl_env()
     local cell_height = tonumber(image.cell_height) or 20
     local max_width_ratio = tonumber(image.max_width_ratio) or 0.5
     local max_height_ratio = tonumber(image.max_height_ratio) or 0.5
+    local repl_output = M.config.repl_output or {}
+    local frame_ms = tonumber(repl_output.frame_ms) or 33
+    local limit_kb = tonumber(repl_output.limit_kb) or 1024
 
     return {
         PYROLA_IMAGE_CELL_WIDTH = tostring(cell_width),
         PYROLA_IMAGE_CELL_HEIGHT = tostring(cell_height),
         PYROLA_IMAGE_MAX_WIDTH_RATIO = tostring(max_width_ratio),
-        PYROLA_IMAGE_MAX_HEIGHT_RATIO = tostring(max_height_ratio)
+        PYROLA_IMAGE_MAX_HEIGHT_RATIO = tostring(max_height_ratio),
+        PYROLA_OUTPUT_FRAME_MS = tostring(math.floor(frame_ms)),
+        PYROLA_OUTPUT_LIMIT_KB = tostring(math.floor(limit_kb))
     }
 end
 
-local function open_terminal(python_executable, kernelname)
-    M.filetype = vim.bo.filetype
+local function open_terminal(python_executable, kernelname, filetype)
+    M.filetype = filetype
     local origin_win = api.nvim_get_current_win()
     if not kernelname then
         vim.notify(
@@ -353,15 +501,6 @@ local function open_terminal(python_executable, kernelname)
         return
     end
 
-    if not M.connection_file_path then
-        local connection_file = init_kernel(kernelname)
-        if not connection_file then
-            return
-        end
-        M.connection_file_path = connection_file
-        register_kernel_cleanup()
-    end
-
     local bufid = api.nvim_create_buf(false, true)
 
     if M.config.split_horizontal then
@@ -578,6 +717,10 @@ function M._on_repl_ready()
     flush_send_queue()
 end
 
+function M._on_output_spilled(path)
+    M.spill_file = path
+end
+
 local function move_cursor_to_next_line(end_row)
     local comment_char = vim.bo.filetype == "cpp" and "//" or "#"
     local line_count = api.nvim_buf_line_count(0)
@@ -745,6 +888,154 @@ local function create_pretty_float(content)
     })
 end
 
+local function warn_partial_output(result)
+    if type(result) ~= "table" or not result.status or result.status == "ok" then
+        return
+    end
+    local reason = result.status == "dead" and "the kernel stopped responding" or "the kernel did not finish in time"
+    vim.notify(string.format("Pyrola: Showing partial output, %s.", reason), vim.log.levels.WARN)
+end
+
+local function open_stream_preview(title)
+    -- Unfocused float that grows as output chunks arrive; replaced by the
+    -- regular inspector float once the final result is in.
+    local width = math.max(20, math.floor(vim.o.columns * 0.6))
+    local height = math.max(4, math.floor(vim.o.lines * 0.6))
+    local bufnr = api.nvim_create_buf(false, true)
+    vim.bo[bufnr].buftype = "nofile"
+    local winid = api.nvim_open_win(bufnr, false, {
+        relative = "editor",
+        width = width,
+        height = height,
+        row = math.max(0, math.floor((vim.o.lines - height) / 2)),
+        col = math.max(0, math.floor((vim.o.columns - width) / 2)),
+        style = "minimal",
+        border = "rounded",
+        title = title,
+        title_pos = "center"
+    })
+    vim.wo[winid].wrap = false
+
+    local lines = {""}
+    local preview = {}
+
+    function preview.append(chunk)
+        if not api.nvim_buf_is_valid(bufnr) then
+            return
+        end
+        local parts = vim.split((chunk:gsub("\\n", "\n")), "\n", {plain = true})
+        local first = #lines
+        lines[first] = lines[first] .. parts[1]
+        for i = 2, #parts do
+            lines[#lines + 1] = parts[i]
+        end
+        api.nvim_buf_set_lines(bufnr, first - 1, -1, false, vim.list_slice(lines, first))
+        vim.cmd("redraw")
+    end
+
+    function preview.close()
+        if api.nvim_win_is_valid(winid) then
+            api.nvim_win_close(winid, true)
+        end
+    end
+
+    return preview
+end
+
+local inspect_pending = nil -- {id = request id, preview = stream preview}
+
+local function inspect_variable(obj)
+    if rpc.is_running() then
+        -- A newer inspection supersedes one still waiting on the kernel.
+        if inspect_pending then
+            rpc.cancel(inspect_pending.id)
+            if inspect_pending.preview then
+                inspect_pending.preview.close()
+            end
+        end
+        local pending = {}
+        local opts = {}
+        if M.config.stream_inspect then
+            opts.on_progress = function(chunk)
+                pending.preview = pending.preview or open_stream_preview(" Inspector ")
+                pending.preview.append(chunk)
+            end
+        end
+        pending.id = rpc.request_async("execute_code", {
+            filetype = M.filetype,
+            connection_file = M.connection_file_path,
+            inspected_variable = obj,
+        }, function(result, err)
+            if inspect_pending == pending then
+                inspect_pending = nil
+            end
+            if pending.preview then
+                pending.preview.close()
+            end
+            if err then
+                vim.notify(string.format("Pyrola: Inspect failed: %s", err), vim.log.levels.ERROR)
+                return
+            end
+            warn_partial_output(result)
+            create_pretty_float((tostring(result and result.output or ""):gsub("\\n", "\n")))
+        end, opts)
+        inspect_pending = pending
+        return
+    end
+
+    local ok, result = pcall(fn.ExecuteKernelCode, M.filetype, M.connection_file_path, obj)
+    if not ok then
+        vim.notify(string.format("Pyrola: Inspect failed: %s", result), vim.log.levels.ERROR)
+        return
+    end
+    create_pretty_float((tostring(result or ""):gsub("\\n", "\n")))
+end
+
+local function globals_row_name(line)
+    local name = line:match("^(%S+)")
+    if not name or name == "Name" or name:match("^─") then
+        return nil
+    end
+    return name
+end
+
+local PREFETCH_DEBOUNCE_MS = 150
+
+local function prefetch_visible_globals(winid, lines, prefetched, requested)
+    -- Inspect every visible row in one kernel round-trip, so <CR> on any of
+    -- them opens instantly.  Failures are ignored; <CR> then asks as usual.
+    if not api.nvim_win_is_valid(winid) then
+        return
+    end
+    local names = {}
+    for lnum = fn.line("w0", winid), fn.line("w$", winid) do
+        local name = lines[lnum] and globals_row_name(lines[lnum])
+        if name and not prefetched[name] and not requested[name] then
+            requested[name] = true
+            table.insert(names, name)
+        end
+    end
+    if #names == 0 then
+        return
+    end
+    return rpc.request_async("inspect_many", {
+        filetype = M.filetype,
+        connection_file = M.connection_file_path,
+        variables = names,
+        prefetch = true,
+    }, function(result)
+        for _, name in ipairs(names) do
+            requested[name] = nil
+        end
+        if not result or result.status ~= "ok" or type(result.results) ~= "table" then
+            return
+        end
+        for name, output in pairs(result.results) do
+            prefetched[name] = (tostring(output):gsub("\\n", "\n"))
+        end
+    end)
+end
+
 local function build_import_check()
     local imports = {}
     for _, dep in ipairs(DEPS) do
@@ -880,19 +1171,20 @@ function M.setup_environment()
                     return
                 end
                 if kernelname == nil then
-                    local managed_kernel, err = ensure_managed_kernel(filetype)
-                    if managed_kernel then
-                        M._deps_checked = true
-                        vim.notify(
-                            string.format("Pyrola: Setup complete. Managed kernel '%s' is ready. Run :Pyrola init to start.", managed_kernel),
-                            vim.log.levels.INFO
-                        )
-                    else
-                        vim.notify(
-                            string.format("Pyrola: Dependencies installed but kernel setup failed: %s", err),
-                            vim.log.levels.ERROR
-                        )
-                    end
+                    ensure_managed_kernel(filetype, function(managed_kernel, err)
+                        if managed_kernel then
+                            M._deps_checked = true
+                            vim.notify(
+                                string.format("Pyrola: Setup complete. Managed kernel '%s' is ready. Run :Pyrola init to start.", managed_kernel),
+                                vim.log.levels.INFO
+                            )
+                        else
+                            vim.notify(
+                                string.format("Pyrola: Dependencies installed but kernel setup failed: %s", err),
+                                vim.log.levels.ERROR
+                            )
+                        end
+                    end)
                 elseif filetype == "python" then
                     vim.notify("Pyrola: Registering kernel...", vim.log.levels.INFO)
                     local register_args = {
@@ -928,7 +1220,7 @@ function M.setup_environment()
     })
 end
 
-local _pyrola_subcommands = { "init", "setup" }
+local _pyrola_subcommands = { "init", "setup", "stats", "status", "output", "spill" }
 
 function M.setup(opts)
     vim.env.PYTHONDONTWRITEBYTECODE = "1"
@@ -945,23 +1237,43 @@ function M.setup(opts)
         })
         M._colorscheme_autocmd = true
     end
+    register_kernel_events()
     if not M.commands_set then
         api.nvim_create_user_command("Pyrola", function(cmd)
-            if cmd.args == "init" then
+            local subcommand = cmd.fargs[1]
+            if subcommand == "init" then
                 M.init()
                 return
             end
-            if cmd.args == "setup" then
+            if subcommand == "setup" then
                 M.setup_environment()
                 return
             end
-            vim.notify("Pyrola: Unknown command. Try :Pyrola init or :Pyrola setup", vim.log.levels.WARN)
+            if subcommand == "stats" then
+                M.show_stats()
+                return
+            end
+            if subcommand == "status" then
+                M.show_status()
+                return
+            end
+            if subcommand == "output" then
+                M.show_output(cmd.fargs[2])
+                return
+            end
+            if subcommand == "spill" then
+                M.open_spill()
+                return
+            end
+            vim.notify("Pyrola: Unknown command. Try :Pyrola init, :Pyrola setup, :Pyrola stats, :Pyrola status,"
+                .. " :Pyrola output [N|error] or :Pyrola spill", vim.log.levels.WARN)
         end, {
-            nargs = 1,
-            complete = function(arg_lead)
+            nargs = "+",
+            complete = function(arg_lead, cmdline)
+                local candidates = cmdline:match("^%S+%s+output%s") and { "error" } or _pyrola_subcommands
                 return vim.tbl_filter(function(s)
                     return s:find(arg_lead, 1, true) == 1
-                end, _pyrola_subcommands)
+                end, candidates)
             end,
         })
         M.commands_set = true
@@ -979,24 +1291,41 @@ function M.init()
     end
     check_timg_available()
     local filetype = vim.bo.filetype
-    local kernelname, kernel_err = resolve_kernel_name(filetype)
-    if not kernelname then
-        vim.notify(
-            kernel_err or string.format("Pyrola: No kernel mapped for filetype '%s'. Update setup.kernel_map.", filetype),
-            vim.log.levels.WARN
-        )
+    if M._initializing then
+        vim.notify("Pyrola: Kernel is still starting.", vim.log.levels.INFO)
         return
     end
-    if not M.connection_file_path then
-        local connection_file = init_kernel(kernelname)
-        if not connection_file then
+    M._initializing = true
+    -- Kernel lookup and startup run in the background; the REPL opens once
+    -- the connection file is known.
+    resolve_kernel_name(filetype, function(kernelname, kernel_err)
+        if not kernelname then
+            M._initializing = false
+            vim.notify(
+                kernel_err or string.format("Pyrola: No kernel mapped for filetype '%s'. Update setup.kernel_map.", filetype),
+                vim.log.levels.WARN
+            )
             return
         end
-        M.connection_file_path = connection_file
-        register_kernel_cleanup()
-    end
-    M.active_kernel_name = kernelname
-    open_terminal(python_executable, kernelname)
+        local function start_repl()
+            M._initializing = false
+            M.active_kernel_name = kernelname
+            open_terminal(python_executable, kernelname, filetype)
+        end
+        if M.connection_file_path then
+            start_repl()
+            return
+        end
+        init_kernel(kernelname, function(connection_file)
+            if not connection_file then
+                M._initializing = false
+                return
+            end
+            M.connection_file_path = connection_file
+            register_kernel_cleanup()
+            start_repl()
+        end)
+    end)
 end
 
 function M.status()
@@ -1040,28 +1369,7 @@ function M.inspect()
         return
     end
 
-    local result, err
-    if rpc.is_running() then
-        result, err = rpc.request("execute_code", {
-            filetype = M.filetype,
-            connection_file = M.connection_file_path,
-            inspected_variable = obj,
-        })
-        if err then
-            vim.notify(string.format("Pyrola: Inspect failed: %s", err), vim.log.levels.ERROR)
-            return
-        end
-        result = tostring(result and result.output or ""):gsub("\\n", "\n")
-    else
-        local ok
-        ok, result = pcall(fn.ExecuteKernelCode, M.filetype, M.connection_file_path, obj)
-        if not ok then
-            vim.notify(string.format("Pyrola: Inspect failed: %s", result), vim.log.levels.ERROR)
-            return
-        end
-        result = tostring(result or ""):gsub("\\n", "\n")
-    end
-    create_pretty_float(result)
+    inspect_variable(obj)
 end
 
 function M.send_visual_to_repl()
@@ -1248,35 +1556,13 @@ function M.interrupt_kernel()
     end
 end
 
-function M.show_globals()
-    if not repl_ready() then
-        return
-    end
-    M.filetype = vim.bo.filetype
-
-    local result, err
-    if rpc.is_running() then
-        result, err = rpc.request("list_globals", {
-            filetype = M.filetype,
-            connection_file = M.connection_file_path,
-        })
-        if err then
-            vim.notify(string.format("Pyrola: Failed to list globals: %s", err), vim.log.levels.ERROR)
-            return
-        end
-        result = tostring(result and result.output or ""):gsub("\\n", "\n")
-    else
-        local ok
-        ok, result = pcall(fn.ListKernelGlobals, M.filetype, M.connection_file_path)
-        if not ok then
-            vim.notify(string.format("Pyrola: Failed to list globals: %s", result), vim.log.levels.ERROR)
-            return
-        end
-        result = tostring(result or ""):gsub("\\n", "\n")
-    end
+local function open_globals_window(result)
     local content_lines = vim.split(result, "\n", {plain = true})
+    local prefetched = {}
+    local requested = {}
+    local prefetch_request
 
-    create_float_window({
+    local winid = create_float_window({
         lines = content_lines,
         title = " Variables ",
         hl_prefix = "PyrolaGlobals",
@@ -1310,37 +1596,357 @@ function M.show_globals()
                 mode = "n",
                 lhs = "<CR>",
                 rhs = function()
-                    local line = api.nvim_get_current_line()
-                    local var_name = line:match("^(%S+)")
-                    if not var_name or var_name == "Name" or var_name:match("^─") then
+                    local var_name = globals_row_name(api.nvim_get_current_line())
+                    if not var_name then
                         return
                     end
-                    local inspect_result, inspect_err
-                    if rpc.is_running() then
-                        inspect_result, inspect_err = rpc.request("execute_code", {
-                            filetype = M.filetype,
-                            connection_file = M.connection_file_path,
-                            inspected_variable = var_name,
-                        })
-                        if inspect_err then
-                            vim.notify(string.format("Pyrola: Inspect failed: %s", inspect_err), vim.log.levels.ERROR)
-                            return
-                        end
-                        inspect_result = tostring(inspect_result and inspect_result.output or ""):gsub("\\n", "\n")
+                    if prefetched[var_name] then
+                        create_pretty_float(prefetched[var_name])
                     else
-                        local inspect_ok
-                        inspect_ok, inspect_result = pcall(fn.ExecuteKernelCode, M.filetype, M.connection_file_path, var_name)
-                        if not inspect_ok then
-                            vim.notify(string.format("Pyrola: Inspect failed: %s", inspect_result), vim.log.levels.ERROR)
-                            return
-                        end
-                        inspect_result = tostring(inspect_result or ""):gsub("\\n", "\n")
+                        inspect_variable(var_name)
                     end
-                    create_pretty_float(inspect_result)
                 end
             }
         }
     })
+
+    if M.config.prefetch_globals and rpc.is_running() then
+        -- Let the float draw first, then fetch what scrolls into view.
+        vim.schedule(function()
+            prefetch_request = prefetch_visible_globals(winid, content_lines, prefetched, requested)
+        end)
+        -- Scrolling fires many events; fetch once it settles.
+        local timer = uv.new_timer()
+        local scrolled = api.nvim_create_autocmd("WinScrolled", {
+            pattern = tostring(winid),
+            callback = function()
+                timer:stop()
+                timer:start(PREFETCH_DEBOUNCE_MS, 0, vim.schedule_wrap(function()
+                    prefetch_request = prefetch_visible_globals(winid, content_lines, prefetched, requested)
+                        or prefetch_request
+                end))
+            end
+        })
+        api.nvim_create_autocmd("WinClosed", {
+            pattern = tostring(winid),
+            once = true,
+            callback = function()
+                pcall(api.nvim_del_autocmd, scrolled)
+                timer:stop()
+                timer:close()
+                rpc.cancel(prefetch_request)
+            end
+        })
+    end
+end
+
+function M.show_globals()
+    if not repl_ready() then
+        return
+    end
+    M.filetype = vim.bo.filetype
+
+    if rpc.is_running() then
+        rpc.request_async("list_globals", {
+            filetype = M.filetype,
+            connection_file = M.connection_file_path,
+        }, function(result, err)
+            if err then
+                vim.notify(string.format("Pyrola: Failed to list globals: %s", err), vim.log.levels.ERROR)
+                return
+            end
+            warn_partial_output(result)
+            open_globals_window((tostring(result and result.output or ""):gsub("\\n", "\n")))
+        end)
+        return
+    end
+
+    local ok, result = pcall(fn.ListKernelGlobals, M.filetype, M.connection_file_path)
+    if not ok then
+        vim.notify(string.format("Pyrola: Failed to list globals: %s", result), vim.log.levels.ERROR)
+        return
+    end
+    open_globals_window((tostring(result or ""):gsub("\\n", "\n")))
+end
+
+local function format_bytes(size)
+    size = tonumber(size) or 0
+    if size >= 1048576 then
+        return string.format("%.1fM", size / 1048576)
+    elseif size >= 1024 then
+        return string.format("%.1fK", size / 1024)
+    end
+    return string.format("%dB", size)
+end
+
+local function format_ms(value)
+    return value and string.format("%.1f", value) or "-"
+end
+
+function M.show_stats()
+    if not rpc.is_running() then
+        vim.notify("Pyrola: Server is not running.", vim.log.levels.WARN)
+        return
+    end
+    local stats, err = rpc.request("stats", {})
+    if err then
+        vim.notify(string.format("Pyrola: Failed to read stats: %s", err), vim.log.levels.ERROR)
+        return
+    end
+
+    -- Transport is what Neovim waited on top of the time spent in the server.
+    local client = rpc.latency_stats()
+    local row_format = "%-22s %6s %4s %8s %8s %8s %8s %8s %7s %7s"
+    local lines = {
+        string.format("Uptime %.0fs   in %s   out %s",
+            stats.uptime_s or 0, format_bytes(stats.bytes_in), format_bytes(stats.bytes_out)),
+        "",
+        string.format(row_format, "Method", "Calls", "Err", "p50 ms", "p95 ms", "p99 ms",
+            "kernel", "transp", "In", "Out"),
+    }
+    table.insert(lines, string.rep("─", #lines[3]))
+
+    local names = vim.tbl_keys(stats.methods or {})
+    table.sort(names)
+    for _, name in ipairs(names) do
+        local entry = stats.methods[name]
+        local latency = type(entry.latency_ms) == "table" and entry.latency_ms or {}
+        local kernel = type(entry.phases_ms) == "table" and entry.phases_ms.kernel or nil
+        local transport
+        if client[name] and latency.p50 then
+            transport = math.max(0, client[name].p50 - latency.p50)
+        end
+        table.insert(lines, string.format(row_format, name, entry.calls, entry.errors,
+            format_ms(latency.p50), format_ms(latency.p95), format_ms(latency.p99),
+            format_ms(type(kernel) == "table" and kernel.p50 or nil), format_ms(transport),
+            format_bytes(entry.bytes_in), format_bytes(entry.bytes_out)))
+    end
+    if #names == 0 then
+        table.insert(lines, "(no requests yet)")
+    end
+
+    create_float_window({
+        lines = lines,
+        title = " Pyrola stats ",
+        hl_prefix = "PyrolaStats",
+        on_content_highlight = function(bufnr, ns, content)
+            for i, line in ipairs(content) do
+                if i == 3 then
+                    api.nvim_buf_add_highlight(bufnr, ns, "Title", i - 1, 0, -1)
+                elseif line:match("^─") then
+                    api.nvim_buf_add_highlight(bufnr, ns, "Comment", i - 1, 0, -1)
+                end
+            end
+        end
+    })
+end
+
+local sparkline_blocks = { "▁", "▂", "▃", "▄", "▅", "▆", "▇", "█" }
+
+local function sparkline(values)
+    local low, high = math.huge, 0
+    for _, value in ipairs(values) do
+        low, high = math.min(low, value), math.max(high, value)
+    end
+    local parts = {}
+    for _, value in ipairs(values) do
+        local level = high > low and math.floor((value - low) / (high - low) * 7 + 0.5) or 0
+        table.insert(parts, sparkline_blocks[level + 1])
+    end
+    return table.concat(parts)
+end
+
+local function format_percent(value)
+    return value ~= nil and value ~= vim.NIL and string.format("%.0f%%", value) or "-"
+end
+
+function M.show_status()
+    if not rpc.is_running() then
+        vim.notify("Pyrola: Server is not running.", vim.log.levels.WARN)
+        return
+    end
+    rpc.request_async("kernel_resources", { samples = 40 }, function(result, err)
+        if err then
+            vim.notify(string.format("Pyrola: Failed to read kernel resources: %s", err), vim.log.levels.ERROR)
+            return
+        end
+        if not result.available then
+            vim.notify("Pyrola: Kernel resource sampling needs psutil or /proc.", vim.log.levels.WARN)
+            return
+        end
+
+        local limit = result.memory_limit ~= vim.NIL and result.memory_limit or nil
+        local row_format = "%-10s %8s %6s %7s %8s %8s %7s"
+        local lines = {
+            string.format("Sampled every %gs%s", result.interval,
+                limit and string.format("   limit %s", format_bytes(limit)) or ""),
+            "",
+            string.format(row_format, "Kernel", "RSS", "CPU", "Threads", "Children", "ch. RSS", "ch. CPU"),
+        }
+        table.insert(lines, string.rep("─", #lines[3]))
+
+        for _, kernel in ipairs(result.kernels or {}) do
+            local samples = kernel.samples or {}
+            local last = samples[#samples]
+            if last then
+                local current = kernel.connection_file == M.connection_file_path and "*" or " "
+                table.insert(lines, string.format(row_format, current .. kernel.kernel_name,
+                    format_bytes(last.rss), format_percent(last.cpu), last.threads, last.children,
+                    format_bytes(last.children_rss), format_percent(last.children_cpu)))
+                local history = {}
+                for _, sample in ipairs(samples) do
+                    table.insert(history, sample.rss + sample.children_rss)
+                end
+                local total = last.rss + last.children_rss
+                table.insert(lines, string.format("  pid %d  %s%s", last.pid, sparkline(history),
+                    limit and string.format("  %.0f%% of limit", total / limit * 100) or ""))
+            end
+        end
+        if #lines == 4 then
+            table.insert(lines, "(no running kernels)")
+        end
+
+        create_float_window({
+            lines = lines,
+            title = " Pyrola status ",
+            hl_prefix = "PyrolaStatus",
+            on_content_highlight = function(bufnr, ns, content)
+                for i, line in ipairs(content) do
+                    if i == 3 then
+                        api.nvim_buf_add_highlight(bufnr, ns, "Title", i - 1, 0, -1)
+                    elseif line:match("^─") or line:match("^  pid") then
+                        api.nvim_buf_add_highlight(bufnr, ns, "Comment", i - 1, 0, -1)
+                    end
+                end
+            end
+        })
+    end)
+end
+
+local function png_size(data)
+    local ok, header = pcall(vim.base64.decode, data:sub(1, 32))
+    if not ok or #header < 24 then
+        return nil
+    end
+    local function uint32(offset)
+        local b1, b2, b3, b4 = header:byte(offset, offset + 3)
+        return ((b1 * 256 + b2) * 256 + b3) * 256 + b4
+    end
+    return uint32(17), uint32(21)
+end
+
+local function output_lines(output, lines, images)
+    if output.type == "stream" then
+        vim.list_extend(lines, vim.split((output.text:gsub("\n$", "")), "\n", { plain = true }))
+    elseif output.type == "error" then
+        for _, entry in ipairs(output.traceback or {}) do
+            vim.list_extend(lines, vim.split((entry:gsub("\27%[[%d;]*m", "")), "\n", { plain = true }))
+        end
+    else
+        local data = type(output.data) == "table" and output.data or {}
+        local png = data["image/png"]
+        if type(png) == "string" then
+            local width, height = png_size(png)
+            table.insert(images, { data = png, width = width, height = height })
+            table.insert(lines, string.format("[image %d: %sx%s png, %s]  press i to view", #images,
+                width or "?", height or "?", format_bytes(#png * 3 / 4)))
+        elseif type(data["text/plain"]) == "string" then
+            vim.list_extend(lines, vim.split(data["text/plain"], "\n", { plain = true }))
+        else
+            local mimes = vim.tbl_keys(data)
+            table.sort(mimes)
+            table.insert(lines, string.format("[%s]", table.concat(mimes, ", ")))
+        end
+    end
+end
+
+-- Show a recorded cell output from the server: the last cell, cell N, or
+-- with "error" the last cell that raised.  The kernel is not involved.
+function M.show_output(which)
+    if not rpc.is_running() or not M.connection_file_path then
+        vim.notify("Pyrola: No kernel is running.", vim.log.levels.WARN)
+        return
+    end
+    local params = { connection_file = M.connection_file_path }
+    if which == "error" then
+        params.error = true
+    elseif which ~= nil then
+        params.execution_count = tonumber(which)
+        if not params.execution_count then
+            vim.notify("Pyrola: Usage: :Pyrola output [N|error]", vim.log.levels.WARN)
+            return
+        end
+    end
+    rpc.request_async("kernel_output", params, function(result, err)
+        if err then
+            vim.notify(string.format("Pyrola: %s", err), vim.log.levels.WARN)
+            return
+        end
+        local cell = result.cell
+        local duration = cell.duration_ms ~= vim.NIL and string.format(", %.0f ms", cell.duration_ms) or ""
+        local lines = { string.format("In [%d]  %s%s", cell.execution_count, cell.status, duration) }
+        vim.list_extend(lines, vim.split(cell.code, "\n", { plain = true }))
+        table.insert(lines, string.rep("─", 40))
+        local output_start = #lines + 1
+        local images = {}
+        local error_line
+        for _, output in ipairs(cell.outputs) do
+            output_lines(output, lines, images)
+            if output.type == "error" then
+                error_line = #lines
+            end
+        end
+        if cell.truncated then
+            table.insert(lines, "[output truncated]")
+        end
+        if #lines < output_start then
+            table.insert(lines, "(no output)")
+        end
+
+        local winid = create_float_window({
+            lines = lines,
+            title = string.format(" Out [%d] ", cell.execution_count),
+            hl_prefix = "PyrolaOutput",
+            on_content_highlight = function(bufnr, ns, content)
+                api.nvim_buf_add_highlight(bufnr, ns, cell.status == "error" and "ErrorMsg" or "Title", 0, 0, -1)
+                for i = 2, output_start - 1 do
+                    api.nvim_buf_add_highlight(bufnr, ns, "Comment", i - 1, 0, -1)
+                end
+                for i = output_start, #content do
+                    if content[i]:match("^%[image %d+:") or content[i]:match("^%[output truncated%]") then
+                        api.nvim_buf_add_highlight(bufnr, ns, "Special", i - 1, 0, -1)
+                    end
+                end
+            end,
+            keymaps = {
+                {
+                    mode = "n",
+                    lhs = "i",
+                    rhs = function()
+                        local index = tonumber(api.nvim_get_current_line():match("^%[image (%d+):")) or 1
+                        local image = images[index]
+                        if image then
+                            require("pyrola.image").show_image(image.data, image.width, image.height)
+                        end
+                    end
+                }
+            }
+        })
+        if error_line then
+            -- Land on the exception itself, the last line of the traceback.
+            api.nvim_win_set_cursor(winid, { error_line, 0 })
+        end
+    end)
+end
+
+function M.open_spill()
+    local path = M.spill_file
+    if not path or fn.filereadable(path) == 0 then
+        vim.notify("Pyrola: No REPL output has been written to a file.", vim.log.levels.INFO)
+        return
+    end
+    vim.cmd("split " .. fn.fnameescape(path))
+    vim.bo.readonly = true
 end
 
 -- Image history functions
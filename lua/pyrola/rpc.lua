@@ -1,113 +1,404 @@
 --- Pyrola RPC module.
---- Manages a persistent Python server process and provides synchronous
---- JSON-over-stdin/stdout communication.
+--- Manages a persistent Python server process and provides synchronous and
+--- callback-based JSON-over-stdin/stdout communication. Server notifications (messages
+--- with a `method` and no `id`) are routed to registered handlers.
+--- In daemon mode the same protocol runs over a unix socket to a server
+--- shared by every Neovim instance of the user.
+--- Replies can be switched to length-prefixed msgpack frames, which are
+--- decoded with vim.mpack once per frame.
 
 local fn = vim.fn
+local uv = vim.uv or vim.loop
 
 local M = {}
 
-local _job_id = nil
+local _job_id = nil -- job id, or channel id of the daemon socket
+local _is_socket = false
 local _next_id = 0
-local _pending = {} -- id -> {result=..., err=..., done=bool}
-local _stdout_buf = "" -- partial line buffer
+local _pending = {} -- id -> {result=..., err=..., done=bool, on_progress=fn, on_reply=fn}
+local _handlers = {} -- notification method -> list of handlers
+local _line_parts = {} -- pieces of the current partial line
+local _framing = "json" -- reply framing: "json" lines or "msgpack" frames
+local _frame_chunks = {} -- received bytes not yet decoded
+local _frame_bytes = 0 -- total length of _frame_chunks
+local _frame_len = nil -- payload length of the frame being received
 local _stderr_buf = ""
 local _last_error = nil
+local _latency = {} -- method -> {calls=n, samples={ms...}, next=i}
 
-local function handle_stdout_line(line)
-    if not line or line == "" then
+local LATENCY_SAMPLES = 256
+
+local function record_latency(method, elapsed_ms)
+    local entry = _latency[method]
+    if not entry then
+        entry = { calls = 0, samples = {}, next = 1 }
+        _latency[method] = entry
+    end
+    entry.calls = entry.calls + 1
+    entry.samples[entry.next] = elapsed_ms
+    entry.next = entry.next % LATENCY_SAMPLES + 1
+end
+
+local function percentile(sorted, q)
+    return sorted[math.max(1, math.ceil(q * #sorted))]
+end
+
+local function handle_notification(method, params)
+    if method == "progress" then
+        local entry = type(params) == "table" and _pending[params.id] or nil
+        if entry and entry.on_progress and type(params.chunk) == "string" then
+            local ok, err = pcall(entry.on_progress, params.chunk)
+            if not ok then
+                vim.notify(string.format("Pyrola: progress handler failed: %s", err), vim.log.levels.DEBUG)
+            end
+        end
         return
     end
-    local ok, resp = pcall(vim.json.decode, line)
-    if ok and resp and resp.id ~= nil then
+    for _, handler in ipairs(_handlers[method] or {}) do
+        local ok, err = pcall(handler, params)
+        if not ok then
+            vim.notify(string.format("Pyrola: %s handler failed: %s", method, err), vim.log.levels.DEBUG)
+        end
+    end
+end
+
+local function handle_message(resp)
+    if type(resp) ~= "table" then
+        return
+    end
+    if resp.method then
+        handle_notification(resp.method, resp.params)
+        return
+    end
+    if resp.id ~= nil then
         local cb = _pending[resp.id]
         if cb then
             cb.result = resp.result
             cb.err = resp.error
             cb.done = true
+            if cb.on_reply then
+                cb.on_reply(resp.result, resp.error)
+            end
+        end
+    end
+end
+
+local function handle_stdout_line(line)
+    if not line or line == "" then
+        return
+    end
+    local ok, resp = pcall(vim.json.decode, line)
+    if ok then
+        handle_message(resp)
+    end
+end
+
+local function stop_timer(entry)
+    local timer = entry.timer
+    if timer and not timer:is_closing() then
+        timer:stop()
+        timer:close()
+    end
+    entry.timer = nil
+end
+
+--- Forget every pending request; callbacks of asynchronous ones get `err`.
+local function fail_pending(err)
+    local pending = _pending
+    _pending = {}
+    for _, entry in pairs(pending) do
+        stop_timer(entry)
+        if entry.callback then
+            local callback = entry.callback
+            vim.schedule(function()
+                callback(nil, err)
+            end)
+        end
+    end
+end
+
+local function reset_buffers()
+    _line_parts = {}
+    _framing = "json"
+    _frame_chunks = {}
+    _frame_bytes = 0
+    _frame_len = nil
+end
+
+--- Rebuild raw bytes from job output items starting at `first`: items are
+--- split on newlines and carry NUL bytes as "\n".
+local function join_binary(data, first)
+    local parts = {}
+    for i = first, #data do
+        parts[#parts + 1] = (data[i]:gsub("\n", "\0"))
+    end
+    return table.concat(parts, "\n")
+end
+
+local function feed_frames(bytes)
+    if bytes ~= "" then
+        _frame_chunks[#_frame_chunks + 1] = bytes
+        _frame_bytes = _frame_bytes + #bytes
+    end
+    while true do
+        local need = _frame_len or 4
+        if _frame_bytes < need then
+            return
         end
+        local buf = #_frame_chunks == 1 and _frame_chunks[1] or table.concat(_frame_chunks)
+        local rest
+        if _frame_len then
+            local ok, resp = pcall(vim.mpack.decode, buf:sub(1, _frame_len))
+            if ok then
+                handle_message(resp)
+            end
+            _frame_len = nil
+        else
+            local b1, b2, b3, b4 = buf:byte(1, 4)
+            _frame_len = ((b1 * 256 + b2) * 256 + b3) * 256 + b4
+        end
+        rest = buf:sub(need + 1)
+        _frame_chunks = rest ~= "" and { rest } or {}
+        _frame_bytes = #rest
     end
 end
 
+-- Exposed for the framing tests.
+M._feed_frames = feed_frames
+
+local function on_stdout(_, data, _)
+    if not data then
+        return
+    end
+    if _framing == "msgpack" then
+        feed_frames(join_binary(data, 1))
+        return
+    end
+    for i, chunk in ipairs(data) do
+        _line_parts[#_line_parts + 1] = chunk
+        if i < #data or chunk == "" then
+            local line = table.concat(_line_parts)
+            _line_parts = {}
+            handle_stdout_line(line)
+            if _framing == "msgpack" then
+                -- Everything after the acknowledgement line is framed.
+                feed_frames(join_binary(data, i + 1))
+                return
+            end
+        end
+    end
+end
+
+local function send(method, params, entry)
+    _next_id = _next_id + 1
+    local id = _next_id
+    _pending[id] = entry
+
+    params = params or {}
+    if entry.on_progress then
+        params = vim.tbl_extend("force", params, { stream = true })
+    end
+    local request = vim.json.encode({ id = id, method = method, params = params })
+    fn.chansend(_job_id, request .. "\n")
+    return id
+end
+
+--- Ask the server for msgpack framing; replies switch over as soon as the
+--- acknowledgement is read. Keeps JSON when the server cannot encode msgpack.
+local function negotiate_framing()
+    if not vim.mpack then
+        return
+    end
+    local entry = { done = false }
+    entry.on_reply = function(result)
+        if type(result) == "table" and result.framing == "msgpack" then
+            _framing = "msgpack"
+        end
+    end
+    local id = send("set_framing", { framing = "msgpack" }, entry)
+    vim.wait(5000, function()
+        return entry.done
+    end, 10)
+    _pending[id] = nil
+end
+
+local function on_socket_data(chan, data, name)
+    if data and #data == 1 and data[1] == "" then
+        -- EOF: the daemon went away.
+        if _job_id == chan then
+            _job_id = nil
+            _is_socket = false
+            reset_buffers()
+            fail_pending(_last_error or "server connection closed")
+        end
+        return
+    end
+    on_stdout(chan, data, name)
+end
+
+--- Why the directory holding `path` cannot be trusted, or nil. As with tmux,
+--- it must be a real directory owned by this user and closed to everyone
+--- else; otherwise another user could be listening on the socket.
+local function socket_dir_problem(path)
+    local dir = fn.fnamemodify(path, ":h")
+    local st = uv.fs_lstat(dir)
+    if not st then
+        return nil
+    end
+    if st.type ~= "directory" then
+        return dir .. " is not a directory"
+    end
+    if st.uid ~= uv.getuid() then
+        return dir .. " is owned by another user"
+    end
+    if bit.band(st.mode, 63) ~= 0 then
+        return dir .. " is accessible to other users (mode must be 0700)"
+    end
+    return nil
+end
+
+local function sockconnect(path)
+    local problem = socket_dir_problem(path)
+    if problem then
+        _last_error = "refusing to use server socket: " .. problem
+        return nil
+    end
+    local ok, chan = pcall(fn.sockconnect, "pipe", path, { on_data = on_socket_data })
+    if ok and chan and chan > 0 then
+        return chan
+    end
+    return nil
+end
+
+--- Connect to the daemon at `path`, starting a detached one when nothing is
+--- listening. Concurrent starts are safe: a second daemon exits at once.
+local function connect_daemon(python_executable, server_script, env, path, on_stderr)
+    local chan = sockconnect(path)
+    if chan then
+        return chan
+    end
+    if socket_dir_problem(path) then
+        return nil
+    end
+    local daemon = fn.jobstart({ python_executable, server_script, "--daemon", "--socket", path }, {
+        cwd = fn.fnamemodify(server_script, ":h"),
+        env = env,
+        detach = true,
+        on_stderr = on_stderr,
+    })
+    if not daemon or daemon <= 0 then
+        _last_error = "failed to start server daemon"
+        return nil
+    end
+    vim.wait(10000, function()
+        chan = sockconnect(path)
+        return chan ~= nil
+    end, 50)
+    if not chan and not socket_dir_problem(path) then
+        local msg = _stderr_buf:gsub("%s+$", "")
+        _last_error = msg ~= "" and msg or "server daemon did not start listening"
+    end
+    return chan
+end
+
+--- Default per-user socket of the shared server daemon for one interpreter;
+--- editors using another Python get a daemon of their own.
+---@param python_executable string
+---@return string
+function M.default_socket_path(python_executable)
+    local base = (vim.env.XDG_RUNTIME_DIR or vim.env.TMPDIR or "/tmp"):gsub("/+$", "")
+    return string.format("%s/pyrola-%d/server-%s.sock", base, uv.getuid(), fn.sha256(python_executable):sub(1, 12))
+end
+
+--- Register a handler for server notifications of the given method.
+---@param method string  notification method name
+---@param handler fun(params: any)
+function M.on_notification(method, handler)
+    _handlers[method] = _handlers[method] or {}
+    table.insert(_handlers[method], handler)
+end
+
 --- Start the Python server process.
 ---@param python_executable string  path to python3
 ---@param plugin_path string  path to pyrola.nvim root
+---@param env? table  extra environment variables for the server
+---@param opts? {framing?: "json"|"msgpack", socket?: string}  reply framing to
+--- negotiate; with `socket`, attach to (or start) the shared daemon there
 ---@return boolean success
-function M.start(python_executable, plugin_path)
+function M.start(python_executable, plugin_path, env, opts)
     if _job_id and _job_id > 0 then
         return true
     end
 
     _last_error = nil
     _stderr_buf = ""
+    reset_buffers()
+    opts = opts or {}
     local server_script = plugin_path .. "/rplugin/python3/server.py"
-    _job_id = fn.jobstart({ python_executable, server_script }, {
-        cwd = plugin_path .. "/rplugin/python3",
-        on_stdout = function(_, data, _)
-            if not data then
-                return
-            end
-            for i, chunk in ipairs(data) do
-                local is_last = i == #data
-                if is_last and chunk ~= "" then
-                    _stdout_buf = _stdout_buf .. chunk
-                else
-                    local line = _stdout_buf .. chunk
-                    _stdout_buf = ""
-                    handle_stdout_line(line)
-                end
-            end
-        end,
-        on_stderr = function(_, data, _)
-            if not data then
-                return
-            end
-            for _, chunk in ipairs(data) do
-                if chunk and chunk ~= "" then
-                    _stderr_buf = _stderr_buf .. chunk .. "\n"
-                end
+    local on_stderr = function(_, data, _)
+        if not data then
+            return
+        end
+        for _, chunk in ipairs(data) do
+            if chunk and chunk ~= "" then
+                _stderr_buf = _stderr_buf .. chunk .. "\n"
             end
-        end,
-        on_exit = function(_, code, _)
-            if code ~= 0 then
-                local msg = _stderr_buf:gsub("%s+$", "")
-                if msg == "" then
-                    msg = string.format("server exited with code %d", code)
+        end
+    end
+
+    if opts.socket then
+        _job_id = connect_daemon(python_executable, server_script, env, opts.socket, on_stderr)
+        _is_socket = _job_id ~= nil
+    else
+        _job_id = fn.jobstart({ python_executable, server_script }, {
+            cwd = plugin_path .. "/rplugin/python3",
+            env = env,
+            on_stdout = on_stdout,
+            on_stderr = on_stderr,
+            on_exit = function(_, code, _)
+                if code ~= 0 then
+                    local msg = _stderr_buf:gsub("%s+$", "")
+                    if msg == "" then
+                        msg = string.format("server exited with code %d", code)
+                    end
+                    _last_error = msg
                 end
-                _last_error = msg
-            end
-            _job_id = nil
-            _stdout_buf = ""
-            _pending = {}
-        end,
-    })
+                _job_id = nil
+                reset_buffers()
+                fail_pending(_last_error or "server exited before replying")
+            end,
+        })
+    end
 
     if not _job_id or _job_id <= 0 then
         _job_id = nil
         return false
     end
+    if opts.framing == "msgpack" then
+        negotiate_framing()
+    end
     return true
 end
 
 --- Send a request and wait synchronously for the response.
+--- With `opts.on_progress`, the request is sent in streaming mode and the
+--- callback receives output chunks while waiting for the final result.
 ---@param method string  RPC method name
 ---@param params table   method parameters
 ---@param timeout_ms? number  timeout in milliseconds (default 10000)
+---@param opts? {on_progress?: fun(chunk: string)}
 ---@return any result, string|nil err
-function M.request(method, params, timeout_ms)
+function M.request(method, params, timeout_ms, opts)
     timeout_ms = timeout_ms or 10000
+    opts = opts or {}
 
     if not _job_id or _job_id <= 0 then
         return nil, _last_error or "server not running"
     end
 
-    _next_id = _next_id + 1
-    local id = _next_id
-
-    local entry = { result = nil, err = nil, done = false }
-    _pending[id] = entry
-
-    local request = vim.json.encode({ id = id, method = method, params = params or {} })
-    fn.chansend(_job_id, request .. "\n")
+    local entry = { result = nil, err = nil, done = false, on_progress = opts.on_progress }
+    local started = uv.hrtime()
+    local id = send(method, params, entry)
 
     -- Block until response arrives or timeout
     local ok = vim.wait(timeout_ms, function()
@@ -122,6 +413,7 @@ function M.request(method, params, timeout_ms)
         end
         return nil, "request timed out"
     end
+    record_latency(method, (uv.hrtime() - started) / 1e6)
 
     if entry.err then
         return nil, entry.err
@@ -130,15 +422,97 @@ function M.request(method, params, timeout_ms)
     return entry.result, nil
 end
 
+--- Send a request without blocking. `callback(result, err)` runs on the main
+--- loop once the reply arrives, the timeout expires or the server exits.
+--- With `opts.on_progress`, the request is sent in streaming mode.
+---@param method string  RPC method name
+---@param params table   method parameters
+---@param callback fun(result: any, err: string|nil)
+---@param opts? {timeout_ms?: number, on_progress?: fun(chunk: string)}
+---@return integer|nil id  request id for M.cancel, nil when not sent
+function M.request_async(method, params, callback, opts)
+    opts = opts or {}
+    local timeout_ms = opts.timeout_ms or 10000
+
+    if not _job_id or _job_id <= 0 then
+        local err = _last_error or "server not running"
+        vim.schedule(function()
+            callback(nil, err)
+        end)
+        return nil
+    end
+
+    local entry = { done = false, on_progress = opts.on_progress, callback = callback }
+    local started = uv.hrtime()
+    local id = send(method, params, entry)
+
+    entry.on_reply = function(result, err)
+        _pending[id] = nil
+        stop_timer(entry)
+        record_latency(method, (uv.hrtime() - started) / 1e6)
+        vim.schedule(function()
+            callback(result, err)
+        end)
+    end
+    entry.timer = uv.new_timer()
+    entry.timer:start(timeout_ms, 0, vim.schedule_wrap(function()
+        if _pending[id] ~= entry then
+            return
+        end
+        _pending[id] = nil
+        stop_timer(entry)
+        callback(nil, "request timed out")
+    end))
+    return id
+end
+
+--- Stop waiting for an asynchronous request; its callback will not run.
+--- The server still finishes the request, and its reply is dropped.
+---@param id integer|nil  id returned by M.request_async
+---@return boolean cancelled  false if the request had already completed
+function M.cancel(id)
+    local entry = id and _pending[id]
+    if not entry or not entry.callback then
+        return false
+    end
+    _pending[id] = nil
+    stop_timer(entry)
+    return true
+end
+
+--- Round-trip latency of completed requests as seen from Neovim, per method.
+--- Percentiles cover the last requests of each method.
+---@return table<string, {calls: integer, p50: number, p95: number, p99: number}>
+function M.latency_stats()
+    local stats = {}
+    for method, entry in pairs(_latency) do
+        local sorted = vim.deepcopy(entry.samples)
+        table.sort(sorted)
+        stats[method] = {
+            calls = entry.calls,
+            p50 = percentile(sorted, 0.50),
+            p95 = percentile(sorted, 0.95),
+            p99 = percentile(sorted, 0.99),
+        }
+    end
+    return stats
+end
+
 --- Stop the server process.
 function M.stop()
     if _job_id and _job_id > 0 then
-        fn.jobstop(_job_id)
+        if _is_socket then
+            -- Only this editor disconnects; the daemon keeps serving others.
+            pcall(fn.chanclose, _job_id)
+        else
+            fn.jobstop(_job_id)
+        end
         _job_id = nil
     end
-    _stdout_buf = ""
+    _is_socket = false
+    reset_buffers()
     _stderr_buf = ""
-    _pending = {}
+    fail_pending("server stopped")
 end
 
 --- Check if the server is running.
@@ -0,0 +1,101 @@
+"""Measure how quickly server.py answers after it is launched.
+
+Starts the server several times, the way rpc.lua does, and records per run:
+
+  first  time from spawn until the first ``ping`` is answered
+  ready  time until ``ping`` reports jupyter_client as loaded
+
+Prints min / median / max for both.  With ``--budget-ms`` the exit status is
+1 when the median time to first response exceeds the budget, so the script
+can guard against startup regressions.
+
+Usage: python bench_startup.py [--runs N] [--python PATH] [--budget-ms MS]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+READY_TIMEOUT = 30.0
+
+
+def _ping(proc, req_id):
+    proc.stdin.write(json.dumps({"id": req_id, "method": "ping", "params": {}}) + "\n")
+    proc.stdin.flush()
+    while True:
+        line = proc.stdout.readline()
+        if not line:
+            raise RuntimeError("server exited before replying")
+        response = json.loads(line)
+        if response.get("id") == req_id:
+            return response["result"]
+
+
+def measure_once(python):
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [python, SERVER],
+        cwd=os.path.dirname(SERVER),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        bufsize=1,
+    )
+    try:
+        result = _ping(proc, 1)
+        first = time.perf_counter() - started
+        req_id = 1
+        while not result.get("ready"):
+            if time.perf_counter() - started > READY_TIMEOUT:
+                raise RuntimeError(f"server not ready after {READY_TIMEOUT:.0f} s")
+            time.sleep(0.005)
+            req_id += 1
+            result = _ping(proc, req_id)
+        ready = time.perf_counter() - started
+    finally:
+        proc.stdin.close()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return first, ready
+
+
+def _summary(label, samples):
+    ms = [value * 1000 for value in samples]
+    return (
+        f"{label:<6} min {min(ms):7.1f} ms   median {statistics.median(ms):7.1f} ms"
+        f"   max {max(ms):7.1f} ms"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time to first response of server.py")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    firsts, readies = [], []
+    for run in range(1, max(1, args.runs) + 1):
+        first, ready = measure_once(args.python)
+        firsts.append(first)
+        readies.append(ready)
+        print(f"run {run:>3}: first {first * 1000:7.1f} ms   ready {ready * 1000:7.1f} ms")
+
+    print(_summary("first", firsts))
+    print(_summary("ready", readies))
+
+    if args.budget_ms is not None and statistics.median(firsts) * 1000 > args.budget_ms:
+        print(f"median time to first response exceeds {args.budget_ms:.0f} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
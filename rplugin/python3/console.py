@@ -6,6 +6,8 @@ import argparse
 import atexit
 import asyncio
 import base64
+import collections
+import hashlib
 import io
 import json
 import os
@@ -19,12 +21,14 @@ from threading import Lock, Thread
 from typing import List, Optional
 
 import pynvim
-from jupyter_client import BlockingKernelClient
+from jupyter_client import AsyncKernelClient
 from PIL import Image
 from prompt_toolkit import print_formatted_text
 from prompt_toolkit.formatted_text import ANSI, HTML
 from prompt_toolkit.history import InMemoryHistory
+from prompt_toolkit.filters import Condition
 from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.keys import Keys
 from prompt_toolkit.lexers import PygmentsLexer
 from prompt_toolkit.shortcuts import PromptSession
 from prompt_toolkit.styles import Style
@@ -37,6 +41,22 @@ IMAGE_MIME_MAP = {
     "image/svg+xml": "svg",
 }
 IMAGE_MIME_TYPES = tuple(IMAGE_MIME_MAP.keys())
+# While executing: how often to check that the kernel is still alive, and how
+# long to wait for it to go idle after an interrupt.
+KERNEL_CHECK_INTERVAL = 1.0
+INTERRUPT_TIMEOUT = 5.0
+# Stream output is written at most once per frame; past the limit, the rest
+# of an execution's output goes to a file.
+OUTPUT_FRAME_MS = 33
+OUTPUT_LIMIT_KB = 1024
+# timg processes run at once, and images allowed to wait behind them.
+IMAGE_RENDER_WORKERS = 2
+IMAGE_QUEUE_DEPTH = 8
+IMAGE_RENDER_TIMEOUT = 15
+# Resized images kept for re-display, and how soon a repeat of the image just
+# sent to Neovim is ignored.
+IMAGE_CACHE_BYTES = 32 * 1024 * 1024
+IMAGE_DEDUPE_WINDOW = 1.0
 
 
 def _gradient_ansi_lines(lines, start, end_color):
@@ -100,6 +120,202 @@ def _read_env_float(name, default):
     return min(value, 1.0)
 
 
+def _collapse_carriage_returns(text):
+    """Keep only the last state of each line rewritten with ``\\r``."""
+    if "\r" not in text:
+        return text
+    lines = text.replace("\r\n", "\n").split("\n")
+    for index, line in enumerate(lines):
+        if "\r" in line:
+            parts = line.split("\r")
+            latest = next((part for part in reversed(parts) if part), "")
+            # A line ending in \r leaves the cursor at its start.
+            lines[index] = "\r" + latest + ("\r" if not parts[-1] else "")
+    return "\n".join(lines)
+
+
+class OutputStage:
+    """Coalesce stream output into at most one terminal write per frame.
+
+    Text is buffered in order across stdout and stderr and written every
+    ``interval`` seconds, with progress-bar style ``\\r`` updates collapsed to
+    their latest state.  Once an execution has written ``limit`` bytes, the
+    rest of its output goes to a file in ``spill_dir``; a one-line notice
+    gives its path, which is also passed to ``on_spill``.
+    """
+
+    def __init__(self, interval, limit, spill_dir=None, on_spill=None):
+        self.interval = interval
+        self.limit = limit
+        self.spill_path = None
+        self._spill_dir = spill_dir
+        self._on_spill = on_spill
+        self._pending = []
+        self._timer = None
+        self._written = 0
+        self._spill = None
+        self._executions = 0
+
+    def begin(self):
+        self.end()
+        self._written = 0
+        self._executions += 1
+
+    def write(self, name, text):
+        if self._pending and self._pending[-1][0] == name:
+            self._pending[-1][1] += text
+        else:
+            self._pending.append([name, text])
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval, self.flush)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        for name, text in pending:
+            text = _collapse_carriage_returns(text)
+            if self._spill is None:
+                text = self._write_within_limit(sys.stderr if name == "stderr" else sys.stdout, text)
+            if text:
+                self._spill.write(text)
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    def end(self):
+        self.flush()
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _write_within_limit(self, stream, text):
+        """Write what fits in the limit; return the rest, now spilling."""
+        room = self.limit - self._written
+        # ASCII text is as long in bytes as in characters; skip encoding it.
+        data = None if text.isascii() else text.encode("utf-8", "replace")
+        size = len(text) if data is None else len(data)
+        if size <= room:
+            stream.write(text)
+            self._written += size
+            return ""
+        if data is None:
+            data = text.encode("utf-8", "replace")
+        # Stop at a line break when there is one, else at a character.
+        cut = data.rfind(b"\n", 0, room) + 1 or room
+        head = data[:cut].decode("utf-8", "ignore")
+        stream.write(head)
+        self._written = self.limit
+        self._start_spill()
+        return text[len(head):]
+
+    def _start_spill(self):
+        path = os.path.join(self._spill_dir or tempfile.gettempdir(), f"output-{self._executions}.txt")
+        self._spill = open(path, "w", encoding="utf-8", errors="replace")
+        self.spill_path = path
+        sys.stdout.write(
+            f"\n[pyrola] Output passed {self.limit // 1024} KB; the rest is in {path} (:Pyrola spill)\n"
+        )
+        if self._on_spill is not None:
+            self._on_spill(path)
+
+
+class ImageRenderer:
+    """Render images in background tasks and write them in arrival order.
+
+    ``submit`` never blocks the iopub loop.  Up to ``workers`` renders run at
+    once and at most ``depth`` images wait behind them; when the queue is
+    full the oldest waiting image is dropped, as newer frames supersede it.
+    ``render(job)`` returns the bytes to show (or None), which are handed to
+    ``write(job, output)`` in the order the jobs were submitted.
+    """
+
+    def __init__(self, render, write, workers=IMAGE_RENDER_WORKERS, depth=IMAGE_QUEUE_DEPTH):
+        self.dropped = 0
+        self._render = render
+        self._write = write
+        self._workers = workers
+        self._depth = depth
+        self._queue = collections.deque()
+        self._tasks = set()
+        self._done = {}
+        self._submitted = 0
+        self._written = 0
+
+    def submit(self, job):
+        if len(self._queue) >= self._depth:
+            seq, _ = self._queue.popleft()
+            self.dropped += 1
+            self._finish(seq, None)
+        self._queue.append((self._submitted, job))
+        self._submitted += 1
+        if len(self._tasks) < self._workers:
+            task = asyncio.ensure_future(self._work())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def drain(self):
+        while self._tasks:
+            await asyncio.wait(set(self._tasks))
+
+    def cancel(self):
+        self._queue.clear()
+        for task in self._tasks:
+            task.cancel()
+        self._done.clear()
+        self._written = self._submitted
+
+    async def _work(self):
+        while self._queue:
+            seq, job = self._queue.popleft()
+            output = None
+            try:
+                output = await self._render(job)
+            except Exception as e:
+                print(f"Error handling image: {e}", file=sys.stderr)
+            self._finish(seq, None if output is None else (job, output))
+
+    def _finish(self, seq, result):
+        self._done[seq] = result
+        while self._written in self._done:
+            result = self._done.pop(self._written)
+            self._written += 1
+            if result:
+                self._write(*result)
+
+
+class ResizeCache:
+    """Least recently used resized images, bounded by their total size.
+
+    Keys are ``(content hash, target width, target height)``; values are
+    ``(base64 payload, width, height)`` ready to send to Neovim.
+    """
+
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        size = len(entry[0])
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[0])
+        self._entries[key] = entry
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, dropped = self._entries.popitem(last=False)
+            self._bytes -= len(dropped[0])
+
+
 class ReplInterpreter:
     def __init__(self, connection_file: Optional[str] = None, lan: str = None):
         self.buffer: List[str] = []
@@ -109,17 +325,26 @@ class ReplInterpreter:
         self.kernel_info = {}
         self.in_multiline = False
         self._interrupt_requested = False
+        self._loop = None
+        self._checking = False
+        self._held_keys = []
         self._image_debug = os.environ.get("PYROLA_IMAGE_DEBUG", "0") == "1"
         self._auto_indent = os.environ.get("PYROLA_AUTO_INDENT", "0") == "1"
         self._cell_width = _read_env_int("PYROLA_IMAGE_CELL_WIDTH", 10)
         self._cell_height = _read_env_int("PYROLA_IMAGE_CELL_HEIGHT", 20)
         self._image_max_width_ratio = _read_env_float("PYROLA_IMAGE_MAX_WIDTH_RATIO", 0.5)
         self._image_max_height_ratio = _read_env_float("PYROLA_IMAGE_MAX_HEIGHT_RATIO", 0.5)
-        self._temp_paths = set()
         try:
             self._temp_dir = tempfile.TemporaryDirectory(prefix="pyrola-")
         except Exception:
             self._temp_dir = None
+        self._output = OutputStage(
+            _read_env_int("PYROLA_OUTPUT_FRAME_MS", OUTPUT_FRAME_MS) / 1000,
+            _read_env_int("PYROLA_OUTPUT_LIMIT_KB", OUTPUT_LIMIT_KB) * 1024,
+            spill_dir=self._temp_dir.name if self._temp_dir else None,
+            on_spill=self._output_spilled,
+        )
+        self._images = ImageRenderer(self._render_image, self._show_rendered_image)
 
         # Setup prompt toolkit
         self.history = InMemoryHistory()
@@ -139,6 +364,8 @@ class ReplInterpreter:
         self.nvim_queue = Queue()
         self.nvim_thread = None
         self.nvim_lock = Lock()
+        self._resized = ResizeCache()
+        self._last_image = None
         self._nvim_address = os.environ.get("NVIM_LISTEN_ADDRESS")
 
         if self._nvim_address:
@@ -193,10 +420,9 @@ class ReplInterpreter:
             try:
                 with open(connection_file, "r", encoding="utf-8") as f:
                     connection_info = json.load(f)
-                self.client = BlockingKernelClient()
+                # Channels are started inside the event loop, in _connect.
+                self.client = AsyncKernelClient()
                 self.client.load_connection_info(connection_info)
-                self.client.start_channels()
-                self.client.wait_for_ready(timeout=10)
                 self.kernelname = connection_info.get("kernel_name")
             except Exception as e:
                 print(f"Failed to connect to kernel: {e}", file=sys.stderr)
@@ -255,9 +481,6 @@ class ReplInterpreter:
         self.nvim_thread = Thread(target=self._nvim_worker, daemon=True)
         self.nvim_thread.start()
 
-    def _vim_escape_string(self, value: str) -> str:
-        return value.replace("\\", "\\\\").replace('"', '\\"')
-
     def _create_keybindings(self):
         kb = KeyBindings()
 
@@ -265,20 +488,12 @@ class ReplInterpreter:
         def _(event):
             b = event.current_buffer
 
-            if b.document.text.strip():
-                # Get the full text including the current line
-                full_text = b.document.text
-
-                # Check if the input is complete
-                status, indent = self.handle_is_complete(full_text)
-
-                if status == "incomplete":
-                    self.in_multiline = True
-                    event.current_buffer.newline()
-                    if indent and self._auto_indent:
-                        event.current_buffer.insert_text(indent)
-                else:
-                    event.current_buffer.validate_and_handle()
+            if self._executing:
+                # Answering input(); the kernel is busy and cannot check it.
+                b.validate_and_handle()
+            elif b.document.text.strip():
+                self._checking = True
+                event.app.create_background_task(self._handle_enter(b))
             else:
                 if self.buffer:
                     event.current_buffer.newline()
@@ -286,6 +501,12 @@ class ReplInterpreter:
                     self.in_multiline = False
                     event.current_buffer.validate_and_handle()
 
+        # Keys typed while the kernel checks the input wait for the answer,
+        # so they land after the newline or in the next prompt.
+        @kb.add(Keys.Any, filter=Condition(lambda: self._checking), eager=True)
+        def _(event):
+            self._held_keys.extend(event.key_sequence)
+
         @kb.add("c-c")
         def _(event):
             if self._executing:
@@ -301,7 +522,41 @@ class ReplInterpreter:
 
         return kb
 
+    async def _handle_enter(self, b):
+        try:
+            # Check if the input, including the current line, is complete
+            status, indent = await self.handle_is_complete(b.document.text)
+        finally:
+            self._checking = False
+
+        if status == "incomplete":
+            self.in_multiline = True
+            b.newline()
+            if indent and self._auto_indent:
+                b.insert_text(indent)
+            self._replay_held_keys()
+        else:
+            # Held keys go to the next prompt.
+            b.validate_and_handle()
+
+    def _replay_held_keys(self):
+        keys, self._held_keys = self._held_keys, []
+        if keys:
+            processor = self.session.app.key_processor
+            processor.feed_multiple(keys)
+            processor.process_keys()
+
+    async def _connect(self):
+        try:
+            self.client.start_channels()
+            await self.client.wait_for_ready(timeout=10)
+        except Exception as e:
+            print(f"Failed to connect to kernel: {e}", file=sys.stderr)
+            sys.exit(1)
+
     async def interact_async(self, banner: Optional[str] = None):
+        self._loop = asyncio.get_running_loop()
+        await self._connect()
         LOGO_FULL = [
             "██████╗ ██╗   ██╗██████╗  ██████╗ ██╗      █████╗ ",
             "██╔══██╗╚██╗ ██╔╝██╔══██╗██╔═══██╗██║     ██╔══██╗",
@@ -340,7 +595,7 @@ class ReplInterpreter:
                     self._start_nvim_thread()
                     self.nvim_queue.put(("repl_ready", None))
                 # Get input with dynamic prompt
-                code = await self.session.prompt_async()
+                code = await self.session.prompt_async(pre_run=self._replay_held_keys)
 
                 if code.strip() in ("exit", "quit"):
                     print_formatted_text(
@@ -351,7 +606,7 @@ class ReplInterpreter:
 
                 if code.strip():
                     # Before execution, check if it's complete
-                    status, _ = self.handle_is_complete(code)
+                    status, _ = await self.handle_is_complete(code)
                     if status == "incomplete":
                         self.in_multiline = True
                         self.buffer.append(code)
@@ -373,23 +628,32 @@ class ReplInterpreter:
                 break
 
         if hasattr(self, "client") and self.client is not None:
-            self.client.shutdown()
+            msg_id = self.client.shutdown()
+            try:
+                await self._reply(self.client.get_control_msg, msg_id, timeout=1.0)
+            except Empty:
+                pass
             self.client.stop_channels()
 
-    def init_kernel_info(self):
-        timeout = 10
-        tic = time.time()
-        msg_id = self.client.kernel_info()
+    async def _reply(self, get_msg, msg_id, timeout=None):
+        """Await the reply to ``msg_id``, skipping replies to older requests.
 
+        Raises Empty when ``timeout`` seconds pass without it.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
         while True:
-            try:
-                reply = self.client.get_shell_msg(timeout=1)
-                if reply["parent_header"].get("msg_id") == msg_id:
-                    self.kernel_info = reply["content"]
-                    return
-            except Empty:
-                if (time.time() - tic) > timeout:
-                    raise RuntimeError("Kernel didn't respond to kernel_info_request")
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            msg = await get_msg(timeout=remaining)
+            if msg["parent_header"].get("msg_id") == msg_id:
+                return msg
+
+    async def init_kernel_info(self):
+        msg_id = self.client.kernel_info()
+        try:
+            reply = await self._reply(self.client.get_shell_msg, msg_id, timeout=10)
+        except Empty:
+            raise RuntimeError("Kernel didn't respond to kernel_info_request")
+        self.kernel_info = reply["content"]
 
     def _interrupt_kernel(self):
         """Send an interrupt to the running kernel via the control channel."""
@@ -407,117 +671,92 @@ class ReplInterpreter:
     def _signal_handler(self, signum, frame):
         if self._executing:
             self._interrupt_requested = True
-            try:
-                self._interrupt_kernel()
-            except Exception as e:
-                print(f"\nFailed to interrupt kernel: {e}", file=sys.stderr)
+            # Sockets belong to the event loop; send from there.
+            self._loop.call_soon_threadsafe(self._send_interrupt)
         else:
             print("\nKeyboardInterrupt")
 
-    def handle_is_complete(self, code):
-        while self.client.shell_channel.msg_ready():
-            self.client.get_shell_msg()
+    def _send_interrupt(self):
+        try:
+            self._interrupt_kernel()
+        except Exception as e:
+            print(f"\nFailed to interrupt kernel: {e}", file=sys.stderr)
 
+    async def handle_is_complete(self, code):
         msg_id = self.client.is_complete(code)
         try:
-            reply = self.client.get_shell_msg(timeout=0.5)
-            if reply["parent_header"].get("msg_id") == msg_id:
-                status = reply["content"]["status"]
-                indent = reply["content"].get("indent", "")
-                return status, indent
+            reply = await self._reply(self.client.get_shell_msg, msg_id, timeout=0.5)
         except Empty:
-            pass
-        return "unknown", ""
-
-    async def _drain_until_idle(self, msg_id, timeout=5.0):
-        """After interrupt, wait for the kernel to return to idle and drain messages."""
-        deadline = time.time() + timeout
-        while time.time() < deadline and self.client.is_alive():
-            while self.client.iopub_channel.msg_ready():
-                msg = self.client.get_iopub_msg()
-                msg_type = msg["header"]["msg_type"]
-                parent_id = msg["parent_header"].get("msg_id")
-                if parent_id != msg_id:
-                    continue
-                if msg_type == "status":
-                    self._execution_state = msg["content"]["execution_state"]
-                    if self._execution_state == "idle":
-                        while self.client.shell_channel.msg_ready():
-                            self.client.get_shell_msg()
-                        return
-                elif msg_type == "error":
-                    content = msg["content"]
-                    for frame in content["traceback"]:
-                        print(frame, file=sys.stderr)
-                    sys.stderr.flush()
-            await asyncio.sleep(0.05)
-        # Timeout: drain what we can
-        while self.client.shell_channel.msg_ready():
-            self.client.get_shell_msg()
+            return "unknown", ""
+        return reply["content"]["status"], reply["content"].get("indent", "")
 
     async def handle_execute(self, code):
+        """Run ``code`` and show its output until the kernel reports idle.
 
+        iopub output, the execute reply and input requests are each awaited
+        by their own task, so output is shown as soon as it arrives and an
+        idle console does no polling.  Returns whether execution succeeded.
+        """
         self._interrupt_requested = False
-
-        while self.client.shell_channel.msg_ready():
-            self.client.get_shell_msg()
-
         msg_id = self.client.execute(code)
+        self._output.begin()
+        self._images.dropped = 0
         self._executing = True
         self._execution_state = "busy"
 
+        output = asyncio.ensure_future(self._watch_iopub(msg_id))
+        reply = asyncio.ensure_future(self._reply(self.client.get_shell_msg, msg_id))
+        stdin = asyncio.ensure_future(self._serve_input_requests(msg_id, reply))
+        pending = {output, reply}
+        interrupt_deadline = None
         try:
-            while self._execution_state != "idle" and self.client.is_alive():
-                if self._interrupt_requested:
-                    self._interrupt_requested = False
-                    await self._drain_until_idle(msg_id)
+            while pending:
+                _, pending = await asyncio.wait(pending, timeout=KERNEL_CHECK_INTERVAL)
+                if self._interrupt_requested and interrupt_deadline is None:
+                    interrupt_deadline = time.monotonic() + INTERRUPT_TIMEOUT
+                if pending and interrupt_deadline is not None and time.monotonic() > interrupt_deadline:
+                    # The kernel ignored the interrupt; stop waiting for it.
                     return False
-
-                try:
-                    await self.handle_input_request(msg_id, timeout=0.05)
-                except Empty:
-                    await self.handle_iopub_msgs(msg_id)
-
-                await asyncio.sleep(0.05)
-
-            while self.client.is_alive():
-                if self._interrupt_requested:
-                    self._interrupt_requested = False
-                    await self._drain_until_idle(msg_id)
+                if pending and not await self.client.is_alive():
+                    print("Kernel died", file=sys.stderr)
                     return False
-
-                try:
-                    msg = self.client.get_shell_msg(timeout=0.05)
-                    if msg["parent_header"].get("msg_id") == msg_id:
-                        await self.handle_iopub_msgs(msg_id)
-                        content = msg["content"]
-                        # Set multiline to False only after execution is complete
-                        self.in_multiline = False
-                        return content["status"] == "ok"
-                except Empty:
-                    await asyncio.sleep(0.05)
-
+            return reply.result()["content"]["status"] == "ok"
         finally:
+            for task in (output, reply, stdin):
+                task.cancel()
+            await asyncio.gather(output, reply, stdin, return_exceptions=True)
+            if self._interrupt_requested:
+                self._images.cancel()
+            else:
+                await self._images.drain()
+            self._output.end()
+            if self._images.dropped:
+                print(f"[pyrola] Skipped {self._images.dropped} superseded image(s)", file=sys.stderr)
             self._executing = False
             self._interrupt_requested = False
             self.in_multiline = False  # Ensure it's set to False in case of errors
 
-        return False
+    async def _watch_iopub(self, msg_id):
+        while self._execution_state != "idle":
+            msg = await self.client.get_iopub_msg()
+            await self.handle_iopub_msg(msg, msg_id)
 
-    async def handle_input_request(self, msg_id, timeout=0.1):
-        msg = self.client.get_stdin_msg(timeout=timeout)
-        if msg_id == msg["parent_header"].get("msg_id"):
+    async def _serve_input_requests(self, msg_id, reply):
+        while True:
+            msg = await self.client.get_stdin_msg()
+            if msg_id != msg["parent_header"].get("msg_id"):
+                continue
             content = msg["content"]
             try:
-                raw_data = await self.session.prompt_async(content["prompt"])
-                if not (
-                    self.client.stdin_channel.msg_ready()
-                    or self.client.shell_channel.msg_ready()
-                ):
-                    self.client.input(raw_data)
+                raw_data = await self.session.prompt_async(
+                    content["prompt"], pre_run=self._replay_held_keys
+                )
             except (EOFError, KeyboardInterrupt):
                 print("\n")
-                return
+                continue
+            # Too late once the kernel has replied, e.g. after an interrupt.
+            if not reply.done():
+                self.client.input(raw_data)
 
     def interact(self, banner: Optional[str] = None):
         asyncio.run(self.interact_async(banner))
@@ -549,6 +788,18 @@ class ReplInterpreter:
                             print(f"Error in Neovim thread: {e}", file=sys.stderr)
                         continue
 
+                    if kind == "spill":
+                        if not self._ensure_nvim():
+                            continue
+                        try:
+                            with self.nvim_lock:
+                                self.nvim.exec_lua('require("pyrola")._on_output_spilled(...)', payload)
+                        except Exception as e:
+                            if self._handle_nvim_disconnect(e, "spill"):
+                                continue
+                            print(f"Error in Neovim thread: {e}", file=sys.stderr)
+                        continue
+
                     if kind != "image":
                         continue
 
@@ -579,84 +830,45 @@ class ReplInterpreter:
                         int(dimensions["height"] * self._cell_height * self._image_max_height_ratio),
                     )
 
-                    try:
-                        img_bytes = base64.b64decode(payload)
-                        img = Image.open(io.BytesIO(img_bytes))
-                    except Exception as e:
-                        print(f"Error handling image: {e}", file=sys.stderr)
+                    key = (
+                        hashlib.sha1(payload.encode("ascii", "replace")).digest(),
+                        target_width,
+                        target_height,
+                    )
+                    now = time.monotonic()
+                    last, self._last_image = self._last_image, (key, now)
+                    if last is not None and last[0] == key and now - last[1] < IMAGE_DEDUPE_WINDOW:
                         continue
 
-                    orig_width, orig_height = img.size
-
-                    if (
-                        orig_width > target_width
-                        or orig_height > target_height
-                        or orig_width < target_width / 2
-                        or orig_height < target_height / 2
-                    ):
-
-                        # Calculate scaling ratio while maintaining aspect ratio
-                        width_ratio = target_width / orig_width
-                        height_ratio = target_height / orig_height
-                        ratio = min(width_ratio, height_ratio)
-
-                        # Calculate new dimensions
-                        new_width = int(orig_width * ratio)
-                        new_height = int(orig_height * ratio)
+                    entry = self._resized.get(key)
+                    if entry is None:
+                        try:
+                            entry = self._resize_image(payload, target_width, target_height)
+                        except Exception as e:
+                            print(f"Error handling image: {e}", file=sys.stderr)
+                            continue
+                        self._resized.put(key, entry)
+                    img_base64, new_width, new_height = entry
 
-                        # Resize image
-                        img = img.resize(
-                            (new_width, new_height), Image.Resampling.LANCZOS
+                    if self._image_debug:
+                        print(
+                            f"[pyrola] sending image to Neovim: b64len={len(img_base64)}",
+                            file=sys.stderr,
                         )
-
-                        # Convert back to base64
-                        buffer = io.BytesIO()
-                        img.save(buffer, format="PNG")
-                        img_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-                    else:
-                        new_width = orig_width
-                        new_height = orig_height
-                        img_base64 = payload
-                    tmp_path = None
                     try:
-                        with tempfile.NamedTemporaryFile(
-                            suffix=".b64",
-                            delete=False,
-                            dir=self._temp_dir.name if self._temp_dir else None,
-                        ) as tmp:
-                            tmp.write(img_base64.encode("utf-8"))
-                            tmp_path = tmp.name
-                        self._register_temp_path(tmp_path)
-                        if self._image_debug:
-                            print(
-                                f"[pyrola] wrote image b64 temp: {tmp_path} bytes={len(img_base64)}",
-                                file=sys.stderr,
+                        # The payload travels as an RPC argument; nothing
+                        # is written to disk.
+                        with self.nvim_lock:
+                            self.nvim.exec_lua(
+                                'require("pyrola.image").show_image(...)',
+                                img_base64,
+                                int(new_width),
+                                int(new_height),
                             )
-                        escaped_path = self._vim_escape_string(tmp_path)
-                        try:
-                            with self.nvim_lock:
-                                self.nvim.command(
-                                    f'let g:pyrola_image_path = "{escaped_path}"'
-                                )
-                                self.nvim.command(
-                                    f"let g:pyrola_image_width = {int(new_width)}"
-                                )
-                                self.nvim.command(
-                                    f"let g:pyrola_image_height = {int(new_height)}"
-                                )
-                                self.nvim.command(
-                                    'lua require("pyrola.image").show_image_file(vim.g.pyrola_image_path, vim.g.pyrola_image_width, vim.g.pyrola_image_height)'
-                                )
-                                self.nvim.command("unlet g:pyrola_image_path")
-                                self.nvim.command("unlet g:pyrola_image_width")
-                                self.nvim.command("unlet g:pyrola_image_height")
-                        except Exception as e:
-                            if self._handle_nvim_disconnect(e, "image sync"):
-                                continue
-                            print(f"Error in Neovim thread: {e}", file=sys.stderr)
-                    finally:
-                        if tmp_path:
-                            self._cleanup_temp_path(tmp_path)
+                    except Exception as e:
+                        if self._handle_nvim_disconnect(e, "image sync"):
+                            continue
+                        print(f"Error in Neovim thread: {e}", file=sys.stderr)
                 except Exception as e:
                     print(f"Error in Neovim thread: {e}", file=sys.stderr)
             except Exception as e:
@@ -664,32 +876,49 @@ class ReplInterpreter:
             finally:
                 self.nvim_queue.task_done()
 
+    def _resize_image(self, payload, target_width, target_height):
+        """Fit a base64 PNG to the target size; return (base64, width, height)."""
+        img = Image.open(io.BytesIO(base64.b64decode(payload)))
+        orig_width, orig_height = img.size
+
+        if (
+            orig_width > target_width
+            or orig_height > target_height
+            or orig_width < target_width / 2
+            or orig_height < target_height / 2
+        ):
+
+            # Calculate scaling ratio while maintaining aspect ratio
+            width_ratio = target_width / orig_width
+            height_ratio = target_height / orig_height
+            ratio = min(width_ratio, height_ratio)
+
+            # Calculate new dimensions
+            new_width = int(orig_width * ratio)
+            new_height = int(orig_height * ratio)
+
+            # Resize image
+            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+            # Convert back to base64
+            buffer = io.BytesIO()
+            img.save(buffer, format="PNG")
+            return base64.b64encode(buffer.getvalue()).decode("ascii"), new_width, new_height
+        return payload, orig_width, orig_height
+
+    def _output_spilled(self, path):
+        if self._nvim_address:
+            self._start_nvim_thread()
+            self.nvim_queue.put(("spill", path))
+
     def _cleanup(self):
         """Cleanup resources"""
         if self.nvim_thread and self.nvim_thread.is_alive():
             self.nvim_queue.put(None)  # Send exit signal
             self.nvim_thread.join(timeout=1.0)
 
-    def _register_temp_path(self, path):
-        if path:
-            self._temp_paths.add(path)
-
-    def _cleanup_temp_path(self, path):
-        if not path:
-            return
-        try:
-            os.unlink(path)
-        except Exception:
-            pass
-        self._temp_paths.discard(path)
-
-    def _cleanup_temp_paths(self):
-        for path in list(self._temp_paths):
-            self._cleanup_temp_path(path)
-
     def _cleanup_resources(self):
         self._cleanup()
-        self._cleanup_temp_paths()
         if self._temp_dir:
             try:
                 self._temp_dir.cleanup()
@@ -697,132 +926,138 @@ class ReplInterpreter:
                 pass
             self._temp_dir = None
 
-    async def handle_iopub_msgs(self, msg_id):
-        while self.client.iopub_channel.msg_ready():
-            msg = self.client.get_iopub_msg()
-            msg_type = msg["header"]["msg_type"]
-            parent_id = msg["parent_header"].get("msg_id")
+    async def _render_image(self, job):
+        """Pipe one image to timg and return what it prints."""
+        image_mime, image_data = job
+        proc = None
+        svg_path = None
+        try:
+            if image_mime == "image/svg+xml":
+                # timg recognises SVG by its file name, so it cannot come
+                # through stdin like the raster formats.
+                with tempfile.NamedTemporaryFile(
+                    suffix=".svg",
+                    delete=False,
+                    dir=self._temp_dir.name if self._temp_dir else None,
+                ) as tmp:
+                    tmp.write(image_data.encode("utf-8"))
+                    svg_path = tmp.name
+                img_bytes = None
+            else:
+                img_bytes = base64.b64decode(image_data)
+
+            # Get terminal size explicitly since prompt_toolkit
+            # may prevent timg from detecting it
+            term_size = shutil.get_terminal_size()
+            size_arg = f"-g{term_size.columns}x{term_size.lines}"
+            proc = await asyncio.create_subprocess_exec(
+                "timg", "-p", "q", size_arg, svg_path or "-",
+                stdin=asyncio.subprocess.DEVNULL if svg_path else asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                stdout_data, _ = await asyncio.wait_for(
+                    proc.communicate(img_bytes), timeout=IMAGE_RENDER_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                print(f"timg timed out ({IMAGE_RENDER_TIMEOUT}s)", file=sys.stderr)
+                return None
+            if proc.returncode != 0:
+                raise subprocess.CalledProcessError(proc.returncode, "timg")
+            return stdout_data
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"Failed to display image: {e}")
+            return None
+        finally:
+            if proc is not None and proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            if svg_path:
+                try:
+                    os.unlink(svg_path)
+                except OSError:
+                    pass
+
+    def _show_rendered_image(self, job, output):
+        image_mime, image_data = job
+        self._output.flush()
+        sys.stdout.buffer.write(output)
+        sys.stdout.flush()
+        if image_mime == "image/png" and self._nvim_address:
+            self._start_nvim_thread()
+            self.nvim_queue.put(("image", image_data))
 
-            if parent_id != msg_id:
-                continue
+    async def handle_iopub_msg(self, msg, msg_id):
+        msg_type = msg["header"]["msg_type"]
+        parent_id = msg["parent_header"].get("msg_id")
 
-            if msg_type == "status":
-                self._execution_state = msg["content"]["execution_state"]
-
-            elif msg_type == "stream":
-                content = msg["content"]
-                if self._pending_clearoutput:
-                    sys.stdout.write("\r")
-                    self._pending_clearoutput = False
-
-                if content["name"] == "stdout":
-                    sys.stdout.write(content["text"])
-                    sys.stdout.flush()
-                elif content["name"] == "stderr":
-                    sys.stderr.write(content["text"])
-                    sys.stderr.flush()
-
-            elif msg_type in ("display_data", "execute_result"):
-                if self._pending_clearoutput:
-                    sys.stdout.write("\r")
-                    self._pending_clearoutput = False
-
-                content = msg["content"]
-                data = content.get("data", {})
-
-                if "text/plain" in data and not any(
-                    mime in data for mime in IMAGE_MIME_TYPES
-                ):
-                    text = data.get("text/plain", "")
-                    if isinstance(text, str):
-                        text_output = text
-                    else:
-                        text_output = str(text[0]) if text else ""
-                    print(text_output)
-                    sys.stdout.flush()
-
-                # Handle image data (prefer PNG for Neovim display)
-                image_mime = None
-                for candidate in IMAGE_MIME_TYPES:
-                    if candidate in data:
-                        image_mime = candidate
-                        break
-
-                if image_mime:
-                    image_data = _extract_image_data(data.get(image_mime))
-                    if not image_data:
-                        continue
-                    if self._image_debug:
-                        print(
-                            f"[pyrola] image mime={image_mime} b64len={len(image_data)}",
-                            file=sys.stderr,
-                        )
+        if parent_id != msg_id:
+            return
 
-                    tmp_path = None
-                    try:
-                        ext = IMAGE_MIME_MAP[image_mime]
-                        with tempfile.NamedTemporaryFile(
-                            suffix=f".{ext}",
-                            delete=False,
-                            dir=self._temp_dir.name if self._temp_dir else None,
-                        ) as tmp:
-                            if image_mime == "image/svg+xml":
-                                tmp.write(image_data.encode("utf-8"))
-                            else:
-                                img_bytes = base64.b64decode(image_data)
-                                tmp.write(img_bytes)
-                            tmp_path = tmp.name
-                        self._register_temp_path(tmp_path)
+        if msg_type == "status":
+            self._execution_state = msg["content"]["execution_state"]
 
-                        try:
-                            # Get terminal size explicitly since prompt_toolkit
-                            # may prevent timg from detecting it
-                            term_size = shutil.get_terminal_size()
-                            size_arg = f"-g{term_size.columns}x{term_size.lines}"
-                            proc = await asyncio.create_subprocess_exec(
-                                "timg", "-p", "q", size_arg, tmp_path,
-                                stdout=asyncio.subprocess.PIPE,
-                                stderr=asyncio.subprocess.PIPE,
-                            )
-                            try:
-                                stdout_data, stderr_data = await asyncio.wait_for(
-                                    proc.communicate(), timeout=15
-                                )
-                            except asyncio.TimeoutError:
-                                proc.kill()
-                                await proc.wait()
-                                print("timg timed out (15s)", file=sys.stderr)
-                                continue
-                            if stdout_data:
-                                sys.stdout.buffer.write(stdout_data)
-                                sys.stdout.flush()
-                            if proc.returncode != 0:
-                                raise subprocess.CalledProcessError(proc.returncode, "timg")
-                            if image_mime == "image/png" and self._nvim_address:
-                                self._start_nvim_thread()
-                                self.nvim_queue.put(("image", image_data))
-                        except (
-                            subprocess.CalledProcessError,
-                            FileNotFoundError,
-                        ) as e:
-                            print(f"Failed to display image: {e}")
-                    except Exception as e:
-                        print(f"Error handling image: {e}")
-                    finally:
-                        if tmp_path:
-                            self._cleanup_temp_path(tmp_path)
-
-            elif msg_type == "error":
-                content = msg["content"]
-                for frame in content["traceback"]:
-                    print(frame, file=sys.stderr)
-                sys.stderr.flush()
-
-            elif msg_type == "clear_output":
-                if msg["content"].get("wait", False):
-                    self._pending_clearoutput = True
+        elif msg_type == "stream":
+            content = msg["content"]
+            if self._pending_clearoutput:
+                self._output.write("stdout", "\r")
+                self._pending_clearoutput = False
+
+            if content["name"] in ("stdout", "stderr"):
+                self._output.write(content["name"], content["text"])
+
+        elif msg_type in ("display_data", "execute_result"):
+            self._output.flush()
+            if self._pending_clearoutput:
+                sys.stdout.write("\r")
+                self._pending_clearoutput = False
+
+            content = msg["content"]
+            data = content.get("data", {})
+
+            if "text/plain" in data and not any(
+                mime in data for mime in IMAGE_MIME_TYPES
+            ):
+                text = data.get("text/plain", "")
+                if isinstance(text, str):
+                    text_output = text
                 else:
-                    sys.stdout.write("\r")
+                    text_output = str(text[0]) if text else ""
+                print(text_output)
+                sys.stdout.flush()
+
+            # Handle image data (prefer PNG for Neovim display)
+            image_mime = None
+            for candidate in IMAGE_MIME_TYPES:
+                if candidate in data:
+                    image_mime = candidate
+                    break
+
+            if image_mime:
+                image_data = _extract_image_data(data.get(image_mime))
+                if not image_data:
+                    return
+                if self._image_debug:
+                    print(
+                        f"[pyrola] image mime={image_mime} b64len={len(image_data)}",
+                        file=sys.stderr,
+                    )
+
+                self._images.submit((image_mime, image_data))
+
+        elif msg_type == "error":
+            self._output.flush()
+            content = msg["content"]
+            for frame in content["traceback"]:
+                print(frame, file=sys.stderr)
+            sys.stderr.flush()
+
+        elif msg_type == "clear_output":
+            if msg["content"].get("wait", False):
+                self._pending_clearoutput = True
+            else:
+                self._output.write("stdout", "\r")
 
 
 def main():
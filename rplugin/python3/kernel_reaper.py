@@ -0,0 +1,80 @@
+"""Finish shutting down kernels after the server has let go of them.
+
+Started detached by server.py's ``shutdown_all``, so it outlives both the
+server and Neovim.  Each kernel has already been sent a shutdown request;
+the reaper waits ``--grace`` seconds for it to exit, then sends SIGTERM to
+its process group, and SIGKILL once ``--budget`` seconds have passed since
+the reaper started.  Connection files given with ``--file`` are removed at
+the end.
+
+Usage: python kernel_reaper.py [--grace S] [--budget S] [--pid PID ...] [--file PATH ...]
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+
+POLL_INTERVAL = 0.05
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # An exited kernel stays a zombie until the server reaps it.
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return True
+
+
+def _signal(pid, signum):
+    # Kernels run in their own session; take their subprocesses down too.
+    try:
+        if os.getpgid(pid) == pid:
+            os.killpg(pid, signum)
+        else:
+            os.kill(pid, signum)
+    except OSError:
+        pass
+
+
+def _wait(pids, deadline):
+    pids = [pid for pid in pids if _alive(pid)]
+    while pids and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        pids = [pid for pid in pids if _alive(pid)]
+    return pids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reap kernels left by server.py")
+    parser.add_argument("--grace", type=float, default=0.5)
+    parser.add_argument("--budget", type=float, default=2.0)
+    parser.add_argument("--pid", type=int, action="append", default=[])
+    parser.add_argument("--file", action="append", default=[])
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    pids = _wait(args.pid, started + args.grace)
+    for pid in pids:
+        _signal(pid, signal.SIGTERM)
+    pids = _wait(pids, started + args.budget)
+    for pid in pids:
+        _signal(pid, signal.SIGKILL)
+
+    for path in args.file:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
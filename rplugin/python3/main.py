@@ -176,7 +176,7 @@ class PyrolaPlugin:
             if not self._connect_kernel(connection_file):
                 return "Error: Failed to connect to kernel"
 
-            msg_id = self.client.execute(code)
+            msg_id = self.client.execute(code, silent=filetype == "python", store_history=False)
             outputs = self._collect_outputs(msg_id)
             self._inspector_initialized.add(connection_file)
             return "\n".join(outputs) if outputs else "No output received"
@@ -203,7 +203,7 @@ class PyrolaPlugin:
             if not self._connect_kernel(connection_file):
                 return "Error: Failed to connect to kernel"
 
-            msg_id = self.client.execute(code)
+            msg_id = self.client.execute(code, silent=filetype == "python", store_history=False)
             outputs = self._collect_outputs(msg_id)
             return "\n".join(outputs) if outputs else "(no user variables)"
         except Exception as exc:
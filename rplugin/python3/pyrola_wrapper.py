@@ -1,13 +1,26 @@
 """
 Direct Python wrapper for Pyrola functions.
 Bypasses the remote plugin system for Neovim 0.11+ compatibility.
+
+Kernel clients are kept per connection file, so a long-lived process pays
+the ZMQ connection cost once per kernel:
+
+  serve                  read JSON requests ({"id", "method", "params"}) from
+                         stdin, one per line, and answer each with a JSON line;
+                         methods are init, execute and shutdown
+  batch FT CF FILE       run the snippets of FILE (separated by "# %%" lines)
+                         one after another and report the time each took
 """
+import argparse
+import re
+import statistics
 import sys
 import os
 import json
 import subprocess
 import threading
 import time
+from queue import Empty
 
 # Add the plugin directory to path
 plugin_dir = os.path.dirname(os.path.abspath(__file__))
@@ -16,6 +29,42 @@ sys.path.insert(0, plugin_dir)
 from jupyter_client import BlockingKernelClient, KernelManager
 from vari_inspector import get_python_inspector, get_r_inspector
 
+SNIPPET_SEPARATOR = re.compile(r"^\s*#+\s*%%.*$", re.MULTILINE)
+# While waiting for a request to finish: how often to check the kernel is alive.
+LIVENESS_INTERVAL = 1.0
+
+# Connected clients by connection file, reused across calls.
+_clients = {}
+# Managers of the kernels started here; dropping one removes its connection file.
+_managers = {}
+
+
+def get_client(connection_file):
+    """Return a connected client for the kernel, reusing an earlier one."""
+    client = _clients.get(connection_file)
+    if client is None:
+        with open(connection_file, "r", encoding="utf-8") as f:
+            connection_info = json.load(f)
+        client = BlockingKernelClient()
+        client.load_connection_info(connection_info)
+        client.start_channels()
+        _clients[connection_file] = client
+    return client
+
+
+def close_client(connection_file):
+    client = _clients.pop(connection_file, None)
+    if client is not None:
+        try:
+            client.stop_channels()
+        except Exception:
+            pass
+
+
+def close_clients():
+    for connection_file in list(_clients):
+        close_client(connection_file)
+
 
 def init_kernel(kernel_name):
     """Initialize Jupyter kernel and return connection file path."""
@@ -59,73 +108,188 @@ def init_kernel(kernel_name):
         if "exc" in error:
             return None
 
-        client = result["client"]
+        _managers[kernel_manager.connection_file] = kernel_manager
+        _clients[kernel_manager.connection_file] = result["client"]
         return kernel_manager.connection_file
     except Exception as exc:
         return None
 
 
-def execute_code(filetype, connection_file, code):
-    """Execute code in the Jupyter kernel."""
+def execute_code(filetype, connection_file, code, timeout=None):
+    """Execute code in the Jupyter kernel.
+
+    Output is collected until the kernel reports this request idle, waiting
+    at most ``timeout`` seconds when one is given.
+    """
     try:
-        with open(connection_file, "r", encoding="utf-8") as f:
-            connection_info = json.load(f)
-        
-        client = BlockingKernelClient()
-        client.load_connection_info(connection_info)
-        client.start_channels()
-        
-        client.execute(code)
-        
+        client = get_client(connection_file)
+        msg_id = client.execute(code)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
         outputs = []
         while True:
+            wait = LIVENESS_INTERVAL
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    outputs.append(f"Error: no reply within {timeout:g} s")
+                    break
             try:
-                msg = client.get_iopub_msg(timeout=1)
-                msg_type = msg.get("msg_type")
-                if msg_type == "stream":
-                    outputs.append(msg["content"]["text"])
-                elif msg_type == "execute_result":
-                    outputs.append(msg["content"]["data"].get("text/plain", ""))
-                elif msg_type == "error":
-                    outputs.append(f"Error: {msg['content']['ename']}: {msg['content']['evalue']}")
-                elif msg_type == "status" and msg["content"]["execution_state"] == "idle":
+                msg = client.get_iopub_msg(timeout=wait)
+            except Empty:
+                if not client.is_alive():
+                    outputs.append("Error: kernel died")
                     break
-            except Exception:
+                continue
+            # A reused client may still hold output of an earlier request.
+            if msg.get("parent_header", {}).get("msg_id") != msg_id:
+                continue
+            msg_type = msg.get("msg_type")
+            if msg_type == "stream":
+                outputs.append(msg["content"]["text"])
+            elif msg_type == "execute_result":
+                outputs.append(msg["content"]["data"].get("text/plain", ""))
+            elif msg_type == "error":
+                outputs.append(f"Error: {msg['content']['ename']}: {msg['content']['evalue']}")
+            elif msg_type == "status" and msg["content"]["execution_state"] == "idle":
                 break
-        
-        client.stop_channels()
+
         return "\n".join(outputs) if outputs else "No output"
     except Exception as exc:
+        close_client(connection_file)
         return f"Error: {exc}"
 
 
-def shutdown_kernel(connection_file):
-    """Shutdown the Jupyter kernel."""
+def shutdown_kernel(connection_file, timeout=1.0):
+    """Shutdown the Jupyter kernel, waiting up to ``timeout`` for its reply."""
+    kernel_manager = _managers.pop(connection_file, None)
+    if kernel_manager is not None:
+        # Started here: the manager also reaps the process and its files.
+        close_client(connection_file)
+        try:
+            kernel_manager.shutdown_kernel()
+            return True
+        except Exception:
+            return False
     try:
-        with open(connection_file, "r", encoding="utf-8") as f:
-            connection_info = json.load(f)
-        
-        client = BlockingKernelClient()
-        client.load_connection_info(connection_info)
-        client.start_channels()
-        client.shutdown()
-        client.stop_channels()
-        time.sleep(0.2)
+        client = get_client(connection_file)
+        msg_id = client.shutdown()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                msg = client.get_control_msg(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception:
+                break
+            if msg.get("parent_header", {}).get("msg_id") == msg_id:
+                break
         return True
     except Exception:
         return False
+    finally:
+        close_client(connection_file)
 
 
-if __name__ == "__main__":
-    # Allow command line usage
-    if len(sys.argv) > 1:
-        cmd = sys.argv[1]
-        if cmd == "init" and len(sys.argv) > 2:
-            result = init_kernel(sys.argv[2])
+def serve(stdin=sys.stdin, stdout=sys.stdout):
+    """Answer JSON requests from ``stdin`` until it closes."""
+    methods = {
+        "init": lambda params: init_kernel(params["kernel_name"]),
+        "execute": lambda params: execute_code(
+            params.get("filetype"), params["connection_file"], params["code"], params.get("timeout")
+        ),
+        "shutdown": lambda params: shutdown_kernel(params["connection_file"]),
+    }
+    for line in stdin:
+        if not line.strip():
+            continue
+        request = {}
+        try:
+            request = json.loads(line)
+            method = methods.get(request.get("method"))
+            if method is None:
+                raise ValueError(f"unknown method: {request.get('method')}")
+            response = {"id": request.get("id"), "result": method(request.get("params") or {})}
+        except Exception as exc:
+            response = {"id": request.get("id"), "error": str(exc)}
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+
+def read_snippets(path):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return [snippet.strip("\n") for snippet in SNIPPET_SEPARATOR.split(text) if snippet.strip()]
+
+
+def run_batch(filetype, connection_file, path, timeout=None):
+    """Run each snippet of ``path`` and return (seconds, output) per snippet."""
+    results = []
+    for snippet in read_snippets(path):
+        started = time.perf_counter()
+        output = execute_code(filetype, connection_file, snippet, timeout)
+        results.append((time.perf_counter() - started, output))
+    return results
+
+
+def _print_batch(snippets, results, as_json):
+    if as_json:
+        print(json.dumps([
+            {"snippet": index, "ms": round(elapsed * 1000, 2), "output": output}
+            for index, (elapsed, output) in enumerate(results, 1)
+        ]))
+        return
+    for index, (snippet, (elapsed, output)) in enumerate(zip(snippets, results), 1):
+        first_line = snippet.splitlines()[0] if snippet else ""
+        print(f"{index:>4} {elapsed * 1000:9.2f} ms  {first_line[:60]}")
+        if output != "No output":
+            for line in output.splitlines():
+                print(f"{'':>17}{line}")
+    if results:
+        ms = [elapsed * 1000 for elapsed, _ in results]
+        print(
+            f"{len(ms)} snippets  total {sum(ms):.1f} ms   min {min(ms):.2f}   "
+            f"median {statistics.median(ms):.2f}   max {max(ms):.2f} ms"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Pyrola kernel operations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    init_parser = commands.add_parser("init")
+    init_parser.add_argument("kernel_name")
+    execute_parser = commands.add_parser("execute")
+    execute_parser.add_argument("filetype")
+    execute_parser.add_argument("connection_file")
+    execute_parser.add_argument("code")
+    shutdown_parser = commands.add_parser("shutdown")
+    shutdown_parser.add_argument("connection_file")
+    commands.add_parser("serve")
+    batch_parser = commands.add_parser("batch")
+    batch_parser.add_argument("filetype")
+    batch_parser.add_argument("connection_file")
+    batch_parser.add_argument("snippets")
+    batch_parser.add_argument("--timeout", type=float, default=None,
+                              help="seconds a snippet may run before it counts as failed (default: no limit)")
+    batch_parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "init":
+            result = init_kernel(args.kernel_name)
             if result:
                 print(result)
-        elif cmd == "execute" and len(sys.argv) > 4:
-            result = execute_code(sys.argv[2], sys.argv[3], sys.argv[4])
-            print(result)
-        elif cmd == "shutdown" and len(sys.argv) > 2:
-            shutdown_kernel(sys.argv[2])
+        elif args.command == "execute":
+            print(execute_code(args.filetype, args.connection_file, args.code))
+        elif args.command == "shutdown":
+            shutdown_kernel(args.connection_file)
+        elif args.command == "serve":
+            serve()
+        elif args.command == "batch":
+            results = run_batch(args.filetype, args.connection_file, args.snippets, args.timeout)
+            _print_batch(read_snippets(args.snippets), results, args.json)
+    finally:
+        close_clients()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,42 +8,1479 @@ Protocol
 Request:  {"id": 1, "method": "init_kernel", "params": {"kernel_name": "python3"}}
 Response: {"id": 1, "result": {...}}  or  {"id": 1, "error": "..."}
 
-Methods: init_kernel, execute_code, list_globals, interrupt_kernel, shutdown_kernel
+Methods: ensure_managed_kernel, init_kernel, execute_code, inspect_many,
+list_globals, interrupt_kernel, shutdown_kernel, shutdown_all, kernel_resources,
+kernel_output, stats, ping
+
+Kernel events: owned kernels are watched (process state and heartbeat) and
+their holders are notified when one's process exits:
+Notification: {"method": "kernel_died", "params": {"connection_file": ...,
+              "kernel_name": ..., "reason": ..., "restarting": bool}}
+A running kernel whose heartbeat stays silent for 30 s is only reported:
+Notification: {"method": "kernel_unresponsive", "params": {..., "silent_s": ...}}
+With PYROLA_KERNEL_AUTO_RESTART=1 the kernel is restarted from the same
+kernelspec with backoff, followed by:
+Notification: {"method": "kernel_restarted", "params": {..., "restart_ms": ...}}
+Kernel memory and CPU are sampled every PYROLA_MONITOR_INTERVAL seconds
+(kernel_resources); above PYROLA_MEMORY_LIMIT_MB the holders get:
+Notification: {"method": "kernel_memory", "params": {..., "rss": ..., "limit": ...}}
+The outputs of recent user cells are recorded from each owned kernel's iopub
+(up to PYROLA_OUTPUT_BUFFER_MB); kernel_output returns them by
+``execution_count``, the last one, or with ``"error": true`` the last error.
+
+Streaming: execute_code and list_globals accept ``"stream": true``.  Output
+is then also sent as it arrives, before the final response:
+Notification: {"method": "progress", "params": {"id": 1, "chunk": "..."}}
+
+Framing: a ``set_framing`` request with ``{"framing": "msgpack"}`` switches
+replies to msgpack frames, each preceded by its length as a 4-byte big-endian
+integer.  The acknowledgement itself is the last JSON line; the server answers
+``{"framing": "json"}`` instead when the msgpack package is not installed.
+Requests are always newline-delimited JSON.
+
+Requests are dispatched concurrently, so responses may arrive out of order and
+must be matched to their request by ``id``.  Control methods (interrupt_kernel,
+shutdown_kernel, shutdown_all, ping) run on a dedicated lane that never queues
+behind kernel work.
+
+Daemon mode: with ``--daemon [--socket PATH]`` the server listens on a
+per-user unix socket instead, speaking the same protocol to every editor that
+connects.  Editors share kernels started with ``"shared": true`` in
+init_kernel when they also pass the same ``python_executable``; such kernels
+are shut down when the last editor holding them releases them or disconnects.
+The daemon exits after PYROLA_DAEMON_IDLE_TIMEOUT seconds (default 300)
+without connections.
+
+jupyter_client and the inspector code are imported on first use, and preloaded
+in the background, so ``ping`` answers before they have loaded.
 """
 
 import sys
 
 sys.dont_write_bytecode = True
 
+import argparse
+import copy
+import hashlib
+import itertools
 import json
+import math
+import os
 import shutil
+import signal
+import socket
+import stat
+import struct
 import subprocess
+import tempfile
 import threading
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from queue import Empty
+
+FRAMING_METHOD = "set_framing"
+CONTROL_METHODS = frozenset({
+    "interrupt_kernel",
+    "shutdown_kernel",
+    "shutdown_all",
+    "kernel_resources",
+    "kernel_output",
+    "ping",
+})
+MAX_WORKERS = 4
+CONTROL_LOCK_TIMEOUT = 1.0
+# Stay below rpc.lua's default 10 s request timeout so partial output arrives.
+INSPECT_TIMEOUT = 8.0
+# Background prefetches give up sooner, so they never hold a kernel for long.
+PREFETCH_TIMEOUT = 2.0
+LIVENESS_INTERVAL = 1.0
+# How long kernel_busy waits for a request that is just finishing to go idle.
+BUSY_GRACE = 0.1
+MAX_BACKLOG_MESSAGES = 500
+MAX_CACHED_RESULTS = 64
+# Precedes "<index>\n" and each result in inspect_many output.
+BATCH_SEPARATOR = "\x1e"
+METRIC_SAMPLES = 1024
+DAEMON_IDLE_TIMEOUT = 300.0
+WATCHDOG_INTERVAL = 0.5
+# Seconds a running kernel's heartbeat may stay silent before its holders are
+# warned.  Silence never counts as death: swapping, a long C call or a
+# suspended laptop all pause the heartbeat of a kernel that is fine.
+HEARTBEAT_SILENCE_WARNING = 30.0
+# Automatic restarts: at most RESTART_LIMIT within RESTART_WINDOW seconds,
+# waiting RESTART_BACKOFF * 2**n (capped) before the n+1-th.
+RESTART_LIMIT = 3
+RESTART_WINDOW = 60.0
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 10.0
+# shutdown_all: seconds kernels get to exit on request before SIGTERM, and in
+# total before SIGKILL.
+SHUTDOWN_GRACE = 0.5
+SHUTDOWN_BUDGET = 2.0
+# Resource samples kept per kernel (ten minutes at the default interval).
+MONITOR_SAMPLES = 120
+MONITOR_INTERVAL = 5.0
+# Cell outputs recorded per kernel from iopub: most cells kept, the total
+# size in bytes, and the share of that one cell may use.
+OUTPUT_CELLS = 100
+OUTPUT_BUFFER_BYTES = 16 * 1024 * 1024
+OUTPUT_CELL_SHARE = 0.25
+OUTPUT_POLL_INTERVAL = 0.5
+REAPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kernel_reaper.py")
+
+# Time spent in each phase of the request running on this thread.
+_timings = threading.local()
+# Session ids of this server's own kernel clients; their executions are
+# inspector calls, not user cells.
+_own_sessions = set()
+# Set once jupyter_client and the inspector code have been imported.
+_modules_loaded = threading.Event()
+
+
+def _read_env_int(name, default):
+    try:
+        value = int(os.environ.get(name, ""))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def _read_env_float(name, default):
+    try:
+        value = float(os.environ.get(name, ""))
+    except ValueError:
+        return default
+    return value if value >= 0 else default
+
+
+@contextmanager
+def _timed(phase):
+    """Add the time spent in the block to the current request's ``phase``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases = getattr(_timings, "phases", None)
+        if phases is not None:
+            phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - start
+
+
+class _KernelConnection:
+    """A pooled client for one connection file plus its per-kernel state."""
+
+    def __init__(self, connection_file, client=None):
+        self.connection_file = connection_file
+        self.client = client
+        if client is not None:
+            _own_sessions.add(client.session.session)
+        # A BlockingKernelClient must only be driven from one thread at a time.
+        self.lock = threading.RLock()
+        self.inspector_initialized = False
+        self.last_used = time.monotonic()
+        self.retired = False
+        # iopub messages for this client's own requests, read while waiting
+        # for another one, by parent id.
+        self.backlog = OrderedDict()
+        self._backlog_size = 0
+        # Requests the kernel reported busy and not yet idle, by parent id.
+        self.busy_parents = set()
+        # Whether any status message reached this client yet.
+        self.status_seen = False
+        # Socket of the kernel-side inspector thread, once it is running.
+        self.oob_path = None
+        # Count of the last user execution, and inspection results since it.
+        self.execution_count = None
+        self.results = OrderedDict()
+
+    def connect(self):
+        if self.client is not None:
+            return
+        from jupyter_client import BlockingKernelClient
+
+        with open(self.connection_file, "r", encoding="utf-8") as fh:
+            connection_info = json.load(fh)
+        client = BlockingKernelClient()
+        client.load_connection_info(connection_info)
+        client.start_channels()
+        _own_sessions.add(client.session.session)
+        self.client = client
+
+    def buffer_message(self, parent_id, msg):
+        # Only replies to our own requests are ever taken back; the output of
+        # user cells (images included) would just fill the backlog.
+        if not parent_id or msg.get("parent_header", {}).get("session") != self.client.session.session:
+            return
+        self.backlog.setdefault(parent_id, []).append(msg)
+        self._backlog_size += 1
+        while self._backlog_size > MAX_BACKLOG_MESSAGES:
+            _, dropped = self.backlog.popitem(last=False)
+            self._backlog_size -= len(dropped)
+
+    def take_backlog(self, parent_id):
+        messages = self.backlog.pop(parent_id, [])
+        self._backlog_size -= len(messages)
+        return messages
+
+    def track_message(self, msg):
+        msg_type = msg.get("msg_type")
+        if msg_type == "execute_input":
+            # Visible executions are announced; those not from our own clients
+            # (R inspections run visibly too) are user cells.
+            if msg.get("parent_header", {}).get("session") in _own_sessions:
+                return
+            self.execution_count = msg["content"].get("execution_count")
+            self.results.clear()
+            return
+        if msg_type != "status":
+            return
+        self.status_seen = True
+        state = msg["content"].get("execution_state")
+        parent_id = msg.get("parent_header", {}).get("msg_id")
+        if state == "busy":
+            self.busy_parents.add(parent_id)
+        elif state == "idle":
+            self.busy_parents.discard(parent_id)
+        else:
+            self.busy_parents.clear()
+            self.execution_count = None
+            self.results.clear()
+
+    def cached_result(self, variable):
+        if self.execution_count is None:
+            return None
+        return self.results.get((variable, self.execution_count))
+
+    def cache_result(self, variable, output):
+        if self.execution_count is None:
+            return
+        self.results[(variable, self.execution_count)] = output
+        while len(self.results) > MAX_CACHED_RESULTS:
+            self.results.popitem(last=False)
+
+    def kernel_busy(self, grace=BUSY_GRACE):
+        """Whether the kernel is running another request right now.
+
+        Reads the queued iopub messages into the backlog, waiting up to
+        ``grace`` seconds for a request that is just finishing: ipykernel
+        reports idle only after sending its reply.  Only status changes seen
+        since this client connected are known, so a fresh client assumes idle
+        (``status_seen`` stays False until it learns otherwise).
+        """
+        client = self.client
+        deadline = time.monotonic() + grace
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if self.busy_parents else 0
+            try:
+                msg = client.get_iopub_msg(timeout=timeout)
+            except Empty:
+                return bool(self.busy_parents)
+            self.track_message(msg)
+            self.buffer_message(msg.get("parent_header", {}).get("msg_id"), msg)
+
+    def close(self):
+        client, self.client = self.client, None
+        self.inspector_initialized = False
+        self.backlog.clear()
+        self._backlog_size = 0
+        self.busy_parents.clear()
+        self.status_seen = False
+        self.oob_path = None
+        self.execution_count = None
+        self.results.clear()
+        if client is None:
+            return
+        _own_sessions.discard(client.session.session)
+        try:
+            client.stop_channels()
+        except Exception:
+            pass
+
+
+class KernelClientPool:
+    """Live kernel clients keyed by connection file, evicted LRU or when idle.
+
+    Entries are handed out with their lock held, so requests for one kernel
+    serialise while requests for different kernels proceed in parallel.
+    """
+
+    def __init__(self, max_size=4, idle_timeout=600.0):
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def adopt(self, connection_file, client):
+        entry = _KernelConnection(connection_file, client)
+        with self._lock:
+            stale = []
+            previous = self._entries.pop(connection_file, None)
+            if previous is not None:
+                stale.append(previous)
+            self._entries[connection_file] = entry
+            stale.extend(self._pop_stale_locked(keep=connection_file))
+        self._retire(stale)
+
+    @contextmanager
+    def connection(self, connection_file, timeout=None):
+        while True:
+            with self._lock:
+                entry = self._entries.get(connection_file)
+                if entry is None:
+                    entry = _KernelConnection(connection_file)
+                    self._entries[connection_file] = entry
+                self._entries.move_to_end(connection_file)
+                entry.last_used = time.monotonic()
+                stale = self._pop_stale_locked(keep=connection_file)
+            self._retire(stale)
+
+            with _timed("wait"):
+                acquired = entry.lock.acquire(timeout=-1 if timeout is None else timeout)
+            if not acquired:
+                raise TimeoutError(f"kernel is busy: {connection_file}")
+            if not entry.retired:
+                break
+            entry.lock.release()
+
+        try:
+            try:
+                with _timed("connect"):
+                    entry.connect()
+            except Exception as exc:
+                self._forget(entry)
+                raise RuntimeError(f"Connection error: {exc}")
+            yield entry
+        finally:
+            entry.last_used = time.monotonic()
+            if entry.retired:
+                entry.close()
+            entry.lock.release()
+
+    def discard(self, connection_file):
+        with self._lock:
+            entry = self._entries.pop(connection_file, None)
+        if entry is not None:
+            self._retire([entry])
+
+    def close_all(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        self._retire(entries)
+
+    def _forget(self, entry):
+        with self._lock:
+            if self._entries.get(entry.connection_file) is entry:
+                del self._entries[entry.connection_file]
+        entry.retired = True
+
+    def _pop_stale_locked(self, keep):
+        stale = []
+        if self.idle_timeout:
+            now = time.monotonic()
+            for connection_file, entry in list(self._entries.items()):
+                if connection_file != keep and now - entry.last_used > self.idle_timeout:
+                    stale.append(self._entries.pop(connection_file))
+        while len(self._entries) > self.max_size:
+            connection_file = next(iter(self._entries))
+            if connection_file == keep:
+                break
+            stale.append(self._entries.pop(connection_file))
+        return stale
+
+    def _retire(self, entries):
+        # Busy entries are closed by their current holder on release.
+        for entry in entries:
+            entry.retired = True
+            if entry.lock.acquire(blocking=False):
+                try:
+                    entry.close()
+                finally:
+                    entry.lock.release()
+
+
+class _SpareKernel:
+    def __init__(self, kernel_manager, client, fingerprint):
+        self.kernel_manager = kernel_manager
+        self.client = client
+        self.fingerprint = fingerprint
+        self.created = time.monotonic()
+
+    def shutdown(self):
+        try:
+            self.client.stop_channels()
+        except Exception:
+            pass
+        try:
+            self.kernel_manager.shutdown_kernel(now=True)
+        except Exception:
+            pass
+
+
+class WarmKernelPool:
+    """Ready spare kernels per kernelspec, handed over by init_kernel.
+
+    Disabled when ``size`` is 0.  A spare is refilled in the background after
+    each hand-over and shut down once it has sat unused for ``idle_timeout``
+    seconds.  Spares started from an older version of the kernelspec are
+    discarded instead of handed over.
+    """
+
+    def __init__(self, start_kernel, spec_fingerprint, size=0, idle_timeout=1800.0):
+        self.size = max(0, size)
+        self.idle_timeout = idle_timeout
+        self._start_kernel = start_kernel
+        self._spec_fingerprint = spec_fingerprint
+        self._spares = {}
+        self._starting = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._starter = None
+        self._reaper = None
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def take(self, kernel_name):
+        if not self.enabled:
+            return None
+        fingerprint = self._fingerprint(kernel_name)
+        while True:
+            with self._lock:
+                spares = self._spares.get(kernel_name)
+                if not spares:
+                    return None
+                spare = spares.pop(0)
+            if spare.fingerprint == fingerprint and spare.kernel_manager.is_alive():
+                return spare.kernel_manager, spare.client
+            spare.shutdown()
+
+    def prime(self, kernel_name):
+        if not self.enabled or self._closed.is_set():
+            return
+        with self._lock:
+            ready = len(self._spares.get(kernel_name, ()))
+            missing = self.size - ready - self._starting.get(kernel_name, 0)
+            if missing <= 0:
+                return
+            self._starting[kernel_name] = self._starting.get(kernel_name, 0) + missing
+            if self._starter is None:
+                self._starter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyrola-warm")
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+                self._reaper.start()
+            starter = self._starter
+        for _ in range(missing):
+            try:
+                starter.submit(self._start_spare, kernel_name)
+            except RuntimeError:
+                # close() raced with us; nothing left to warm.
+                with self._lock:
+                    self._starting[kernel_name] -= 1
+
+    def reap(self):
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for spares in self._spares.values():
+                keep = []
+                for spare in spares:
+                    idle = now - spare.created > self.idle_timeout
+                    if idle or not spare.kernel_manager.is_alive():
+                        expired.append(spare)
+                    else:
+                        keep.append(spare)
+                spares[:] = keep
+        for spare in expired:
+            spare.shutdown()
+
+    def drain(self):
+        """Hand over every ready spare, leaving the pool open."""
+        with self._lock:
+            spares = [spare for group in self._spares.values() for spare in group]
+            self._spares.clear()
+        return spares
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            spares = [spare for group in self._spares.values() for spare in group]
+            self._spares.clear()
+            starter, self._starter = self._starter, None
+        if starter is not None:
+            starter.shutdown(wait=False, cancel_futures=True)
+        for spare in spares:
+            spare.shutdown()
+
+    def _fingerprint(self, kernel_name):
+        try:
+            return self._spec_fingerprint(kernel_name)
+        except Exception:
+            return None
+
+    def _start_spare(self, kernel_name):
+        spare = None
+        try:
+            if not self._closed.is_set():
+                fingerprint = self._fingerprint(kernel_name)
+                kernel_manager, client = self._start_kernel(kernel_name)
+                spare = _SpareKernel(kernel_manager, client, fingerprint)
+        except Exception:
+            # A broken kernelspec surfaces on the next cold init_kernel.
+            spare = None
+        with self._lock:
+            self._starting[kernel_name] -= 1
+            if spare is not None and not self._closed.is_set():
+                self._spares.setdefault(kernel_name, []).append(spare)
+                spare = None
+        if spare is not None:
+            spare.shutdown()
+
+    def _reap_loop(self):
+        interval = min(60.0, max(1.0, self.idle_timeout / 4))
+        while not self._closed.wait(interval):
+            self.reap()
+
+
+class _OwnedKernel:
+    """A kernel started by this server and the sessions that hold it."""
+
+    def __init__(self, kernel_name, kernel_manager, shared, python_executable=None):
+        self.kernel_name = kernel_name
+        self.kernel_manager = kernel_manager
+        self.shared = shared
+        # Interpreter of the editor that started it; only editors using the
+        # same one share the kernel.
+        self.python_executable = python_executable
+        self.holders = set()
+        self.restarts = []
+
+
+class _Heartbeat:
+    """Process and heartbeat state of one watched kernel."""
+
+    def __init__(self, owned):
+        self.owned = owned
+        self.client = None
+        self.beaten = False
+        self.silent_since = None
+        self.warned = False
+        try:
+            client = owned.kernel_manager.client()
+            client.hb_channel.start()
+            self.client = client
+        except Exception:
+            # Without a heartbeat the process check still catches exits.
+            self.client = None
+
+    def silence(self, now):
+        """Seconds the heartbeat has been silent, or None while it beats."""
+        if self.client is None:
+            return None
+        if self.client.hb_channel.is_beating():
+            self.beaten = True
+            self.silent_since = None
+            self.warned = False
+            return None
+        if not self.beaten:
+            return None
+        if self.silent_since is None:
+            self.silent_since = now
+        return now - self.silent_since
+
+    def stop(self):
+        if self.client is not None:
+            try:
+                self.client.hb_channel.stop()
+            except Exception:
+                pass
+            self.client = None
+
+
+class KernelWatchdog:
+    """Notice owned kernels whose process exits or whose heartbeat stalls.
+
+    Polls every ``interval`` seconds from a background thread started with
+    the first watched kernel.  A kernel counts as dead only once its process
+    has exited; dead kernels are unwatched before ``on_dead(owned, reason)``
+    runs on the watchdog thread.  A running kernel whose heartbeat has been
+    silent for ``silence_warning`` seconds is passed to
+    ``on_unresponsive(owned, seconds)`` once, until it beats again.
+    """
+
+    def __init__(self, on_dead, on_unresponsive=None, interval=WATCHDOG_INTERVAL,
+                 silence_warning=HEARTBEAT_SILENCE_WARNING):
+        self.interval = interval
+        self.silence_warning = silence_warning
+        self._on_dead = on_dead
+        self._on_unresponsive = on_unresponsive
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def watch(self, owned):
+        heartbeat = _Heartbeat(owned)
+        with self._lock:
+            if self._closed.is_set():
+                previous = heartbeat
+            else:
+                previous = self._watched.pop(owned.kernel_manager.connection_file, None)
+                self._watched[owned.kernel_manager.connection_file] = heartbeat
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._loop, name="pyrola-watchdog", daemon=True
+                    )
+                    self._thread.start()
+        if previous is not None:
+            previous.stop()
+
+    def unwatch(self, connection_file):
+        with self._lock:
+            heartbeat = self._watched.pop(connection_file, None)
+        if heartbeat is not None:
+            heartbeat.stop()
+        return heartbeat
+
+    def check(self):
+        with self._lock:
+            watched = list(self._watched.items())
+        now = time.monotonic()
+        for connection_file, heartbeat in watched:
+            if heartbeat.owned.kernel_manager.is_alive():
+                silent = heartbeat.silence(now)
+                if silent is None or silent < self.silence_warning or heartbeat.warned:
+                    continue
+                heartbeat.warned = True
+                if self._on_unresponsive is not None:
+                    try:
+                        self._on_unresponsive(heartbeat.owned, silent)
+                    except Exception:
+                        pass
+                continue
+            with self._lock:
+                if self._watched.get(connection_file) is not heartbeat:
+                    continue
+                del self._watched[connection_file]
+            heartbeat.stop()
+            try:
+                self._on_dead(heartbeat.owned, "process exited")
+            except Exception:
+                pass
 
-from jupyter_client import BlockingKernelClient, KernelManager
-from jupyter_client.kernelspec import KernelSpecManager
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            watched = list(self._watched.values())
+            self._watched.clear()
+        for heartbeat in watched:
+            heartbeat.stop()
 
-from vari_inspector import (
-    get_python_inspector,
-    get_python_inspector_call,
-    get_r_inspector,
-    get_r_inspector_call,
-    get_python_globals_list,
-    get_r_globals_list,
-)
+    def _loop(self):
+        while not self._closed.wait(self.interval):
+            self.check()
+
+
+def _output_from_message(msg_type, content):
+    if msg_type == "stream":
+        return {"type": "stream", "name": content.get("name"), "text": content.get("text", "")}
+    if msg_type in ("execute_result", "display_data", "update_display_data"):
+        return {
+            "type": "display_data" if msg_type == "update_display_data" else msg_type,
+            "data": content.get("data", {}),
+            "display_id": (content.get("transient") or {}).get("display_id"),
+        }
+    if msg_type == "error":
+        return {
+            "type": "error",
+            "ename": content.get("ename", ""),
+            "evalue": content.get("evalue", ""),
+            "traceback": content.get("traceback", []),
+        }
+    return None
+
+
+def _text_size(text):
+    return len(text.encode("utf-8", "replace"))
+
+
+def _output_size(output):
+    """Encoded size of ``output`` in bytes."""
+    if output["type"] == "stream":
+        return _text_size(output["text"])
+    # json.dumps escapes non-ASCII, so characters are bytes here.
+    return len(json.dumps(output, default=str))
+
+
+class _OutputLog:
+    """Outputs of the most recent cells of one kernel, by execution count."""
+
+    def __init__(self, max_cells, max_bytes):
+        self.max_cells = max_cells
+        self.max_bytes = max_bytes
+        self.cells = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        # Execution count of each running request, by parent msg id.
+        self._parents = {}
+        self._sizes = {}
+        # Requests of any client the kernel reported busy and not yet idle.
+        self._busy = set()
+
+    def record(self, msg):
+        msg_type = msg.get("msg_type")
+        content = msg.get("content") or {}
+        parent = msg.get("parent_header") or {}
+        with self.lock:
+            if msg_type == "execute_input":
+                if parent.get("session") not in _own_sessions:
+                    self._begin(parent.get("msg_id"), content.get("execution_count"), content.get("code", ""))
+                return
+            if msg_type == "status":
+                self._track_status(content.get("execution_state"), parent.get("msg_id"))
+            if msg_type == "status" and content.get("execution_state") in ("starting", "dead"):
+                # A restarted kernel never finishes what it was running.
+                for count in self._parents.values():
+                    cell = self.cells.get(count)
+                    if cell is not None and cell["status"] == "running":
+                        cell["status"] = "aborted"
+                self._parents.clear()
+                return
+            count = self._parents.get(parent.get("msg_id"))
+            cell = self.cells.get(count) if count is not None else None
+            if cell is None:
+                return
+            if msg_type == "status":
+                if content.get("execution_state") == "idle":
+                    del self._parents[parent["msg_id"]]
+                    if cell["status"] == "running":
+                        cell["status"] = "ok"
+                    cell["duration_ms"] = round((time.time() - cell["started"]) * 1000, 1)
+                return
+            if msg_type == "clear_output":
+                # The cell's size also counts its code, which stays.
+                self._resize(count, _text_size(cell["code"]) - self._sizes[count])
+                cell["outputs"] = []
+                return
+            output = _output_from_message(msg_type, content)
+            if output is not None:
+                self._append(count, cell, output)
+
+    def busy(self):
+        with self.lock:
+            return bool(self._busy)
+
+    def get(self, execution_count=None, error=False):
+        with self.lock:
+            if execution_count is not None:
+                cell = self.cells.get(execution_count)
+            else:
+                cell = next(
+                    (cell for cell in reversed(self.cells.values())
+                     if not error or cell["status"] == "error"),
+                    None,
+                )
+            if cell is None:
+                return None
+            return dict(cell, outputs=[dict(output) for output in cell["outputs"]])
+
+    def summary(self):
+        with self.lock:
+            return [
+                {
+                    "execution_count": cell["execution_count"],
+                    "status": cell["status"],
+                    "outputs": len(cell["outputs"]),
+                    "bytes": self._sizes[count],
+                }
+                for count, cell in self.cells.items()
+            ]
+
+    def _track_status(self, state, parent_id):
+        if state == "busy":
+            self._busy.add(parent_id)
+        elif state == "idle":
+            self._busy.discard(parent_id)
+        else:
+            self._busy.clear()
+
+    def _begin(self, msg_id, count, code):
+        if count is None:
+            return
+        if count in self.cells:
+            # Counts start over after a restart; the newer cell wins.
+            self._drop(count)
+        self.cells[count] = {
+            "execution_count": count,
+            "code": code,
+            "status": "running",
+            "started": time.time(),
+            "duration_ms": None,
+            "outputs": [],
+            "truncated": False,
+        }
+        self._sizes[count] = 0
+        self._resize(count, _text_size(code))
+        self._parents[msg_id] = count
+        while len(self.cells) > self.max_cells:
+            self._drop(next(iter(self.cells)))
+
+    def _append(self, count, cell, output):
+        if output["type"] == "error":
+            cell["status"] = "error"
+        outputs = cell["outputs"]
+        size = _output_size(output)
+        room = int(self.max_bytes * OUTPUT_CELL_SHARE) - self._sizes[count]
+        if output["type"] == "display_data" and output["display_id"]:
+            for index, previous in enumerate(outputs):
+                if previous.get("display_id") == output["display_id"]:
+                    growth = size - _output_size(previous)
+                    if growth > room:
+                        # Keep the last update that fit.
+                        cell["truncated"] = True
+                        return
+                    self._resize(count, growth)
+                    outputs[index] = output
+                    return
+        # Errors are always kept, so a traceback survives a flood of output.
+        if output["type"] != "error" and size > room:
+            cell["truncated"] = True
+            if output["type"] != "stream" or room <= 0:
+                return
+            output["text"] = output["text"].encode("utf-8", "replace")[:room].decode("utf-8", "ignore")
+            size = _text_size(output["text"])
+        if output["type"] == "stream" and outputs and outputs[-1]["type"] == "stream" \
+                and outputs[-1]["name"] == output["name"]:
+            outputs[-1]["text"] += output["text"]
+        else:
+            outputs.append(output)
+        self._resize(count, size)
+
+    def _resize(self, count, delta):
+        self._sizes[count] += delta
+        self.size += delta
+        while self.size > self.max_bytes and len(self.cells) > 1:
+            oldest = next(iter(self.cells))
+            if oldest == count:
+                break
+            self._drop(oldest)
+
+    def _drop(self, count):
+        self.cells.pop(count)
+        self.size -= self._sizes.pop(count)
+        for msg_id in [msg_id for msg_id, running in self._parents.items() if running == count]:
+            del self._parents[msg_id]
+
+
+class OutputRecorder:
+    """Record the cell outputs of owned kernels by listening on iopub.
+
+    Each watched kernel gets an iopub-only client; one background thread
+    polls all of them, so reading the recorded outputs never involves the
+    kernel.  Cells run by this server's own clients are not recorded.
+    Clients are only ever closed on that thread, never under its poll.
+    """
+
+    def __init__(self, max_bytes=OUTPUT_BUFFER_BYTES, max_cells=OUTPUT_CELLS, interval=OUTPUT_POLL_INTERVAL):
+        self.max_bytes = max_bytes
+        self.max_cells = max_cells
+        self.interval = interval
+        self._taps = {}
+        self._retired = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def watch(self, owned):
+        connection_file = owned.kernel_manager.connection_file
+        with self._lock:
+            if connection_file in self._taps or self._closed.is_set():
+                return
+        try:
+            client = owned.kernel_manager.client()
+            client.start_channels(shell=False, iopub=True, stdin=False, hb=False, control=False)
+        except Exception:
+            return
+        log = _OutputLog(self.max_cells, self.max_bytes)
+        with self._lock:
+            if connection_file in self._taps or self._closed.is_set():
+                client.stop_channels()
+                return
+            self._taps[connection_file] = (client, log)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="pyrola-outputs", daemon=True)
+                self._thread.start()
+
+    def unwatch(self, connection_file):
+        with self._lock:
+            tap = self._taps.pop(connection_file, None)
+            if tap is not None:
+                self._retired.append(tap[0])
+
+    def log(self, connection_file):
+        with self._lock:
+            tap = self._taps.get(connection_file)
+        return tap[1] if tap is not None else None
+
+    def kernel_busy(self, connection_file):
+        """Whether a watched kernel is running a request; None if not watched."""
+        log = self.log(connection_file)
+        return log.busy() if log is not None else None
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._retired.extend(client for client, _ in self._taps.values())
+            self._taps.clear()
+            running = self._thread is not None
+        if not running:
+            self._stop_retired()
+
+    def _stop_retired(self):
+        with self._lock:
+            retired, self._retired = self._retired, []
+        for client in retired:
+            try:
+                client.stop_channels()
+            except Exception:
+                pass
+
+    def _loop(self):
+        import zmq
+
+        while not self._closed.is_set():
+            self._stop_retired()
+            with self._lock:
+                taps = list(self._taps.values())
+            if not taps:
+                self._closed.wait(self.interval)
+                continue
+            poller = zmq.Poller()
+            channels = {}
+            for client, log in taps:
+                channel = client.iopub_channel
+                poller.register(channel.socket, zmq.POLLIN)
+                channels[channel.socket] = (channel, log)
+            ready = poller.poll(self.interval * 1000)
+            for socket_, _ in ready:
+                channel, log = channels[socket_]
+                while True:
+                    try:
+                        msg = channel.get_msg(timeout=0)
+                    except Empty:
+                        break
+                    log.record(msg)
+        self._stop_retired()
+
+
+def _psutil():
+    """Return the psutil module, or None when it is not installed."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil
+
+
+class _ProcReader:
+    """Process usage read from /proc, for Linux without psutil."""
+
+    def __init__(self):
+        self._ticks = os.sysconf("SC_CLK_TCK")
+        self._page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def _stat(self, pid):
+        with open(f"/proc/{pid}/stat") as stat:
+            # The command name may contain spaces; fields resume after ")".
+            return stat.read().rsplit(")", 1)[1].split()
+
+    def usage(self, pid):
+        fields = self._stat(pid)
+        return {
+            "rss": int(fields[21]) * self._page_size,
+            "cpu_time": (int(fields[11]) + int(fields[12])) / self._ticks,
+            "threads": int(fields[17]),
+        }
+
+    def children(self, pid):
+        parents = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    parents[int(entry)] = int(self._stat(entry)[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+        found, frontier = [], [pid]
+        while frontier:
+            parent = frontier.pop()
+            for child, ppid in parents.items():
+                if ppid == parent:
+                    found.append(child)
+                    frontier.append(child)
+        return found
+
+
+class _PsutilReader:
+    def __init__(self, psutil):
+        self._psutil = psutil
+
+    def usage(self, pid):
+        process = self._psutil.Process(pid)
+        with process.oneshot():
+            times = process.cpu_times()
+            return {
+                "rss": process.memory_info().rss,
+                "cpu_time": times.user + times.system,
+                "threads": process.num_threads(),
+            }
+
+    def children(self, pid):
+        return [child.pid for child in self._psutil.Process(pid).children(recursive=True)]
+
+
+class ResourceMonitor:
+    """Sample memory and CPU use of owned kernels into per-kernel ring buffers.
+
+    Each sample covers the kernel process and, summed, all its descendants.
+    Uses psutil when installed and /proc otherwise; without either, sampling
+    is unavailable.  With a ``memory_limit`` (bytes), ``on_limit(owned,
+    sample)`` runs once each time a kernel's total RSS rises above it.
+    """
+
+    def __init__(self, kernels, on_limit, interval=MONITOR_INTERVAL, samples=MONITOR_SAMPLES,
+                 memory_limit=0):
+        self.interval = interval
+        self.memory_limit = memory_limit
+        self._kernels = kernels
+        self._on_limit = on_limit
+        self._samples = samples
+        self._history = {}
+        self._previous = {}
+        self._over_limit = set()
+        self._reader = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+    @property
+    def available(self):
+        return self._get_reader() is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and not self._closed.is_set():
+                self._thread = threading.Thread(target=self._loop, name="pyrola-monitor", daemon=True)
+                self._thread.start()
+
+    def history(self, owned, count=None):
+        connection_file = owned.kernel_manager.connection_file
+        with self._lock:
+            samples = list(self._history.get(connection_file, ()))
+        if not samples:
+            sample = self._sample_kernel(owned)
+            samples = [sample] if sample else []
+        return samples[-count:] if count else samples
+
+    def sample(self):
+        kernels = self._kernels()
+        live = {owned.kernel_manager.connection_file for owned in kernels}
+        with self._lock:
+            for connection_file in set(self._history) - live:
+                del self._history[connection_file]
+                self._previous.pop(connection_file, None)
+                self._over_limit.discard(connection_file)
+        for owned in kernels:
+            self._sample_kernel(owned)
+
+    def close(self):
+        self._closed.set()
+
+    def _get_reader(self):
+        if self._reader is None:
+            psutil = _psutil()
+            if psutil is not None:
+                self._reader = _PsutilReader(psutil)
+            elif os.path.isdir("/proc") and hasattr(os, "sysconf"):
+                self._reader = _ProcReader()
+            else:
+                self._reader = False
+        return self._reader or None
+
+    def _sample_kernel(self, owned):
+        reader = self._get_reader()
+        pid = getattr(owned.kernel_manager.provisioner, "pid", None)
+        if reader is None or not pid:
+            return None
+        try:
+            kernel = reader.usage(pid)
+            children = []
+            for child in reader.children(pid):
+                try:
+                    children.append(reader.usage(child))
+                except Exception:
+                    continue
+        except Exception:
+            return None
+
+        now = time.monotonic()
+        child_time = sum(child["cpu_time"] for child in children)
+        connection_file = owned.kernel_manager.connection_file
+        sample = {
+            "time": time.time(),
+            "pid": pid,
+            "rss": kernel["rss"],
+            "threads": kernel["threads"],
+            "cpu": None,
+            "children": len(children),
+            "children_rss": sum(child["rss"] for child in children),
+            "children_cpu": None,
+        }
+        with self._lock:
+            previous = self._previous.get(connection_file)
+            if previous is not None and previous[0] == pid and now > previous[1]:
+                elapsed = now - previous[1]
+                sample["cpu"] = round(max(0.0, kernel["cpu_time"] - previous[2]) / elapsed * 100, 1)
+                # Children that exited take their time with them; clamp at 0.
+                sample["children_cpu"] = round(max(0.0, child_time - previous[3]) / elapsed * 100, 1)
+            self._previous[connection_file] = (pid, now, kernel["cpu_time"], child_time)
+            history = self._history.get(connection_file)
+            if history is None:
+                history = self._history[connection_file] = deque(maxlen=self._samples)
+            history.append(sample)
+            crossed = False
+            if self.memory_limit:
+                total = sample["rss"] + sample["children_rss"]
+                if total > self.memory_limit and connection_file not in self._over_limit:
+                    self._over_limit.add(connection_file)
+                    crossed = True
+                elif total < self.memory_limit * 0.9:
+                    self._over_limit.discard(connection_file)
+        if crossed:
+            try:
+                self._on_limit(owned, sample)
+            except Exception:
+                pass
+        return sample
+
+    def _loop(self):
+        while not self._closed.wait(self.interval):
+            self.sample()
+
+
+class KernelSpecIndex:
+    """In-memory view of installed kernelspecs, keyed by name and display name.
+
+    ``find_kernel_specs`` walks every Jupyter data dir and each spec lookup
+    parses a kernel.json, so the index is built once and rebuilt only when
+    the mtime of a kernels directory or of one of its spec dirs changes.
+    """
+
+    def __init__(self, get_kernel_spec_manager):
+        self._get_kernel_spec_manager = get_kernel_spec_manager
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._resource_dirs = {}
+        self._specs = {}
+        self._by_display_name = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._stamp = None
+
+    def names(self):
+        with self._lock:
+            self._refresh_locked()
+            return dict(self._resource_dirs)
+
+    def get(self, name):
+        spec_data, resource_dir = self.find(name)
+        if spec_data is None:
+            from jupyter_client.kernelspec import NoSuchKernel
+
+            raise NoSuchKernel(name)
+        return spec_data, resource_dir
+
+    def find(self, name):
+        with self._lock:
+            self._refresh_locked()
+            if name not in self._specs:
+                return None, None
+            return copy.deepcopy(self._specs[name]), self._resource_dirs[name]
+
+    def by_display_name(self, display_name):
+        with self._lock:
+            self._refresh_locked()
+            return list(self._by_display_name.get(display_name, ()))
+
+    def _current_stamp(self):
+        stamp = []
+        dirs = list(self._get_kernel_spec_manager().kernel_dirs)
+        dirs.extend(sorted(self._resource_dirs.values()))
+        for path in dirs:
+            try:
+                stamp.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                stamp.append((path, None))
+        return tuple(stamp)
+
+    def _refresh_locked(self):
+        if self._stamp is not None and self._stamp == self._current_stamp():
+            return
+        manager = self._get_kernel_spec_manager()
+        resource_dirs = manager.find_kernel_specs()
+        specs = {}
+        by_display_name = {}
+        for name in sorted(resource_dirs):
+            try:
+                spec_data = manager.get_kernel_spec(name).to_dict()
+            except Exception:
+                continue
+            specs[name] = spec_data
+            by_display_name.setdefault(spec_data.get("display_name"), []).append(name)
+        self._resource_dirs = {name: resource_dirs[name] for name in specs}
+        self._specs = specs
+        self._by_display_name = by_display_name
+        self._stamp = self._current_stamp()
+
+
+def _default_state_dir():
+    state_home = os.environ.get("XDG_STATE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".local", "state"
+    )
+    return os.path.join(state_home, "pyrola")
+
+
+class ManagedKernelState:
+    """Fingerprints of managed kernelspecs built from a language runtime.
+
+    Creating ``pyrola_r`` or ``pyrola_julia`` spawns R or Julia, which takes
+    seconds.  The result is recorded next to a fingerprint of the runtime
+    binary and the installed kernelspec, and the setup is skipped in later
+    sessions while that fingerprint still matches.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def lookup(self, name, fingerprint):
+        if fingerprint is None:
+            return None
+        with self._lock:
+            entry = self._load_locked().get(name)
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return None
+        return entry.get("result")
+
+    def record(self, name, fingerprint, result):
+        with self._lock:
+            entries = self._load_locked()
+            if fingerprint is None:
+                entries.pop(name, None)
+            else:
+                entries[name] = {"fingerprint": fingerprint, "result": result}
+            self._save_locked(entries)
+
+    def _load_locked(self):
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as fh:
+                    entries = json.load(fh)
+            except (OSError, ValueError):
+                entries = {}
+            self._entries = entries if isinstance(entries, dict) else {}
+        return self._entries
+
+    def _save_locked(self, entries):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(entries, fh, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # The memo is only an optimisation; never fail kernel setup over it.
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def _percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def rank(q):
+        # Nearest rank: the smallest sample with at least q of them at or below it.
+        return round(ordered[max(0, math.ceil(q * len(ordered)) - 1)] * 1000, 3)
+
+    return {"p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99), "max": rank(1.0)}
+
+
+class _MethodStats:
+    def __init__(self, samples):
+        self.calls = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency = deque(maxlen=samples)
+        self.phases = {}
+
+    def add(self, total, phases, error, bytes_in, bytes_out):
+        self.calls += 1
+        self.errors += bool(error)
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.latency.append(total)
+        for phase, seconds in phases.items():
+            self.phases.setdefault(phase, deque(maxlen=self.latency.maxlen)).append(seconds)
+
+    def snapshot(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "latency_ms": _percentiles(self.latency),
+            "phases_ms": {phase: _percentiles(values) for phase, values in self.phases.items()},
+        }
+
+
+class ServerMetrics:
+    """Per-method call counts, latency percentiles and traffic totals.
+
+    Each call records its total time in the server plus the phases it went
+    through: "wait" for the kernel's client, "connect", "kernel" for the
+    round-trip to the kernel, "kernel_start" and "write" for encoding and
+    sending the reply.  Percentiles cover the last ``samples`` calls of a
+    method.  With ``trace_path``, every call is also appended to that file
+    as one JSON line.
+    """
+
+    def __init__(self, samples=METRIC_SAMPLES, trace_path=None):
+        self.samples = samples
+        self.started = time.monotonic()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._methods = {}
+        self._lock = threading.Lock()
+        self._trace = None
+        if trace_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+                self._trace = open(trace_path, "a", encoding="utf-8")
+            except OSError:
+                self._trace = None
+
+    def count_out(self, size):
+        with self._lock:
+            self.bytes_out += size
+
+    def record(self, method, total, phases, error=False, bytes_in=0, bytes_out=0, request_id=None):
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = self._methods[method] = _MethodStats(self.samples)
+            stats.add(total, phases, error, bytes_in, bytes_out)
+            self.bytes_in += bytes_in
+            if self._trace is None:
+                return
+            entry = {
+                "ts": round(time.time(), 6),
+                "id": request_id,
+                "method": method,
+                "total_ms": round(total * 1000, 3),
+                "error": bool(error),
+                "bytes_in": bytes_in,
+                "bytes_out": bytes_out,
+            }
+            for phase, seconds in phases.items():
+                entry[f"{phase}_ms"] = round(seconds * 1000, 3)
+            try:
+                self._trace.write(json.dumps(entry) + "\n")
+                self._trace.flush()
+            except (OSError, ValueError):
+                pass
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "uptime_s": round(time.monotonic() - self.started, 3),
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "methods": {name: stats.snapshot() for name, stats in self._methods.items()},
+            }
+
+    def close(self):
+        with self._lock:
+            trace, self._trace = self._trace, None
+        if trace is not None:
+            trace.close()
 
 
 class PyrolaServer:
     def __init__(self):
-        self.kernel_manager = None
-        self.client = None
-        self._connection_file = None
-        self._inspector_initialized = set()
-        self._kernel_spec_manager = KernelSpecManager()
+        self._clients = KernelClientPool(
+            max_size=_read_env_int("PYROLA_CLIENT_POOL_SIZE", 4),
+            idle_timeout=_read_env_float("PYROLA_CLIENT_IDLE_TIMEOUT", 600.0),
+        )
+        self._kernel_spec_manager = None
+        self._kernel_spec_manager_lock = threading.Lock()
+        self._kernel_specs = KernelSpecIndex(self._get_kernel_spec_manager)
+        state_dir = os.environ.get("PYROLA_STATE_DIR") or _default_state_dir()
+        self._managed_state = ManagedKernelState(os.path.join(state_dir, "managed_kernels.json"))
+        self._warm_kernels = WarmKernelPool(
+            self._start_kernel_client,
+            self._kernel_spec_fingerprint,
+            size=_read_env_int("PYROLA_WARM_KERNELS", 0),
+            idle_timeout=_read_env_float("PYROLA_WARM_KERNEL_IDLE_TIMEOUT", 1800.0),
+        )
+        # Serialises managed kernelspec writes between concurrent requests.
+        self._spec_lock = threading.Lock()
+        # Serialises kernel starts in init_kernel.
+        self._kernel_lock = threading.Lock()
+        # Kernels this server started, by connection file, and the kernel
+        # each session (one per connected editor) is using.
+        self._kernels = {}
+        self._session_kernels = {}
+        self._registry_lock = threading.Lock()
+        self._session_ids = itertools.count(1)
+        self._session_notifiers = {}
+        self._watchdog = KernelWatchdog(self._kernel_died, self._kernel_unresponsive)
+        self._auto_restart = _read_env_int("PYROLA_KERNEL_AUTO_RESTART", 0) > 0
+        self._outputs = OutputRecorder(
+            max_bytes=_read_env_int("PYROLA_OUTPUT_BUFFER_MB", 16) * 1024 * 1024,
+        )
+        self._monitor = ResourceMonitor(
+            self._owned_kernels,
+            self._memory_limit_reached,
+            interval=_read_env_float("PYROLA_MONITOR_INTERVAL", MONITOR_INTERVAL),
+            memory_limit=_read_env_int("PYROLA_MEMORY_LIMIT_MB", 0) * 1024 * 1024,
+        )
+        self._closed = threading.Event()
+        # Per-request state of the worker thread running the request.
+        self._request = threading.local()
+        # Directory for the sockets of kernel-side inspector threads.
+        self._oob_dir = _inspector_socket_dir()
+        self.metrics = ServerMetrics(trace_path=os.environ.get("PYROLA_TRACE_FILE") or None)
+        self._debug_seq = itertools.count(1)
+
+    def _get_kernel_spec_manager(self):
+        with self._kernel_spec_manager_lock:
+            if self._kernel_spec_manager is None:
+                from jupyter_client.kernelspec import KernelSpecManager
+
+                self._kernel_spec_manager = KernelSpecManager()
+            return self._kernel_spec_manager
 
     def _start_kernel_client(self, kernel_name, startup_timeout=25):
+        from jupyter_client import KernelManager
+
         result = {}
         error = {}
         kernel_manager = KernelManager(kernel_name=kernel_name)
@@ -112,16 +1549,49 @@ class PyrolaServer:
         return proc.returncode, stdout, stderr
 
     def _find_kernel_specs(self):
-        return self._kernel_spec_manager.find_kernel_specs()
+        return self._kernel_specs.names()
 
     def _load_kernel_spec(self, name):
-        spec = self._kernel_spec_manager.get_kernel_spec(name)
-        return spec.to_json(), spec.resource_dir
+        return self._kernel_specs.get(name)
+
+    def _kernel_spec_is_current(self, name, spec_data):
+        existing, _ = self._kernel_specs.find(name)
+        if existing is None:
+            return False
+        from jupyter_client.kernelspec import KernelSpec
+
+        wanted = KernelSpec(resource_dir="", **spec_data).to_dict()
+        return existing == wanted
+
+    def _kernel_spec_fingerprint(self, name):
+        spec_data, _ = self._load_kernel_spec(name)
+        return json.dumps(spec_data, sort_keys=True)
+
+    def _runtime_fingerprint(self, name, runtime_command):
+        spec_data, _ = self._kernel_specs.find(name)
+        if spec_data is None:
+            return None
+        runtime_path = shutil.which(runtime_command) or runtime_command
+        try:
+            runtime_path = os.path.realpath(runtime_path)
+            stat = os.stat(runtime_path)
+        except OSError:
+            return None
+        spec_json = json.dumps(spec_data, sort_keys=True).encode("utf-8")
+        return {
+            "runtime": runtime_path,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "spec_sha256": hashlib.sha256(spec_json).hexdigest(),
+        }
 
     def _managed_kernel_dir(self, name):
-        return Path(self._kernel_spec_manager.user_kernel_dir) / name
+        return Path(self._get_kernel_spec_manager().user_kernel_dir) / name
 
     def _write_kernel_spec(self, name, spec_data, source_dir=None):
+        if self._kernel_spec_is_current(name, spec_data):
+            return str(self._managed_kernel_dir(name))
+        self._kernel_specs.invalidate()
         target_dir = self._managed_kernel_dir(name)
         if target_dir.exists():
             shutil.rmtree(target_dir)
@@ -172,11 +1642,8 @@ class PyrolaServer:
 
     def _find_kernel_by_display_name(self, display_name, exclude=None):
         exclude = exclude or set()
-        for name in sorted(self._find_kernel_specs()):
-            if name in exclude:
-                continue
-            spec_data, _ = self._load_kernel_spec(name)
-            if spec_data.get("display_name") == display_name:
+        for name in self._kernel_specs.by_display_name(display_name):
+            if name not in exclude:
                 return name
         return None
 
@@ -191,7 +1658,6 @@ class PyrolaServer:
                 )
 
     def _ensure_python_kernel(self, name):
-        self._ensure_python_ipykernel()
         spec_data = {
             "argv": [
                 sys.executable,
@@ -207,11 +1673,13 @@ class PyrolaServer:
                 "pyrola": {"managed": True, "source_python": sys.executable},
             },
         }
-        source_name = self._find_candidate_kernel(exact=["python3"], exclude={name})
-        source_dir = None
-        if source_name:
-            _, source_dir = self._load_kernel_spec(source_name)
-        self._write_kernel_spec(name, spec_data, source_dir=source_dir)
+        if not self._kernel_spec_is_current(name, spec_data):
+            self._ensure_python_ipykernel()
+            source_name = self._find_candidate_kernel(exact=["python3"], exclude={name})
+            source_dir = None
+            if source_name:
+                _, source_dir = self._load_kernel_spec(source_name)
+            self._write_kernel_spec(name, spec_data, source_dir=source_dir)
         return {
             "kernel_name": name,
             "display_name": self._managed_display_name("python"),
@@ -230,6 +1698,10 @@ class PyrolaServer:
                 }
             raise RuntimeError("R executable not found in PATH; cannot create pyrola_r")
 
+        cached = self._managed_state.lookup(name, self._runtime_fingerprint(name, runtime_command))
+        if cached:
+            return cached
+
         code, _, stderr = self._run(
             [
                 runtime_command,
@@ -239,16 +1711,19 @@ class PyrolaServer:
                 "IRkernel::installspec(user=TRUE, name='pyrola_r', displayname='Pyrola R')",
             ]
         )
+        self._kernel_specs.invalidate()
         if code != 0:
             raise RuntimeError(
                 "Failed to create pyrola_r. Install IRkernel in the active R environment. "
                 f"R: {runtime_command}. Error: {stderr or 'unknown error'}"
             )
-        return {
+        result = {
             "kernel_name": name,
             "display_name": self._managed_display_name("r"),
             "source": runtime_command,
         }
+        self._managed_state.record(name, self._runtime_fingerprint(name, runtime_command), result)
+        return result
 
     def _ensure_cpp_kernel(self, name):
         source_name = self._find_candidate_kernel(
@@ -283,6 +1758,10 @@ class PyrolaServer:
         }
 
     def _ensure_julia_kernel_from_runtime(self, name, runtime_command):
+        cached = self._managed_state.lookup(name, self._runtime_fingerprint(name, runtime_command))
+        if cached:
+            return cached
+
         display_name = self._managed_display_name("julia")
         code, _, stderr = self._run(
             [
@@ -291,6 +1770,7 @@ class PyrolaServer:
                 f'using IJulia; installkernel("{display_name}")',
             ]
         )
+        self._kernel_specs.invalidate()
         if code != 0:
             raise RuntimeError(
                 "Failed to create a Julia kernel from the active environment. "
@@ -304,49 +1784,15 @@ class PyrolaServer:
             raise RuntimeError("IJulia did not register a usable Julia kernelspec.")
 
         self._clone_kernel_spec(source_name, name, display_name)
-        return {
+        result = {
             "kernel_name": name,
             "display_name": display_name,
             "source": runtime_command,
         }
+        self._managed_state.record(name, self._runtime_fingerprint(name, runtime_command), result)
+        return result
 
-    def _disconnect_client(self):
-        if not self.client:
-            return
-        try:
-            self.client.stop_channels()
-        except Exception:
-            pass
-        if self._connection_file:
-            self._inspector_initialized.discard(self._connection_file)
-        self.client = None
-        self._connection_file = None
-
-    def _connect_kernel(self, connection_file):
-        if self.client is not None and self._connection_file == connection_file:
-            return True
-        self._disconnect_client()
-        try:
-            with open(connection_file, "r", encoding="utf-8") as fh:
-                connection_info = json.load(fh)
-            self.client = BlockingKernelClient()
-            self.client.load_connection_info(connection_info)
-            self.client.start_channels()
-            self._connection_file = connection_file
-            return True
-        except Exception as exc:
-            self._disconnect_client()
-            raise RuntimeError(f"Connection error: {exc}")
-
-    def _handle_kernel_message(self, msg_id=None):
-        try:
-            msg = self.client.get_iopub_msg(timeout=1)
-        except Exception:
-            return None
-
-        if msg_id and msg.get("parent_header", {}).get("msg_id") != msg_id:
-            return None
-
+    def _handle_kernel_message(self, msg):
         msg_type = msg.get("msg_type")
         if msg_type == "stream":
             return msg["content"]["text"]
@@ -358,15 +1804,220 @@ class PyrolaServer:
             return "IDLE"
         return None
 
-    def _collect_outputs(self, msg_id, max_iterations=500):
+    def _collect_outputs(self, conn, msg_id, timeout=INSPECT_TIMEOUT):
+        """Collect output for ``msg_id`` until the kernel reports idle.
+
+        Waits on the iopub socket against a single deadline, so replies are
+        handled as soon as they arrive.  Messages for other requests are kept
+        in the connection backlog.  Each chunk is also forwarded to the
+        current request's progress callback when it is streaming.  Returns
+        ``(outputs, status)``, where ``status`` is "ok", "timeout" or "dead";
+        the outputs are partial unless the status is "ok".
+        """
+        with _timed("kernel"):
+            return self._wait_for_outputs(conn, msg_id, timeout)
+
+    def _wait_for_outputs(self, conn, msg_id, timeout):
         outputs = []
-        for _ in range(max_iterations):
-            msg = self._handle_kernel_message(msg_id)
-            if msg == "IDLE":
-                break
-            if msg is not None:
-                outputs.append(msg)
-        return outputs
+        progress = getattr(self._request, "progress", None)
+
+        def consume(msg):
+            text = self._handle_kernel_message(msg)
+            if text is not None and text != "IDLE":
+                outputs.append(text)
+                if progress is not None:
+                    progress(text)
+            return text == "IDLE"
+
+        for msg in conn.take_backlog(msg_id):
+            if consume(msg):
+                return outputs, "ok"
+
+        client = conn.client
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return outputs, "timeout"
+            try:
+                msg = client.get_iopub_msg(timeout=min(remaining, LIVENESS_INTERVAL))
+            except Empty:
+                if not client.is_alive():
+                    return outputs, "dead"
+                continue
+
+            conn.track_message(msg)
+            parent_id = msg.get("parent_header", {}).get("msg_id")
+            if parent_id != msg_id:
+                conn.buffer_message(parent_id, msg)
+                continue
+            if consume(msg):
+                # The shell runs one request at a time, so nothing else is.
+                conn.busy_parents.clear()
+                return outputs, "ok"
+
+    def _execute_hidden(self, conn, filetype, code):
+        """Execute helper code without touching the kernel's history.
+
+        ipykernel still publishes stream output for silent requests, which
+        also leaves the execution counter alone; IRkernel drops it, so R code
+        only skips the history.
+        """
+        return conn.client.execute(code, silent=filetype == "python", store_history=False)
+
+    def _run_inspector(self, conn, filetype, get_inspector, get_inspector_call, target, timeout):
+        """Run inspector code for ``target`` on the shell channel.
+
+        Sends the inspector prelude the first time, together with the code
+        that starts the kernel-side inspector thread.
+        """
+        from vari_inspector import get_python_oob_server
+
+        if conn.inspector_initialized:
+            code = get_inspector_call(target)
+        else:
+            code = get_inspector(target)
+        oob_path = self._oob_install_path(conn, filetype)
+        if oob_path:
+            code = get_python_oob_server(oob_path) + code
+        msg_id = self._execute_hidden(conn, filetype, code)
+        outputs, status = self._collect_outputs(conn, msg_id, timeout=timeout)
+        if status == "ok":
+            conn.inspector_initialized = True
+            if oob_path:
+                conn.oob_path = oob_path
+        return outputs, status
+
+    def _split_batch_output(self, text, variables):
+        results = {}
+        for part in text.split(BATCH_SEPARATOR)[1:]:
+            index, _, output = part.partition("\n")
+            try:
+                variable = variables[int(index)]
+            except (ValueError, IndexError):
+                continue
+            results[variable] = output.rstrip("\n") or "No output received"
+        return results
+
+    def _oob_install_path(self, conn, filetype):
+        """Socket path to start the inspector thread on, unless it runs already.
+
+        The path only depends on the kernel, so every server attached to it
+        shares one inspector thread.
+        """
+        if filetype != "python" or conn.oob_path:
+            return None
+        return self._oob_socket_path(conn.connection_file)
+
+    def _oob_socket_path(self, connection_file):
+        if self._oob_dir is None:
+            return None
+        digest = hashlib.sha1(connection_file.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self._oob_dir, f"inspector-{digest}.sock")
+
+    def _run_out_of_band(self, path, request, timeout):
+        """Send ``request`` to the kernel-side inspector thread on ``path``.
+
+        The thread answers while the shell is still executing a cell, but
+        only with metadata that is safe to read while the cell runs.
+        """
+        with _timed("kernel"), socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            line = sock.makefile("rb").readline()
+        reply = json.loads(line)
+        if not isinstance(reply, dict):
+            raise ValueError("invalid inspector reply")
+        return reply
+
+    def _debug_request(self, client, command, arguments, timeout):
+        """Send a Jupyter debug protocol request on the control channel."""
+        msg = client.session.msg("debug_request", {
+            "type": "request",
+            "seq": next(self._debug_seq),
+            "command": command,
+            "arguments": arguments,
+        })
+        client.control_channel.send(msg)
+        deadline = time.monotonic() + timeout
+        with _timed("kernel"):
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                try:
+                    reply = client.control_channel.get_msg(timeout=remaining)
+                except Empty:
+                    return None
+                if reply.get("parent_header", {}).get("msg_id") == msg["header"]["msg_id"]:
+                    return reply["content"]
+
+    def _kernel_busy(self, conn):
+        """Whether the kernel behind ``conn`` is running a request right now.
+
+        A client that has not seen a status message yet (just created, or
+        re-created after eviction) cannot tell from its own iopub; for owned
+        kernels the output recorder's tap has been watching all along.
+        """
+        busy = conn.kernel_busy()
+        if not busy and not conn.status_seen:
+            busy = bool(self._outputs.kernel_busy(conn.connection_file))
+        return busy
+
+    def _ask_inspector(self, conn, request, timeout):
+        """Send ``request`` to the kernel-side inspector thread, if it runs.
+
+        Returns the reply and its status, or None without an inspector.
+        """
+        if not conn.oob_path:
+            # A new client for the kernel reuses the thread an earlier one started.
+            path = self._oob_socket_path(conn.connection_file)
+            if not path or not os.path.exists(path):
+                return None
+            conn.oob_path = path
+        try:
+            reply = self._run_out_of_band(conn.oob_path, request, timeout)
+        except socket.timeout:
+            return {}, "timeout"
+        except (OSError, ValueError):
+            conn.oob_path = None
+            return None
+        return reply, "error" if "error" in reply else "ok"
+
+    def _describe_while_busy(self, conn, variables, timeout):
+        """Describe ``variables`` without queueing behind the cell that is running.
+
+        Prefers the kernel-side inspector thread, which reports type, shape
+        and length only.  Without it, a single plain variable is still shown
+        through ipykernel's ``richInspectVariables`` debug request, which
+        only yields its repr.  Returns the results by variable and a status,
+        or None when neither is available.
+        """
+        progress = getattr(self._request, "progress", None)
+        answered = self._ask_inspector(conn, {"describe": variables}, timeout)
+        if answered is not None:
+            reply, status = answered
+            results = reply.get("results") or {}
+            if "error" in reply:
+                results = {variable: f"Error: {reply['error']}" for variable in variables}
+            if progress is not None and results:
+                progress("\n".join(results.values()))
+            return results, status
+
+        if len(variables) != 1 or not variables[0].isidentifier():
+            return None
+        variable = variables[0]
+        content = self._debug_request(
+            conn.client, "richInspectVariables", {"variableName": variable}, timeout
+        )
+        data = ((content or {}).get("body") or {}).get("data") or {}
+        output = data.get("text/plain")
+        if output is None:
+            return None
+        if progress is not None:
+            progress(output)
+        return {variable: output}, "ok"
 
     # ── RPC methods ──────────────────────────────────────────────────
 
@@ -377,6 +2028,10 @@ class PyrolaServer:
             raise ValueError("missing filetype")
 
         name = self._managed_kernel_name(filetype)
+        with self._spec_lock:
+            return self._ensure_managed_kernel(filetype, name, runtime_command)
+
+    def _ensure_managed_kernel(self, filetype, name, runtime_command):
         if filetype == "python":
             return self._ensure_python_kernel(name)
         if filetype == "r":
@@ -393,16 +2048,233 @@ class PyrolaServer:
         kernel_name = params.get("kernel_name")
         if not kernel_name:
             raise ValueError("missing kernel_name")
-        self._disconnect_client()
-        if self.kernel_manager:
+        shared = bool(params.get("shared"))
+        python_executable = params.get("python_executable")
+        session = self._session()
+        with self._kernel_lock:
+            previous = self._release_kernel(session)
+            if previous is not None:
+                self._clients.discard(previous.kernel_manager.connection_file)
+                try:
+                    previous.kernel_manager.shutdown_kernel(now=True)
+                except Exception:
+                    pass
+            if shared:
+                owned = self._attach_shared_kernel(session, kernel_name, python_executable)
+                if owned is not None:
+                    return {
+                        "connection_file": owned.kernel_manager.connection_file,
+                        "warm": False,
+                        "shared": True,
+                    }
+            warm = kernel_name.startswith("pyrola_")
+            spare = self._warm_kernels.take(kernel_name) if warm else None
+            if spare:
+                kernel_manager, client = spare
+            else:
+                with _timed("kernel_start"):
+                    kernel_manager, client = self._start_kernel_client(kernel_name)
+            self._clients.adopt(kernel_manager.connection_file, client)
+            owned = _OwnedKernel(kernel_name, kernel_manager, shared, python_executable)
+            with self._registry_lock:
+                owned.holders.add(session)
+                self._kernels[kernel_manager.connection_file] = owned
+                self._session_kernels[session] = kernel_manager.connection_file
+            self._watchdog.watch(owned)
+            self._outputs.watch(owned)
+        self._monitor.start()
+        if warm:
+            self._warm_kernels.prime(kernel_name)
+        return {
+            "connection_file": kernel_manager.connection_file,
+            "warm": spare is not None,
+            "shared": False,
+        }
+
+    def _session(self):
+        return getattr(self._request, "session", 0)
+
+    def _session_kernel(self, session):
+        with self._registry_lock:
+            return self._kernels.get(self._session_kernels.get(session))
+
+    def _attach_shared_kernel(self, session, kernel_name, python_executable):
+        with self._registry_lock:
+            for owned in self._kernels.values():
+                if (
+                    owned.shared
+                    and owned.kernel_name == kernel_name
+                    and owned.python_executable == python_executable
+                    and owned.kernel_manager.is_alive()
+                ):
+                    owned.holders.add(session)
+                    self._session_kernels[session] = owned.kernel_manager.connection_file
+                    return owned
+        return None
+
+    def _release_kernel(self, session, connection_file=None):
+        """Drop ``session``'s hold on a kernel (its own one by default).
+
+        Returns the kernel once nobody holds it any more, so the caller can
+        stop it; returns None while other sessions still use it.
+        """
+        with self._registry_lock:
+            current = self._session_kernels.get(session)
+            connection_file = connection_file or current
+            owned = self._kernels.get(connection_file)
+            if connection_file is not None and connection_file == current:
+                del self._session_kernels[session]
+            if owned is None:
+                return None
+            owned.holders.discard(session)
+            if owned.holders:
+                return None
+            del self._kernels[connection_file]
+        self._watchdog.unwatch(connection_file)
+        self._outputs.unwatch(connection_file)
+        return owned
+
+    def _forget_kernel(self, owned):
+        """Remove a dead kernel from the registry; False if already gone.
+
+        Only an exited process is cleaned up after: one that is still running
+        keeps its state for whoever is attached to it.
+        """
+        connection_file = owned.kernel_manager.connection_file
+        with self._registry_lock:
+            if self._kernels.get(connection_file) is not owned:
+                return False
+            del self._kernels[connection_file]
+            for session in owned.holders:
+                if self._session_kernels.get(session) == connection_file:
+                    del self._session_kernels[session]
+        self._clients.discard(connection_file)
+        self._outputs.unwatch(connection_file)
+        try:
+            if not owned.kernel_manager.is_alive():
+                owned.kernel_manager.shutdown_kernel(now=True)
+        except Exception:
+            pass
+        return True
+
+    def _owned_kernels(self):
+        with self._registry_lock:
+            return list(self._kernels.values())
+
+    def _memory_limit_reached(self, owned, sample):
+        self._notify_holders(owned, "kernel_memory", {
+            "connection_file": owned.kernel_manager.connection_file,
+            "kernel_name": owned.kernel_name,
+            "rss": sample["rss"] + sample["children_rss"],
+            "limit": self._monitor.memory_limit,
+        })
+
+    def _notify_holders(self, owned, method, params):
+        with self._registry_lock:
+            notifiers = [self._session_notifiers.get(session) for session in owned.holders]
+        for notify in notifiers:
+            if notify is None:
+                continue
+            try:
+                notify({"method": method, "params": params})
+            except Exception:
+                pass
+
+    def _restart_delay(self, owned):
+        if not self._auto_restart:
+            return None
+        now = time.monotonic()
+        owned.restarts = [when for when in owned.restarts if now - when < RESTART_WINDOW]
+        count = len(owned.restarts)
+        if count >= RESTART_LIMIT:
+            return None
+        if count == 0:
+            return 0.0
+        return min(RESTART_BACKOFF_MAX, RESTART_BACKOFF * 2 ** (count - 1))
+
+    def _kernel_unresponsive(self, owned, silent):
+        self._notify_holders(owned, "kernel_unresponsive", {
+            "connection_file": owned.kernel_manager.connection_file,
+            "kernel_name": owned.kernel_name,
+            "silent_s": round(silent, 1),
+        })
+
+    def _kernel_died(self, owned, reason):
+        connection_file = owned.kernel_manager.connection_file
+        delay = self._restart_delay(owned)
+        self._notify_holders(owned, "kernel_died", {
+            "connection_file": connection_file,
+            "kernel_name": owned.kernel_name,
+            "reason": reason,
+            "restarting": delay is not None,
+        })
+        # Cached inspector state and results died with the kernel.
+        self._clients.discard(connection_file)
+        if delay is None:
+            self._forget_kernel(owned)
+            return
+        threading.Thread(
+            target=self._restart_kernel, args=(owned, delay), name="pyrola-restart", daemon=True
+        ).start()
+
+    def _restart_kernel(self, owned, delay):
+        if self._closed.wait(delay):
+            return
+        connection_file = owned.kernel_manager.connection_file
+        with self._registry_lock:
+            if self._kernels.get(connection_file) is not owned:
+                return
+        started = time.perf_counter()
+        error = None
+        try:
+            # Same kernelspec and ports, so connected consoles carry on.
+            owned.kernel_manager.restart_kernel(now=True)
+            client = owned.kernel_manager.client()
+            client.start_channels()
+            try:
+                client.wait_for_ready(timeout=25)
+            except Exception:
+                client.stop_channels()
+                raise
+            self._clients.adopt(connection_file, client)
+        except Exception as exc:
+            error = exc
+        elapsed = time.perf_counter() - started
+        owned.restarts.append(time.monotonic())
+        self.metrics.record("kernel_restart", elapsed, {}, error=error is not None)
+        if error is not None:
+            self._notify_holders(owned, "kernel_died", {
+                "connection_file": connection_file,
+                "kernel_name": owned.kernel_name,
+                "reason": f"restart failed: {error}",
+                "restarting": False,
+            })
+            # The restarted process holds no user state yet, so stop it.
             try:
-                self.kernel_manager.shutdown_kernel(now=True)
+                owned.kernel_manager.shutdown_kernel(now=True)
             except Exception:
                 pass
-            self.kernel_manager = None
-        self.kernel_manager, self.client = self._start_kernel_client(kernel_name)
-        self._connection_file = self.kernel_manager.connection_file
-        return {"connection_file": self.kernel_manager.connection_file}
+            self._forget_kernel(owned)
+            return
+        self._watchdog.watch(owned)
+        self._notify_holders(owned, "kernel_restarted", {
+            "connection_file": connection_file,
+            "kernel_name": owned.kernel_name,
+            "restart_ms": round(elapsed * 1000, 1),
+        })
+
+    def open_session(self, notify=None):
+        session = next(self._session_ids)
+        with self._registry_lock:
+            self._session_notifiers[session] = notify
+        return session
+
+    def close_session(self, session):
+        with self._registry_lock:
+            self._session_notifiers.pop(session, None)
+        owned = self._release_kernel(session)
+        if owned is not None:
+            self._stop_kernel(owned.kernel_manager.connection_file, owned.kernel_manager)
 
     def execute_code(self, params):
         filetype = params.get("filetype")
@@ -411,24 +2283,112 @@ class PyrolaServer:
         if not all([filetype, connection_file, inspected_variable]):
             raise ValueError("missing arguments (filetype, connection_file, inspected_variable)")
 
+        from vari_inspector import (
+            get_python_inspector,
+            get_python_inspector_call,
+            get_r_inspector,
+            get_r_inspector_call,
+        )
+
         if filetype == "python":
-            if connection_file in self._inspector_initialized:
-                code = get_python_inspector_call(inspected_variable)
-            else:
-                code = get_python_inspector(inspected_variable)
+            get_inspector, get_inspector_call = get_python_inspector, get_python_inspector_call
         elif filetype == "r":
-            if connection_file in self._inspector_initialized:
-                code = get_r_inspector_call(inspected_variable)
-            else:
-                code = get_r_inspector(inspected_variable)
+            get_inspector, get_inspector_call = get_r_inspector, get_r_inspector_call
         else:
             raise ValueError(f"unsupported kernel: {filetype}")
 
-        self._connect_kernel(connection_file)
-        msg_id = self.client.execute(code)
-        outputs = self._collect_outputs(msg_id)
-        self._inspector_initialized.add(connection_file)
-        return {"output": "\n".join(outputs) if outputs else "No output received"}
+        timeout = params.get("timeout", INSPECT_TIMEOUT)
+        with self._clients.connection(connection_file) as conn:
+            # Reading queued iopub first also lets a user cell that has just
+            # run invalidate the cache, for every kernel type.
+            busy = self._kernel_busy(conn)
+            if filetype == "python" and busy:
+                answered = self._describe_while_busy(conn, [inspected_variable], timeout)
+                if answered is not None:
+                    results, status = answered
+                    output = results.get(inspected_variable) or "No output received"
+                    return {"output": output, "status": status}
+
+            cached = conn.cached_result(inspected_variable)
+            if cached is not None:
+                return {"output": cached, "status": "ok", "cached": True}
+
+            outputs, status = self._run_inspector(
+                conn, filetype, get_inspector, get_inspector_call, inspected_variable, timeout
+            )
+            output = "\n".join(outputs) if outputs else "No output received"
+            if status == "ok":
+                conn.cache_result(inspected_variable, output)
+        return {"output": output, "status": status}
+
+    def inspect_many(self, params):
+        filetype = params.get("filetype")
+        connection_file = params.get("connection_file")
+        variables = params.get("variables")
+        if not filetype or not connection_file or not isinstance(variables, list) or not variables:
+            raise ValueError("missing arguments (filetype, connection_file, variables)")
+
+        from vari_inspector import (
+            get_python_inspector_many,
+            get_python_inspector_many_call,
+            get_r_inspector_many,
+            get_r_inspector_many_call,
+        )
+
+        if filetype == "python":
+            get_inspector, get_inspector_call = get_python_inspector_many, get_python_inspector_many_call
+        elif filetype == "r":
+            get_inspector, get_inspector_call = get_r_inspector_many, get_r_inspector_many_call
+        else:
+            raise ValueError(f"unsupported kernel: {filetype}")
+
+        # A prefetch is only worth it when nothing waits on it: it neither waits
+        # for the connection nor queues behind a running cell.
+        prefetch = bool(params.get("prefetch"))
+        timeout = params.get("timeout", INSPECT_TIMEOUT)
+        if prefetch:
+            timeout = min(timeout, PREFETCH_TIMEOUT)
+        try:
+            with self._clients.connection(connection_file, timeout=0 if prefetch else None) as conn:
+                return self._inspect_many(
+                    conn, filetype, variables, get_inspector, get_inspector_call, timeout, prefetch
+                )
+        except TimeoutError:
+            if not prefetch:
+                raise
+            return {"results": {}, "status": "busy"}
+
+    def _inspect_many(self, conn, filetype, variables, get_inspector, get_inspector_call, timeout, prefetch):
+        busy = self._kernel_busy(conn)
+        if filetype == "python" and busy:
+            answered = self._describe_while_busy(conn, variables, timeout)
+            if answered is not None:
+                results, status = answered
+                return {"results": results, "status": status}
+        if busy and prefetch:
+            return {"results": {}, "status": "busy"}
+
+        results = {}
+        pending = []
+        for variable in variables:
+            cached = conn.cached_result(variable)
+            if cached is None:
+                pending.append(variable)
+            else:
+                results[variable] = cached
+        if not pending:
+            return {"results": results, "status": "ok"}
+
+        outputs, status = self._run_inspector(
+            conn, filetype, get_inspector, get_inspector_call, pending, timeout
+        )
+        # Stream chunks may split a result, so join them back as they came.
+        fetched = self._split_batch_output("".join(outputs), pending)
+        if status == "ok":
+            for variable, output in fetched.items():
+                conn.cache_result(variable, output)
+        results.update(fetched)
+        return {"results": results, "status": status}
 
     def list_globals(self, params):
         filetype = params.get("filetype")
@@ -436,6 +2396,8 @@ class PyrolaServer:
         if not filetype or not connection_file:
             raise ValueError("missing arguments (filetype, connection_file)")
 
+        from vari_inspector import get_python_globals_list, get_r_globals_list
+
         if filetype == "python":
             code = get_python_globals_list()
         elif filetype == "r":
@@ -443,52 +2405,248 @@ class PyrolaServer:
         else:
             raise ValueError(f"unsupported kernel: {filetype}")
 
-        self._connect_kernel(connection_file)
-        msg_id = self.client.execute(code)
-        outputs = self._collect_outputs(msg_id)
-        return {"output": "\n".join(outputs) if outputs else "(no user variables)"}
+        timeout = params.get("timeout", INSPECT_TIMEOUT)
+        with self._clients.connection(connection_file) as conn:
+            if filetype == "python" and self._kernel_busy(conn):
+                answered = self._ask_inspector(conn, {"globals": True}, timeout)
+                if answered is not None:
+                    reply, status = answered
+                    output = reply.get("output") or (f"Error: {reply['error']}" if "error" in reply else "")
+                    return {"output": output or "(no user variables)", "status": status}
+
+            oob_path = self._oob_install_path(conn, filetype)
+            if oob_path:
+                from vari_inspector import get_python_oob_server
+
+                code = get_python_oob_server(oob_path) + code
+            msg_id = self._execute_hidden(conn, filetype, code)
+            outputs, status = self._collect_outputs(conn, msg_id, timeout=timeout)
+            if status == "ok" and oob_path:
+                conn.oob_path = oob_path
+        return {
+            "output": "\n".join(outputs) if outputs else "(no user variables)",
+            "status": status,
+        }
 
     def interrupt_kernel(self, params):
-        if self.kernel_manager:
-            self.kernel_manager.interrupt_kernel()
+        owned = self._session_kernel(self._session())
+        if owned:
+            owned.kernel_manager.interrupt_kernel()
             return {"interrupted": True}
         return {"interrupted": False}
 
     def shutdown_kernel(self, params):
-        connection_file = params.get("connection_file")
-        if connection_file:
+        session = self._session()
+        with self._registry_lock:
+            connection_file = params.get("connection_file") or self._session_kernels.get(session)
+            held = connection_file in self._kernels
+        if not connection_file:
+            return {"shutdown": True}
+
+        kernel_manager = None
+        if held:
+            owned = self._release_kernel(session, connection_file)
+            if owned is None:
+                # Other editors still use this kernel; only drop our hold.
+                return {"shutdown": False}
+            kernel_manager = owned.kernel_manager
+        self._stop_kernel(connection_file, kernel_manager)
+        return {"shutdown": True}
+
+    def shutdown_all(self, params):
+        budget = float(params.get("budget") or SHUTDOWN_BUDGET)
+        session = self._session()
+        with self._registry_lock:
+            # The last editor takes everything down; otherwise only drop the
+            # caller's hold, as shutdown_kernel does.
+            alone = all(other == session for other in self._session_notifiers)
+            owned = list(self._kernels.values()) if alone else []
+            if alone:
+                self._kernels.clear()
+                self._session_kernels.clear()
+        if not alone:
+            released = self._release_kernel(session)
+            owned = [released] if released is not None else []
+
+        managers = []
+        for kernel in owned:
+            self._watchdog.unwatch(kernel.kernel_manager.connection_file)
+            self._outputs.unwatch(kernel.kernel_manager.connection_file)
+            self._clients.discard(kernel.kernel_manager.connection_file)
+            managers.append(kernel.kernel_manager)
+        if alone:
+            for spare in self._warm_kernels.drain():
+                try:
+                    spare.client.stop_channels()
+                except Exception:
+                    pass
+                managers.append(spare.kernel_manager)
+        if not managers:
+            return {"kernels": 0}
+
+        # Only sends on each kernel's control socket, so this is quick.
+        for kernel_manager in managers:
             try:
-                self._connect_kernel(connection_file)
+                kernel_manager.request_shutdown()
             except Exception:
                 pass
+        self._start_reaper(managers, min(SHUTDOWN_GRACE, budget), budget)
+        threading.Thread(
+            target=self._finish_shutdown, args=(managers, budget), name="pyrola-shutdown", daemon=True
+        ).start()
+        return {"kernels": len(managers)}
+
+    def _start_reaper(self, managers, grace, budget):
+        # A detached process, so escalation still happens if Neovim and this
+        # server exit right after shutdown_all returns.
+        args = [sys.executable, REAPER, "--grace", str(grace), "--budget", str(budget)]
+        for kernel_manager in managers:
+            pid = getattr(kernel_manager.provisioner, "pid", None)
+            if pid:
+                args += ["--pid", str(pid)]
+            args += ["--file", kernel_manager.connection_file]
+        try:
+            subprocess.Popen(
+                args,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        except OSError:
+            pass
 
-        if self.client:
+    def _finish_shutdown(self, managers, budget):
+        # Reap exited kernels and release their sockets while this server
+        # lives; anything still running at the deadline is killed here too.
+        deadline = time.monotonic() + budget
+        pending = list(managers)
+        while pending and time.monotonic() < deadline and not self._closed.is_set():
+            time.sleep(0.05)
+            still_running = []
+            for kernel_manager in pending:
+                try:
+                    alive = kernel_manager.is_alive()
+                except Exception:
+                    alive = False
+                if alive:
+                    still_running.append(kernel_manager)
+                else:
+                    try:
+                        kernel_manager.cleanup_resources()
+                    except Exception:
+                        pass
+            pending = still_running
+        for kernel_manager in pending:
             try:
-                self.client.shutdown()
+                kernel_manager.shutdown_kernel(now=True)
             except Exception:
                 pass
-            timeout = 0.5
-            start_time = time.time()
-            while time.time() - start_time < timeout:
-                try:
-                    msg = self.client.get_iopub_msg(timeout=0.1)
-                    if (
-                        msg["msg_type"] == "status"
-                        and msg["content"]["execution_state"] == "dead"
-                    ):
-                        break
-                except Exception:
-                    break
 
-        if self.kernel_manager:
+    def _stop_kernel(self, connection_file, kernel_manager=None):
+        # Runs on the control lane: if a kernel request still holds the
+        # client, skip the polite shutdown and terminate the process.
+        try:
+            with self._clients.connection(
+                connection_file, timeout=CONTROL_LOCK_TIMEOUT
+            ) as conn:
+                self._request_shutdown(conn.client)
+        except Exception:
+            pass
+        self._clients.discard(connection_file)
+        if kernel_manager is not None:
             try:
-                self.kernel_manager.shutdown_kernel(now=True)
+                kernel_manager.shutdown_kernel(now=True)
             except Exception:
                 pass
-            self.kernel_manager = None
+        # A kernel that was killed leaves its inspector socket behind.
+        oob_path = self._oob_socket_path(connection_file)
+        if oob_path and os.path.exists(oob_path):
+            try:
+                os.unlink(oob_path)
+            except OSError:
+                pass
 
-        self._disconnect_client()
-        return {"shutdown": True}
+    def _request_shutdown(self, client):
+        try:
+            client.shutdown()
+        except Exception:
+            pass
+        timeout = 0.5
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            try:
+                msg = client.get_iopub_msg(timeout=0.1)
+                if (
+                    msg["msg_type"] == "status"
+                    and msg["content"]["execution_state"] == "dead"
+                ):
+                    break
+            except Exception:
+                break
+
+    def kernel_output(self, params):
+        connection_file = params.get("connection_file")
+        if not connection_file:
+            owned = self._session_kernel(self._session())
+            connection_file = owned.kernel_manager.connection_file if owned else None
+        log = self._outputs.log(connection_file) if connection_file else None
+        if log is None:
+            raise ValueError("no recorded output for this kernel")
+        if params.get("list"):
+            return {"connection_file": connection_file, "cells": log.summary()}
+        execution_count = params.get("execution_count")
+        cell = log.get(execution_count, error=bool(params.get("error")))
+        if cell is None:
+            if execution_count is not None:
+                raise ValueError(f"no recorded output for [{execution_count}]")
+            raise ValueError("no recorded errors" if params.get("error") else "no recorded output")
+        return {"connection_file": connection_file, "cell": cell}
+
+    def kernel_resources(self, params):
+        session = self._session()
+        connection_file = params.get("connection_file")
+        count = params.get("samples")
+        with self._registry_lock:
+            kernels = [
+                owned for owned in self._kernels.values()
+                if (owned.kernel_manager.connection_file == connection_file
+                    if connection_file else session in owned.holders)
+            ]
+        return {
+            "available": self._monitor.available,
+            "interval": self._monitor.interval,
+            "memory_limit": self._monitor.memory_limit or None,
+            "kernels": [
+                {
+                    "connection_file": owned.kernel_manager.connection_file,
+                    "kernel_name": owned.kernel_name,
+                    "samples": self._monitor.history(owned, count),
+                }
+                for owned in kernels
+            ],
+        }
+
+    def stats(self, params):
+        return self.metrics.snapshot()
+
+    def ping(self, params):
+        return {"pid": os.getpid(), "ready": _modules_loaded.is_set()}
+
+    def close(self):
+        self._closed.set()
+        self._watchdog.close()
+        self._outputs.close()
+        self._monitor.close()
+        with self._registry_lock:
+            owned = list(self._kernels.values())
+            self._kernels.clear()
+            self._session_kernels.clear()
+        for kernel in owned:
+            self._stop_kernel(kernel.kernel_manager.connection_file, kernel.kernel_manager)
+        self._warm_kernels.close()
+        self._clients.close_all()
+        self.metrics.close()
 
     # ── Dispatch ─────────────────────────────────────────────────────
 
@@ -496,12 +2654,18 @@ class PyrolaServer:
         "ensure_managed_kernel": ensure_managed_kernel,
         "init_kernel": init_kernel,
         "execute_code": execute_code,
+        "inspect_many": inspect_many,
         "list_globals": list_globals,
         "interrupt_kernel": interrupt_kernel,
         "shutdown_kernel": shutdown_kernel,
+        "shutdown_all": shutdown_all,
+        "kernel_resources": kernel_resources,
+        "kernel_output": kernel_output,
+        "stats": stats,
+        "ping": ping,
     }
 
-    def dispatch(self, request):
+    def dispatch(self, request, notify=None, session=0):
         req_id = request.get("id")
         method_name = request.get("method")
         params = request.get("params", {})
@@ -510,34 +2674,329 @@ class PyrolaServer:
         if not method:
             return {"id": req_id, "error": f"unknown method: {method_name}"}
 
+        if notify is not None and params.get("stream"):
+            self._request.progress = self._progress_notifier(req_id, notify)
+        self._request.session = session
         try:
             result = method(self, params)
             return {"id": req_id, "result": result}
         except Exception as exc:
             return {"id": req_id, "error": str(exc)}
+        finally:
+            self._request.progress = None
 
+    def _progress_notifier(self, req_id, notify):
+        def progress(chunk):
+            try:
+                notify({"method": "progress", "params": {"id": req_id, "chunk": chunk}})
+            except Exception:
+                pass
 
-def main():
-    server = PyrolaServer()
+        return progress
 
-    for line in sys.stdin:
+
+class RequestDispatcher:
+    """Run requests on worker threads and write replies as they complete.
+
+    Kernel work shares a small pool; control methods get their own lane so an
+    interrupt is never queued behind the inspection it is meant to stop.
+    """
+
+    def __init__(self, server, stream, max_workers=MAX_WORKERS):
+        self._server = server
+        self._stream = stream
+        self._session = server.open_session(notify=self.write)
+        self._write_lock = threading.Lock()
+        self._packer = None
+        self._workers = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pyrola-worker"
+        )
+        self._control = ThreadPoolExecutor(
+            max_workers=len(CONTROL_METHODS), thread_name_prefix="pyrola-control"
+        )
+
+    def write(self, message):
+        with self._write_lock:
+            size = self._write_locked(message)
+        self._server.metrics.count_out(size)
+        return size
+
+    def _write_locked(self, message):
+        if self._packer is not None:
+            payload = self._packer(message)
+            self._stream.buffer.write(struct.pack(">I", len(payload)) + payload)
+            self._stream.buffer.flush()
+            return len(payload) + 4
+        data = json.dumps(message) + "\n"
+        self._stream.write(data)
+        self._stream.flush()
+        return len(data.encode("utf-8"))
+
+    def set_framing(self, request):
+        """Switch reply framing right after acknowledging the request.
+
+        Runs on the reader thread and holds the write lock across the
+        acknowledgement, so the client sees every later reply in the new
+        framing and nothing in between.
+        """
+        params = request.get("params") or {}
+        packer = None
+        if params.get("framing") == "msgpack" and hasattr(self._stream, "buffer"):
+            packer = _msgpack_packer()
+        framing = "json" if packer is None else "msgpack"
+        with self._write_lock:
+            self._packer = None
+            size = self._write_locked({"id": request.get("id"), "result": {"framing": framing}})
+            self._packer = packer
+        self._server.metrics.count_out(size)
+
+    def submit(self, request, size=0):
+        if request.get("method") == FRAMING_METHOD:
+            self.set_framing(request)
+            return
+        lane = self._control if request.get("method") in CONTROL_METHODS else self._workers
+        lane.submit(self._run, request, size)
+
+    def _run(self, request, size):
+        method = request.get("method")
+        _timings.phases = phases = {}
+        started = time.perf_counter()
+        response = self._server.dispatch(request, notify=self.write, session=self._session)
+        written = 0
+        with _timed("write"):
+            try:
+                written = self.write(response)
+            except Exception:
+                # stdout is gone (Neovim exited); nothing left to report to.
+                pass
+        _timings.phases = None
+        self._server.metrics.record(
+            method if isinstance(method, str) and method in PyrolaServer._methods else "unknown",
+            time.perf_counter() - started,
+            phases,
+            error="error" in response,
+            bytes_in=size,
+            bytes_out=written,
+            request_id=request.get("id"),
+        )
+
+    def close(self):
+        self._control.shutdown(wait=True)
+        self._workers.shutdown(wait=True)
+        self._server.close_session(self._session)
+
+
+class DaemonListener:
+    """Serve editors connecting over a unix socket with one shared server.
+
+    Each connection gets its own dispatcher and session, so kernels are
+    reference counted per editor.  The daemon exits once no editor has been
+    connected for ``idle_timeout`` seconds.
+    """
+
+    def __init__(self, server, path, idle_timeout=DAEMON_IDLE_TIMEOUT):
+        self._server = server
+        self._path = path
+        self._idle_timeout = idle_timeout
+        self._connections = set()
+        self._lock = threading.Lock()
+        self._last_active = time.monotonic()
+
+    def serve_forever(self):
+        listener = self._bind()
+        if listener is None:
+            return
+        listener.settimeout(LIVENESS_INTERVAL)
+        try:
+            while not self._idle():
+                try:
+                    conn, _ = listener.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                with self._lock:
+                    self._connections.add(conn)
+                threading.Thread(
+                    target=self._serve_connection, args=(conn,), name="pyrola-session", daemon=True
+                ).start()
+        finally:
+            listener.close()
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+
+    def _bind(self):
+        directory = os.path.dirname(self._path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        problem = _socket_dir_problem(directory)
+        if problem:
+            raise SystemExit(f"Refusing to listen in {directory}: {problem}")
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(self._path)
+        except OSError:
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self._path)
+            except OSError:
+                # Left behind by a daemon that died; take the path over.
+                os.unlink(self._path)
+                listener.bind(self._path)
+            else:
+                # Another daemon is already serving this socket.
+                listener.close()
+                return None
+            finally:
+                probe.close()
+        os.chmod(self._path, 0o600)
+        listener.listen()
+        return listener
+
+    def _idle(self):
+        with self._lock:
+            if self._connections:
+                return False
+            return time.monotonic() - self._last_active >= self._idle_timeout
+
+    def _serve_connection(self, conn):
+        reader = conn.makefile("r", encoding="utf-8", newline="\n")
+        writer = conn.makefile("w", encoding="utf-8", newline="\n")
+        dispatcher = RequestDispatcher(self._server, writer)
+        try:
+            _serve(dispatcher, reader)
+        except OSError:
+            pass
+        finally:
+            dispatcher.close()
+            for stream in (reader, writer, conn):
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+            with self._lock:
+                self._connections.discard(conn)
+                self._last_active = time.monotonic()
+
+
+def _socket_dir_problem(directory):
+    """Why ``directory`` cannot be trusted to hold the socket, or None.
+
+    As with tmux, it must be a real directory owned by this user and closed
+    to everyone else; otherwise another user could listen in our place.
+    """
+    try:
+        info = os.lstat(directory)
+    except OSError as exc:
+        return str(exc)
+    if not stat.S_ISDIR(info.st_mode):
+        return "not a directory"
+    if info.st_uid != os.getuid():
+        return "owned by another user"
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        return "accessible to other users (mode must be 0700)"
+    return None
+
+
+def _inspector_socket_dir():
+    """Directory for the sockets of kernel-side inspector threads, or None.
+
+    It is the daemons' private directory, so every server attached to a
+    kernel finds the same inspector rather than starting another.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    directory = os.path.dirname(default_socket_path())
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    except OSError:
+        return None
+    if _socket_dir_problem(directory):
+        return None
+    return directory
+
+
+def default_socket_path(python_executable=sys.executable):
+    """Per-user socket of the daemon running ``python_executable``.
+
+    Each interpreter gets its own daemon, so kernels it sets up (such as the
+    managed Python kernelspec) use the editor's environment.
+    """
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    digest = hashlib.sha256(python_executable.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(base, f"pyrola-{os.getuid()}", f"server-{digest}.sock")
+
+
+def _serve(dispatcher, lines):
+    for line in lines:
         line = line.strip()
         if not line:
             continue
         try:
             request = json.loads(line)
         except json.JSONDecodeError as exc:
-            response = {"id": None, "error": f"invalid JSON: {exc}"}
-            sys.stdout.write(json.dumps(response) + "\n")
-            sys.stdout.flush()
+            dispatcher.write({"id": None, "error": f"invalid JSON: {exc}"})
+            continue
+        if not isinstance(request, dict):
+            dispatcher.write({"id": None, "error": "invalid request: expected an object"})
             continue
 
-        response = server.dispatch(request)
-        sys.stdout.write(json.dumps(response) + "\n")
-        sys.stdout.flush()
+        dispatcher.submit(request, len(line.encode("utf-8")) + 1)
 
-    # stdin closed — clean up
-    server.shutdown_kernel({})
+
+def _msgpack_packer():
+    """Return a msgpack encoder, or None when the package is not installed."""
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack.Packer(use_bin_type=True).pack
+
+
+def _preload_modules():
+    # Runs beside the request loop, so the first kernel request rarely waits
+    # on these imports while ping never does.
+    try:
+        import jupyter_client  # noqa: F401
+        import jupyter_client.kernelspec  # noqa: F401
+        import vari_inspector  # noqa: F401
+    except Exception:
+        pass
+    _modules_loaded.set()
+
+
+def _raise_system_exit(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pyrola kernel server")
+    parser.add_argument(
+        "--daemon", action="store_true",
+        help="serve several editors over a unix socket instead of stdin/stdout",
+    )
+    parser.add_argument("--socket", default=None, help="socket path for --daemon")
+    args = parser.parse_args(argv)
+
+    server = PyrolaServer()
+    # Neovim's jobstop sends SIGTERM; unwind so owned and spare kernels die too.
+    signal.signal(signal.SIGTERM, _raise_system_exit)
+    threading.Thread(target=_preload_modules, name="pyrola-preload", daemon=True).start()
+
+    try:
+        if args.daemon:
+            DaemonListener(
+                server,
+                args.socket or default_socket_path(),
+                idle_timeout=_read_env_float("PYROLA_DAEMON_IDLE_TIMEOUT", DAEMON_IDLE_TIMEOUT),
+            ).serve_forever()
+        else:
+            dispatcher = RequestDispatcher(server, sys.stdout)
+            _serve(dispatcher, sys.stdin)
+            # stdin closed — let in-flight requests finish, then clean up
+            dispatcher.close()
+    finally:
+        server.close()
 
 
 if __name__ == "__main__":
@@ -24,7 +24,7 @@ MAX_PREVIEW_COLS = 10
 MAX_SERIES_PREVIEW = 20
 MAX_COUNT_ITEMS = 1000
 
-if 'python_Var_inspector' not in globals():
+if 'UniversalInspector' not in globals():
     class UniversalInspector:
         def __init__(self):
             self.output_lines = []
@@ -314,16 +314,218 @@ if 'python_Var_inspector' not in globals():
                 self._inspect_basic_type(obj)
 
             return "\\n".join(self.output_lines)
-    python_Var_inspector = UniversalInspector()
+
+
+def inspect_many(namespace, expressions):
+    parts = []
+    for index, expression in enumerate(expressions):
+        try:
+            text = UniversalInspector().inspect(eval(expression, namespace))
+        except Exception as exc:
+            text = f"Error: {type(exc).__name__}: {exc}"
+        parts.append(f"\\x1e{index}\\n{text}")
+    return "\\n".join(parts)
 """
 
+# Helpers are defined in a private module instead of the user namespace, so
+# inspecting leaves no names behind.  Code sent to the kernel only reaches
+# them through __import__, without binding anything itself.
+_PYTHON_MODULE = "__import__('sys').modules.setdefault('_pyrola_inspector', __import__('types').ModuleType('_pyrola_inspector'))"
+
+
+def _python_private_exec(source):
+    return f"exec({source!r}, {_PYTHON_MODULE}.__dict__)\n"
+
 
 def get_python_inspector(input_var):
-    return _PYTHON_INSPECTOR_INIT + get_python_inspector_call(input_var)
+    return _python_private_exec(_PYTHON_INSPECTOR_INIT) + get_python_inspector_call(input_var)
 
 
 def get_python_inspector_call(input_var):
-    return f"var_output = python_Var_inspector.inspect({input_var})\nprint(var_output)\n"
+    return f"print(__import__('_pyrola_inspector').UniversalInspector().inspect({input_var}))\n"
+
+
+# Batch inspections print each result after a "\x1e<index>" line.
+def get_python_inspector_many(input_vars):
+    return _python_private_exec(_PYTHON_INSPECTOR_INIT) + get_python_inspector_many_call(input_vars)
+
+
+def get_python_inspector_many_call(input_vars):
+    return f"print(__import__('_pyrola_inspector').inspect_many(globals(), {list(input_vars)!r}))\n"
+
+
+_PYTHON_OOB_SERVER = """
+# The cell that is running may be mutating the objects this thread looks at,
+# so it only reports metadata that is cheap and safe to read concurrently and
+# never calls into library code that walks the data.
+OOB_TIMEOUT = 2.0
+OOB_NOTE = "(the kernel is busy: metadata only until the cell finishes)"
+ARRAY_MODULES = {"numpy", "pandas", "torch", "polars", "xarray", "jax", "jaxlib", "scipy"}
+SIZED_TYPES = (str, bytes, list, tuple, dict, set, frozenset)
+SCALAR_TYPES = (bool, int, float, complex, type(None))
+SHORT_NAMES = {"Length": "len"}
+
+
+def metadata(obj):
+    kind = type(obj)
+    fields = [("Type", kind.__name__)]
+    if kind.__module__.partition(".")[0] in ARRAY_MODULES:
+        # Only attributes of the class itself, so a DataFrame column that
+        # happens to be called "dtype" is never looked up.
+        for attr in ("shape", "dtype"):
+            if hasattr(kind, attr):
+                try:
+                    value = getattr(obj, attr)
+                    fields.append((attr.capitalize(), tuple(value) if attr == "shape" else value))
+                except Exception:
+                    pass
+    elif isinstance(obj, SIZED_TYPES):
+        fields.append(("Length", len(obj)))
+        if isinstance(obj, (str, bytes)):
+            fields.append(("Value", repr(obj[:60])))
+    elif kind in SCALAR_TYPES:
+        fields.append(("Value", repr(obj)))
+    return fields
+
+
+def describe(namespace, name):
+    if not name.isidentifier():
+        return f"Error: only plain names can be inspected while the kernel is busy: {name}"
+    try:
+        obj = namespace[name]
+    except KeyError:
+        return f"Error: NameError: name {name!r} is not defined"
+    lines = ["Summary", "-" * 50]
+    lines.extend(f"{attr:<15}\\u2551 {value}" for attr, value in metadata(obj))
+    lines.extend(["", OOB_NOTE])
+    return "\\n".join(lines)
+
+
+def list_globals(namespace):
+    import types
+
+    skip_types = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, type)
+    rows = []
+    for name, obj in sorted(namespace.items()):
+        if name.startswith("_") or isinstance(obj, skip_types):
+            continue
+        fields = metadata(obj)
+        summary = ", ".join(
+            f"{SHORT_NAMES.get(attr, attr.lower())}={value}" for attr, value in fields[1:] if attr != "Value"
+        )
+        value = dict(fields).get("Value")
+        rows.append((name, fields[0][1], value if value is not None else summary))
+    if not rows:
+        return "(no user variables)"
+    nw = max(max(len(r[0]) for r in rows), 4)
+    tw = max(max(len(r[1]) for r in rows), 4)
+    header = f"{'Name':<{nw}}  {'Type':<{tw}}  Value"
+    lines = [header, "\\u2500" * (len(header) + 4)]
+    for n, t, v in rows:
+        lines.append(f"{n:<{nw}}  {t:<{tw}}  {v}")
+    lines.extend(["", OOB_NOTE])
+    return "\\n".join(lines)
+
+
+def answer(request, namespace):
+    import threading
+
+    reply = {}
+
+    def work():
+        # dict() copies in one step, so the cell cannot resize it under us.
+        scope = dict(namespace)
+        try:
+            if "describe" in request:
+                reply["results"] = {name: describe(scope, name) for name in request["describe"]}
+            else:
+                reply["output"] = list_globals(scope)
+        except Exception as exc:
+            reply["error"] = f"{type(exc).__name__}: {exc}"
+
+    worker = threading.Thread(target=work, name="pyrola-inspector-request", daemon=True)
+    worker.start()
+    worker.join(OOB_TIMEOUT)
+    if worker.is_alive():
+        return {"error": f"no answer within {OOB_TIMEOUT:g} s"}
+    return dict(reply)
+
+
+def stop_oob_server():
+    current = globals().pop("oob_server", None)
+    if current is None:
+        return
+    import os
+
+    current["stop"].set()
+    current["thread"].join(1.0)
+    try:
+        os.unlink(current["path"])
+    except OSError:
+        pass
+
+
+def start_oob_server(path, namespace):
+    # One listener per kernel: every server attached to it uses the same path,
+    # and a listener on any other path is shut down first.
+    current = globals().get("oob_server")
+    if current is not None and current["path"] == path and current["thread"].is_alive():
+        return
+
+    import atexit
+    import json
+    import os
+    import socket
+    import threading
+
+    stop_oob_server()
+
+    def serve(listener, stop):
+        with listener:
+            while not stop.is_set():
+                try:
+                    conn, _ = listener.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    return
+                try:
+                    with conn:
+                        conn.settimeout(OOB_TIMEOUT)
+                        stream = conn.makefile("rwb")
+                        reply = answer(json.loads(stream.readline()), namespace)
+                        stream.write(json.dumps(reply).encode("utf-8") + b"\\n")
+                        stream.flush()
+                except Exception:
+                    pass
+
+    try:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(4)
+        # Wake up now and then to notice a stop request.
+        listener.settimeout(0.5)
+    except OSError:
+        return
+    if "oob_cleanup" not in globals():
+        atexit.register(stop_oob_server)
+        globals()["oob_cleanup"] = True
+    stop = threading.Event()
+    thread = threading.Thread(target=serve, args=(listener, stop), name="pyrola-inspector", daemon=True)
+    thread.start()
+    globals()["oob_server"] = {"path": path, "stop": stop, "thread": thread}
+"""
+
+
+def get_python_oob_server(socket_path):
+    return (
+        _python_private_exec(_PYTHON_OOB_SERVER)
+        + f"__import__('_pyrola_inspector').start_oob_server({socket_path!r}, globals())\n"
+    )
 
 
 _R_INSPECTOR_INIT = """
@@ -453,9 +655,23 @@ def get_r_inspector_call(input_var):
     return f"cat(.pyrola_inspect({input_var}))\n"
 
 
-def get_python_globals_list():
-    return """
-import sys
+def get_r_inspector_many(input_vars):
+    return _R_INSPECTOR_INIT + get_r_inspector_many_call(input_vars)
+
+
+def get_r_inspector_many_call(input_vars):
+    lines = []
+    for index, input_var in enumerate(input_vars):
+        lines.append(f'cat("\\x1e{index}\\n")')
+        lines.append(
+            f"tryCatch(cat(.pyrola_inspect({input_var})), "
+            f"error = function(e) cat('Error:', conditionMessage(e)))"
+        )
+        lines.append('cat("\\n")')
+    return "\n".join(lines) + "\n"
+
+
+_PYTHON_GLOBALS_LIST = """
 import types
 
 try:
@@ -473,49 +689,54 @@ try:
 except Exception:
     torch = None
 
-_skip_types = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType)
-_rows = []
-for _name, _obj in sorted(globals().items()):
-    if _name.startswith('_'):
-        continue
-    if isinstance(_obj, _skip_types):
-        continue
-    if isinstance(_obj, type):
-        continue
-    _type_name = type(_obj).__name__
-    try:
-        if pd is not None and isinstance(_obj, pd.DataFrame):
-            _val = f"({_obj.shape[0]} \u00d7 {_obj.shape[1]})"
-        elif pd is not None and isinstance(_obj, pd.Series):
-            _val = f"len={len(_obj)}, dtype={_obj.dtype}"
-        elif np is not None and isinstance(_obj, np.ndarray):
-            _val = f"shape={_obj.shape}, dtype={_obj.dtype}"
-        elif torch is not None and isinstance(_obj, torch.Tensor):
-            _val = f"shape={tuple(_obj.shape)}, device={_obj.device}"
-        else:
-            _val = repr(_obj)
-            if len(_val) > 60:
-                _val = _val[:57] + "..."
-    except Exception:
-        _val = "<error>"
-    _rows.append((_name, _type_name, _val))
-
-if not _rows:
-    print("(no user variables)")
-else:
-    _nw = max(len(r[0]) for r in _rows)
-    _tw = max(len(r[1]) for r in _rows)
-    _nw = max(_nw, 4)
-    _tw = max(_tw, 4)
-    _header = f"{'Name':<{_nw}}  {'Type':<{_tw}}  Value"
-    _sep = '\u2500' * (len(_header) + 4)
-    print(_header)
-    print(_sep)
-    for _n, _t, _v in _rows:
-        print(f"{_n:<{_nw}}  {_t:<{_tw}}  {_v}")
+
+def format_globals(namespace):
+    skip_types = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType)
+    rows = []
+    for name, obj in sorted(namespace.items()):
+        if name.startswith('_'):
+            continue
+        if isinstance(obj, skip_types):
+            continue
+        if isinstance(obj, type):
+            continue
+        type_name = type(obj).__name__
+        try:
+            if pd is not None and isinstance(obj, pd.DataFrame):
+                val = f"({obj.shape[0]} \u00d7 {obj.shape[1]})"
+            elif pd is not None and isinstance(obj, pd.Series):
+                val = f"len={len(obj)}, dtype={obj.dtype}"
+            elif np is not None and isinstance(obj, np.ndarray):
+                val = f"shape={obj.shape}, dtype={obj.dtype}"
+            elif torch is not None and isinstance(obj, torch.Tensor):
+                val = f"shape={tuple(obj.shape)}, device={obj.device}"
+            else:
+                val = repr(obj)
+                if len(val) > 60:
+                    val = val[:57] + "..."
+        except Exception:
+            val = "<error>"
+        rows.append((name, type_name, val))
+
+    if not rows:
+        return "(no user variables)"
+    nw = max(max(len(r[0]) for r in rows), 4)
+    tw = max(max(len(r[1]) for r in rows), 4)
+    header = f"{'Name':<{nw}}  {'Type':<{tw}}  Value"
+    lines = [header, '\u2500' * (len(header) + 4)]
+    for n, t, v in rows:
+        lines.append(f"{n:<{nw}}  {t:<{tw}}  {v}")
+    return "\\n".join(lines)
 """
 
 
+def get_python_globals_list():
+    return (
+        _python_private_exec(_PYTHON_GLOBALS_LIST)
+        + "print(__import__('_pyrola_inspector').format_globals(globals()))\n"
+    )
+
+
 def get_r_globals_list():
     return """
 .pyrola_vars <- ls(envir = .GlobalEnv)
@@ -553,11 +774,11 @@ if (length(.pyrola_vars) == 0) {
   .pyrola_header <- sprintf(paste0("%-", .pyrola_nw, "s  %-", .pyrola_tw, "s  %s"), "Name", "Type", "Value")
   cat(.pyrola_header, "\\n")
   cat(paste(rep("\u2500", nchar(.pyrola_header) + 4), collapse = ""), "\\n")
-  for (i in seq_len(nrow(.pyrola_info))) {
+  for (.pyrola_i in seq_len(nrow(.pyrola_info))) {
     cat(sprintf(paste0("%-", .pyrola_nw, "s  %-", .pyrola_tw, "s  %s"),
-                .pyrola_info$Name[i], .pyrola_info$Type[i], .pyrola_info$Value[i]), "\\n")
+                .pyrola_info$Name[.pyrola_i], .pyrola_info$Type[.pyrola_i], .pyrola_info$Value[.pyrola_i]), "\\n")
   }
-  rm(.pyrola_info, .pyrola_nw, .pyrola_tw, .pyrola_header)
+  rm(.pyrola_info, .pyrola_nw, .pyrola_tw, .pyrola_header, .pyrola_i)
 }
 rm(.pyrola_vars)
 """
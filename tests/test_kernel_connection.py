@@ -0,0 +1,136 @@
+from queue import Empty
+from types import SimpleNamespace
+
+import server
+from server import MAX_CACHED_RESULTS, _KernelConnection
+
+
+class FakeClient:
+    def __init__(self, session="ours", iopub=()):
+        self.session = SimpleNamespace(session=session)
+        self.iopub = list(iopub)
+
+    def get_iopub_msg(self, timeout=None):
+        if not self.iopub:
+            raise Empty
+        return self.iopub.pop(0)
+
+
+def status(state, msg_id, session="user"):
+    return {
+        "msg_type": "status",
+        "parent_header": {"msg_id": msg_id, "session": session},
+        "content": {"execution_state": state},
+    }
+
+
+def execute_input(count, msg_id="cell", session="user"):
+    return {
+        "msg_type": "execute_input",
+        "parent_header": {"msg_id": msg_id, "session": session},
+        "content": {"execution_count": count, "code": "x = 1"},
+    }
+
+
+def make_connection(**kwargs):
+    return _KernelConnection("kernel.json", FakeClient(**kwargs))
+
+
+def test_nothing_is_cached_before_a_user_cell_ran():
+    conn = make_connection()
+    conn.cache_result("x", "int")
+    assert conn.cached_result("x") is None
+    conn.close()
+
+
+def test_results_are_cached_per_execution_count():
+    conn = make_connection()
+    conn.track_message(execute_input(1))
+    conn.cache_result("x", "int")
+    assert conn.cached_result("x") == "int"
+    assert conn.cached_result("y") is None
+
+    conn.track_message(execute_input(2))
+    assert conn.cached_result("x") is None
+    conn.close()
+
+
+def test_own_executions_do_not_invalidate_the_cache():
+    conn = make_connection(session="ours")
+    conn.track_message(execute_input(1))
+    conn.cache_result("x", "int")
+    conn.track_message(execute_input(2, session="ours"))
+    assert conn.cached_result("x") == "int"
+    assert conn.execution_count == 1
+    conn.close()
+
+
+def test_restart_clears_the_cache_and_busy_state():
+    conn = make_connection()
+    conn.track_message(execute_input(1))
+    conn.cache_result("x", "int")
+    conn.track_message(status("busy", "cell"))
+    conn.track_message(status("starting", None))
+    assert conn.cached_result("x") is None
+    assert conn.execution_count is None
+    assert not conn.busy_parents
+    conn.close()
+
+
+def test_cache_keeps_the_most_recent_results():
+    conn = make_connection()
+    conn.track_message(execute_input(1))
+    for index in range(MAX_CACHED_RESULTS + 5):
+        conn.cache_result(f"v{index}", str(index))
+    assert len(conn.results) == MAX_CACHED_RESULTS
+    assert conn.cached_result("v0") is None
+    assert conn.cached_result(f"v{MAX_CACHED_RESULTS + 4}") == str(MAX_CACHED_RESULTS + 4)
+    conn.close()
+
+
+def test_busy_until_each_request_reports_idle():
+    conn = make_connection()
+    conn.track_message(status("busy", "a"))
+    conn.track_message(status("busy", "b"))
+    conn.track_message(status("idle", "a"))
+    assert conn.busy_parents == {"b"}
+    conn.track_message(status("idle", "b"))
+    assert not conn.busy_parents
+    conn.close()
+
+
+def test_kernel_busy_reads_queued_iopub():
+    conn = make_connection(iopub=[execute_input(3), status("busy", "cell")])
+    assert conn.kernel_busy(grace=0)
+    assert conn.execution_count == 3
+
+    conn.client.iopub.append(status("idle", "cell"))
+    assert not conn.kernel_busy(grace=0)
+    conn.close()
+
+
+def test_kernel_busy_keeps_only_own_replies_in_the_backlog():
+    ours = status("idle", "inspect", session="ours")
+    conn = make_connection(session="ours", iopub=[status("busy", "cell"), ours])
+    conn.kernel_busy(grace=0)
+    assert conn.take_backlog("cell") == []
+    assert conn.take_backlog("inspect") == [ours]
+    conn.close()
+
+
+def test_close_forgets_the_session():
+    conn = make_connection(session="closing")
+    assert "closing" in server._own_sessions
+    conn.close()
+    assert "closing" not in server._own_sessions
+
+
+def test_a_fresh_client_has_not_seen_a_status():
+    conn = make_connection(iopub=[execute_input(1)])
+    assert not conn.kernel_busy(grace=0)
+    assert not conn.status_seen
+    conn.client.iopub.append(status("idle", "cell"))
+    conn.kernel_busy(grace=0)
+    assert conn.status_seen
+    conn.close()
+    assert not conn.status_seen
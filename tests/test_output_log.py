@@ -0,0 +1,156 @@
+import server
+from server import OUTPUT_CELL_SHARE, _OutputLog
+
+
+def message(msg_type, parent, session="user", **content):
+    return {
+        "msg_type": msg_type,
+        "parent_header": {"msg_id": parent, "session": session},
+        "content": content,
+    }
+
+
+def run_cell(log, count, code="x", outputs=(), parent=None, finish=True):
+    parent = parent or f"cell-{count}"
+    log.record(message("execute_input", parent, execution_count=count, code=code))
+    for msg_type, content in outputs:
+        log.record(message(msg_type, parent, **content))
+    if finish:
+        log.record(message("status", parent, execution_state="idle"))
+
+
+def stream(text, name="stdout"):
+    return "stream", {"name": name, "text": text}
+
+
+def test_records_outputs_by_execution_count():
+    log = _OutputLog(max_cells=10, max_bytes=1 << 20)
+    run_cell(log, 1, "print('a')", [stream("a\n"), ("execute_result", {"data": {"text/plain": "1"}})])
+    cell = log.get(1)
+    assert cell["status"] == "ok"
+    assert cell["code"] == "print('a')"
+    assert [output["type"] for output in cell["outputs"]] == ["stream", "execute_result"]
+    assert cell["duration_ms"] is not None
+
+
+def test_consecutive_stream_chunks_are_merged():
+    log = _OutputLog(max_cells=10, max_bytes=1 << 20)
+    run_cell(log, 1, outputs=[stream("a"), stream("b"), stream("c", "stderr")])
+    outputs = log.get(1)["outputs"]
+    assert [(output["name"], output["text"]) for output in outputs] == [("stdout", "ab"), ("stderr", "c")]
+
+
+def test_latest_and_latest_error():
+    log = _OutputLog(max_cells=10, max_bytes=1 << 20)
+    run_cell(log, 1, outputs=[("error", {"ename": "ValueError", "evalue": "bad", "traceback": []})])
+    run_cell(log, 2, outputs=[stream("fine")])
+    assert log.get()["execution_count"] == 2
+    error = log.get(error=True)
+    assert error["execution_count"] == 1
+    assert error["status"] == "error"
+    assert log.get(3) is None
+
+
+def test_own_executions_are_not_recorded():
+    log = _OutputLog(max_cells=10, max_bytes=1 << 20)
+    server._own_sessions.add("ours")
+    try:
+        log.record(message("execute_input", "inspect", session="ours", execution_count=1, code="x"))
+    finally:
+        server._own_sessions.discard("ours")
+    assert log.get() is None
+
+
+def test_display_updates_replace_the_output():
+    log = _OutputLog(max_cells=10, max_bytes=1 << 20)
+    run_cell(log, 1, outputs=[
+        ("display_data", {"data": {"text/plain": "0%"}, "transient": {"display_id": "bar"}}),
+        ("update_display_data", {"data": {"text/plain": "100%"}, "transient": {"display_id": "bar"}}),
+    ])
+    (output,) = log.get(1)["outputs"]
+    assert output["data"] == {"text/plain": "100%"}
+
+
+def test_clear_output_keeps_the_size_of_the_code():
+    log = _OutputLog(max_cells=10, max_bytes=1 << 20)
+    run_cell(log, 1, code="code", outputs=[stream("x" * 100), ("clear_output", {"wait": False})])
+    assert log.get(1)["outputs"] == []
+    assert log.size == len("code")
+    assert log.summary() == [{"execution_count": 1, "status": "ok", "outputs": 0, "bytes": len("code")}]
+
+
+def test_a_cell_is_truncated_at_its_share_but_errors_are_kept():
+    log = _OutputLog(max_cells=10, max_bytes=1000)
+    share = int(1000 * OUTPUT_CELL_SHARE)
+    error = ("error", {"ename": "E", "evalue": "", "traceback": ["tb"]})
+    run_cell(log, 1, code="", outputs=[stream("x" * 2000), stream("more"), error])
+    cell = log.get(1)
+    assert cell["truncated"]
+    assert cell["outputs"][0]["text"] == "x" * share
+    assert cell["outputs"][-1]["type"] == "error"
+    assert cell["status"] == "error"
+
+
+def test_oldest_cells_are_dropped_by_count_and_size():
+    log = _OutputLog(max_cells=3, max_bytes=1 << 20)
+    for count in range(1, 6):
+        run_cell(log, count)
+    assert [cell["execution_count"] for cell in log.summary()] == [3, 4, 5]
+
+    log = _OutputLog(max_cells=10, max_bytes=100)
+    for count in range(1, 6):
+        run_cell(log, count, code="c" * 10, outputs=[stream("x" * 20)])
+    assert log.size <= 100
+    assert log.get(1) is None
+    assert log.get(5) is not None
+
+
+def test_restart_aborts_running_cells():
+    log = _OutputLog(max_cells=10, max_bytes=1 << 20)
+    run_cell(log, 1, finish=False)
+    log.record(message("status", None, execution_state="starting"))
+    assert log.get(1)["status"] == "aborted"
+
+
+def test_rerun_count_after_restart_replaces_the_cell():
+    log = _OutputLog(max_cells=10, max_bytes=1 << 20)
+    run_cell(log, 1, code="old")
+    run_cell(log, 1, code="new", parent="again")
+    assert log.get(1)["code"] == "new"
+    assert log.size == len("new")
+
+
+def test_busy_follows_every_request_on_iopub():
+    log = _OutputLog(max_cells=10, max_bytes=1 << 20)
+    assert not log.busy()
+    log.record(message("status", "anyone", session="other", execution_state="busy"))
+    assert log.busy()
+    log.record(message("status", "anyone", session="other", execution_state="idle"))
+    assert not log.busy()
+    log.record(message("status", "cell", execution_state="busy"))
+    log.record(message("status", None, execution_state="starting"))
+    assert not log.busy()
+
+
+def test_sizes_are_counted_in_bytes():
+    log = _OutputLog(max_cells=10, max_bytes=1000)
+    share = int(1000 * OUTPUT_CELL_SHARE)
+    run_cell(log, 1, code="é", outputs=[stream("é" * share)])
+    cell = log.get(1)
+    assert cell["truncated"]
+    assert len(cell["outputs"][0]["text"].encode("utf-8")) <= share - 2
+    assert log.size <= share
+
+
+def test_display_updates_stay_within_the_cell_share():
+    log = _OutputLog(max_cells=10, max_bytes=1000)
+    share = int(1000 * OUTPUT_CELL_SHARE)
+
+    def display(text):
+        return "display_data", {"data": {"text/plain": text}, "transient": {"display_id": "bar"}}
+
+    run_cell(log, 1, code="", outputs=[display("small"), display("x" * share), display("done")])
+    cell = log.get(1)
+    assert cell["truncated"]
+    assert cell["outputs"][0]["data"] == {"text/plain": "done"}
+    assert log.size <= share
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from console import OutputStage, _collapse_carriage_returns
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("plain\ntext", "plain\ntext"),
+    ("10%\r50%\r100%", "\r100%"),
+    ("10%\r50%\r", "\r50%\r"),
+    ("a\r\nb", "a\nb"),
+    ("first\n1\r2\r3\nlast", "first\n\r3\nlast"),
+])
+def test_collapse_carriage_returns(text, expected):
+    assert _collapse_carriage_returns(text) == expected
+
+
+def run_stage(stage, writes):
+    async def main():
+        stage.begin()
+        for name, text in writes:
+            stage.write(name, text)
+        await asyncio.sleep(stage.interval * 3)
+        stage.end()
+
+    asyncio.run(main())
+
+
+def test_writes_are_coalesced_per_frame(capsys):
+    stage = OutputStage(interval=0.01, limit=1 << 20)
+    run_stage(stage, [("stdout", "a"), ("stdout", "b"), ("stderr", "!"), ("stdout", "c")])
+    captured = capsys.readouterr()
+    assert captured.out == "abc"
+    assert captured.err == "!"
+
+
+def test_progress_updates_are_collapsed_within_a_frame(capsys):
+    stage = OutputStage(interval=0.01, limit=1 << 20)
+    run_stage(stage, [("stdout", f"\r{n}%") for n in range(101)])
+    assert capsys.readouterr().out == "\r100%"
+
+
+def test_output_past_the_limit_spills_to_a_file(capsys, tmp_path):
+    spilled = []
+    stage = OutputStage(interval=0.01, limit=10, spill_dir=str(tmp_path), on_spill=spilled.append)
+    run_stage(stage, [("stdout", "line one\nline two\nline three\n")])
+    out = capsys.readouterr().out
+    path = str(tmp_path / "output-1.txt")
+    assert out.startswith("line one\n")
+    assert f"the rest is in {path}" in out
+    assert spilled == [path]
+    assert stage.spill_path == path
+    with open(path, encoding="utf-8") as fh:
+        assert fh.read() == "line two\nline three\n"
+
+
+def test_each_execution_starts_with_a_fresh_limit(capsys, tmp_path):
+    stage = OutputStage(interval=0.01, limit=10, spill_dir=str(tmp_path))
+    run_stage(stage, [("stdout", "0123456789abc")])
+    capsys.readouterr()
+    run_stage(stage, [("stdout", "short")])
+    assert capsys.readouterr().out == "short"
+    assert (tmp_path / "output-1.txt").read_text() == "abc"
+    assert not (tmp_path / "output-2.txt").exists()
+
+
+def test_limit_counts_encoded_bytes(capsys, tmp_path):
+    stage = OutputStage(interval=0.01, limit=8, spill_dir=str(tmp_path))
+    run_stage(stage, [("stdout", "é" * 6)])
+    out = capsys.readouterr().out
+    assert out.startswith("é" * 4 + "\n[pyrola]")
+    assert (tmp_path / "output-1.txt").read_text(encoding="utf-8") == "é" * 2
+
+
+def test_limit_counts_encoded_bytes_across_frames(capsys, tmp_path):
+    stage = OutputStage(interval=0.01, limit=100, spill_dir=str(tmp_path))
+
+    async def main():
+        stage.begin()
+        for _ in range(10):
+            stage.write("stdout", "é" * 10)
+            stage.flush()
+        stage.end()
+
+    asyncio.run(main())
+    out = capsys.readouterr().out
+    shown, _, notice = out.partition("\n[pyrola]")
+    assert len(shown.encode("utf-8")) == 100
+    assert "the rest is in" in notice
+    assert (tmp_path / "output-1.txt").read_text(encoding="utf-8") == "é" * 50
@@ -0,0 +1,41 @@
+from console import ResizeCache
+
+
+def entry(size):
+    return ("x" * size, 10, 10)
+
+
+def test_get_returns_what_was_put():
+    cache = ResizeCache(max_bytes=100)
+    cache.put((b"a", 10, 10), entry(5))
+    assert cache.get((b"a", 10, 10)) == entry(5)
+    assert cache.get((b"a", 20, 10)) is None
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = ResizeCache(max_bytes=30)
+    for name in (b"a", b"b", b"c"):
+        cache.put((name, 1, 1), entry(10))
+    cache.get((b"a", 1, 1))
+    cache.put((b"d", 1, 1), entry(10))
+    assert cache.get((b"b", 1, 1)) is None
+    assert cache.get((b"a", 1, 1)) is not None
+    assert cache.get((b"c", 1, 1)) is not None
+    assert cache.get((b"d", 1, 1)) is not None
+
+
+def test_replacing_an_entry_keeps_the_size_right():
+    cache = ResizeCache(max_bytes=30)
+    cache.put((b"a", 1, 1), entry(20))
+    cache.put((b"a", 1, 1), entry(10))
+    cache.put((b"b", 1, 1), entry(20))
+    assert cache.get((b"a", 1, 1)) == entry(10)
+    assert cache.get((b"b", 1, 1)) == entry(20)
+
+
+def test_entries_larger_than_the_cache_are_not_kept():
+    cache = ResizeCache(max_bytes=10)
+    cache.put((b"small", 1, 1), entry(5))
+    cache.put((b"huge", 1, 1), entry(11))
+    assert cache.get((b"huge", 1, 1)) is None
+    assert cache.get((b"small", 1, 1)) == entry(5)
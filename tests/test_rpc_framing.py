@@ -0,0 +1,87 @@
+import os
+import struct
+
+import pytest
+
+lupa = pytest.importorskip("lupa")
+msgpack = pytest.importorskip("msgpack")
+
+RPC_LUA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lua", "pyrola", "rpc.lua")
+
+
+def to_lua(runtime, value):
+    if isinstance(value, dict):
+        return runtime.table_from({to_lua(runtime, k): to_lua(runtime, v) for k, v in value.items()})
+    if isinstance(value, list):
+        return runtime.table_from([to_lua(runtime, v) for v in value])
+    return value
+
+
+def from_lua(value):
+    if hasattr(value, "items"):
+        items = dict(value.items())
+        if items and all(isinstance(k, int) for k in items):
+            return [from_lua(items[k]) for k in sorted(items)]
+        return {k.decode() if isinstance(k, bytes) else k: from_lua(v) for k, v in items.items()}
+    return value.decode() if isinstance(value, bytes) else value
+
+
+@pytest.fixture
+def rpc():
+    runtime = lupa.LuaRuntime(unpack_returned_tuples=True, encoding=None)
+    runtime.execute(b"vim = {fn = {}, loop = {}, mpack = {}, log = {levels = {}}}")
+    vim = runtime.globals().vim
+    vim.mpack.decode = lambda data: to_lua(runtime, msgpack.unpackb(data, raw=True))
+    vim.notify = lambda *args: None
+    module = runtime.eval(b"dofile")(RPC_LUA.encode())
+    received = []
+    module.on_notification(b"event", lambda params: received.append(from_lua(params)))
+    return module, received
+
+
+def frame(payload):
+    data = msgpack.packb(payload)
+    return struct.pack(">I", len(data)) + data
+
+
+def event(n):
+    return {"method": "event", "params": {"n": n}}
+
+
+def test_decodes_whole_frames(rpc):
+    module, received = rpc
+    module._feed_frames(frame(event(1)) + frame(event(2)))
+    assert received == [{"n": 1}, {"n": 2}]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+def test_reassembles_frames_split_anywhere(rpc, size):
+    module, received = rpc
+    data = b"".join(frame(event(n)) for n in range(20))
+    for start in range(0, len(data), size):
+        module._feed_frames(data[start:start + size])
+    assert received == [{"n": n} for n in range(20)]
+
+
+def test_waits_for_the_rest_of_a_frame(rpc):
+    module, received = rpc
+    data = frame(event(1))
+    module._feed_frames(data[:-1])
+    assert received == []
+    module._feed_frames(data[-1:])
+    assert received == [{"n": 1}]
+
+
+def test_large_frame(rpc):
+    module, received = rpc
+    text = "x" * 300_000
+    data = frame({"method": "event", "params": {"n": text}})
+    for start in range(0, len(data), 65536):
+        module._feed_frames(data[start:start + 65536])
+    assert received == [{"n": text}]
+
+
+def test_skips_a_frame_that_does_not_decode(rpc):
+    module, received = rpc
+    module._feed_frames(struct.pack(">I", 1) + b"\xc1" + frame(event(2)))
+    assert received == [{"n": 2}]
@@ -0,0 +1,53 @@
+import json
+
+from server import ServerMetrics, _percentiles
+
+
+def test_percentiles_of_no_samples():
+    assert _percentiles([]) is None
+
+
+def test_percentiles_use_the_nearest_rank():
+    samples = [ms / 1000 for ms in range(100, 0, -1)]
+    assert _percentiles(samples) == {"p50": 50.0, "p95": 95.0, "p99": 99.0, "max": 100.0}
+
+
+def test_percentiles_of_a_single_sample():
+    assert _percentiles([0.25]) == {"p50": 250.0, "p95": 250.0, "p99": 250.0, "max": 250.0}
+
+
+def test_snapshot_counts_calls_errors_and_bytes():
+    metrics = ServerMetrics()
+    metrics.record("ping", 0.001, {}, bytes_in=10, bytes_out=20)
+    metrics.record("ping", 0.003, {}, error=True, bytes_in=5, bytes_out=7)
+    metrics.count_out(100)
+    snapshot = metrics.snapshot()
+    ping = snapshot["methods"]["ping"]
+    assert ping["calls"] == 2
+    assert ping["errors"] == 1
+    assert (ping["bytes_in"], ping["bytes_out"]) == (15, 27)
+    assert ping["latency_ms"]["max"] == 3.0
+    assert (snapshot["bytes_in"], snapshot["bytes_out"]) == (15, 100)
+
+
+def test_percentiles_cover_the_last_samples_only():
+    metrics = ServerMetrics(samples=10)
+    for ms in range(1, 101):
+        metrics.record("inspect", ms / 1000, {"kernel": ms / 2000})
+    stats = metrics.snapshot()["methods"]["inspect"]
+    assert stats["calls"] == 100
+    assert stats["latency_ms"]["p50"] == 95.0
+    assert stats["latency_ms"]["max"] == 100.0
+    assert stats["phases_ms"]["kernel"]["max"] == 50.0
+
+
+def test_trace_file_gets_one_line_per_call(tmp_path):
+    path = tmp_path / "trace" / "calls.jsonl"
+    metrics = ServerMetrics(trace_path=str(path))
+    metrics.record("ping", 0.002, {"write": 0.0005}, request_id=7)
+    metrics.close()
+    (entry,) = [json.loads(line) for line in path.read_text().splitlines()]
+    assert entry["method"] == "ping"
+    assert entry["id"] == 7
+    assert entry["total_ms"] == 2.0
+    assert entry["write_ms"] == 0.5